@@ -0,0 +1,345 @@
+"""
+Asyncio transport for the report lifecycle calls.
+
+One event loop keeps many report lifecycles (create, poll, get document,
+download) in flight at once instead of one blocking call after another. Requests
+go through controlled_request, which keeps the semantics of
+Component.controlled_request: deadlines and retries follow retries.RetryPolicy,
+and a request that still fails returns its last response or None. Operations with a known
+usage plan first take a token from the operation's TokenBucket, so hundreds of
+concurrent lifecycles queue on the client instead of running into 429s.
+Financial events stay on the blocking path: their pages follow each other through
+NextToken, so there is nothing to run concurrently.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import tempfile
+import time
+from collections import namedtuple
+
+from dates import iso_utc
+from downloads import (RANGE_PART_SIZE, RANGE_WORKERS, RANGED_DOWNLOAD_THRESHOLD, describe, document_size,
+                       is_part, is_usable_first, open_document, range_header, remaining_ranges)
+from lazy import lazy_import
+from logs import EventLog
+from metrics import operation_for
+from retries import DEFAULT_TIMEOUT, LatencyTracker, RetryPolicy, hedged_request, timeout_for
+from throttling import OPERATION_RATE_LIMITS, TokenBucket
+
+httpx = lazy_import('httpx')
+
+# Report lifecycles running at the same time; the rest wait for a free slot
+DEFAULT_MAX_IN_FLIGHT = 200
+DEFAULT_MAX_CONNECTIONS = 50
+
+REPORTS_PATH = '/reports/2021-06-30'
+ADS_REPORTS_PATH = '/reporting/reports'
+
+# status is the final processingStatus ('DONE', 'FATAL', 'CANCELLED') or None when a call failed;
+# document is a binary file with the decompressed document when status is 'DONE'
+ReportResult = namedtuple('ReportResult', ['report_id', 'status', 'document'])
+
+
+def httpx_timeout(operation: str) -> httpx.Timeout:
+    connect, read = timeout_for(operation)
+    return httpx.Timeout(read, connect=connect)
+
+
+class AsyncApiClient:
+    """
+    SP-API and Ads API client for one seller account. Use as an async context manager
+    inside a running event loop:
+
+        async with AsyncApiClient(metrics, sp_api_base_url, access_token) as client:
+            results = await asyncio.gather(*(client.report_lifecycle(...) for ...))
+    """
+
+    def __init__(self, metrics, sp_api_base_url: str, access_token: str, ads_api_base_url: str = None,
+                 ads_client_id: str = None, ads_access_token: str = None, report_poll_interval: float = 10,
+                 ads_poll_interval: float = 30, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS, rate_limits: dict = None,
+                 download_threshold: int = RANGED_DOWNLOAD_THRESHOLD, range_part_size: int = RANGE_PART_SIZE,
+                 hedge_downloads: bool = False, download_latency: LatencyTracker = None,
+                 events: EventLog = None):
+        self.metrics = metrics
+        self.sp_api_base_url = sp_api_base_url
+        self.access_token = access_token
+        self.ads_api_base_url = ads_api_base_url
+        self.ads_client_id = ads_client_id
+        self.ads_access_token = ads_access_token
+        self.report_poll_interval = report_poll_interval
+        self.ads_poll_interval = ads_poll_interval
+        self.max_in_flight = max_in_flight
+        self.max_connections = max_connections
+        self.download_threshold = download_threshold
+        self.range_part_size = range_part_size
+        self.hedge_downloads = hedge_downloads
+        self.download_latency = download_latency or LatencyTracker()
+        self.events = events or EventLog()
+        rate_limits = OPERATION_RATE_LIMITS if rate_limits is None else rate_limits
+        self.buckets = {operation: TokenBucket(rate, burst) for operation, (rate, burst) in rate_limits.items()}
+        self._client = None
+        self._in_flight = None
+        self._range_parts = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._range_parts = asyncio.Semaphore(RANGE_WORKERS)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+        self._client = None
+
+    # Transport
+
+    async def throttle(self, operation: str):
+        bucket = self.buckets.get(operation)
+        if bucket is None:
+            return
+        waited = 0.0
+        while True:
+            wait_time = bucket.reserve()
+            if not wait_time:
+                break
+            await asyncio.sleep(wait_time)
+            waited += wait_time
+        if waited:
+            self.metrics.record_wait('client_throttle', waited)
+
+    async def send_request(self, method, url, **kwargs):
+        # Send a single HTTP request and record its duration and status code
+        operation = operation_for(method, url)
+        kwargs.setdefault('timeout', httpx_timeout(operation))
+        start = time.perf_counter()
+        status_code = 'error'
+        try:
+            response = await self._client.request(method.upper(), url, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            self.metrics.record_request(operation, status_code, time.perf_counter() - start)
+
+    async def controlled_request(self, method, url, headers=None, params=None, json_body=None):
+        # Send requests with deadlines; rate limits, server errors and broken connections are retried
+        operation = operation_for(method, url)
+        policy = RetryPolicy(method)
+        while True:
+            await self.throttle(operation)
+            try:
+                response = await self.send_request(method, url, headers=headers, params=params, json=json_body)
+                wait_time = policy.backoff(response.status_code)
+            except httpx.TransportError as e:
+                response = None
+                wait_time = policy.backoff(connect_failed=isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)))
+                if wait_time is None:
+                    logging.error("HTTP Request failed: %s", e)
+            except httpx.HTTPError as e:
+                logging.error("HTTP Request failed: %s", e)
+                return None
+            if wait_time is None:
+                if response is not None and response.status_code == 429:
+                    logging.error("Rate limit hit repeatedly on %s, stopping retries.", operation)
+                    return None
+                return response
+            logging.warning("%s on %s, retrying after %.2f seconds...", policy.reason, operation, wait_time)
+            self.metrics.record_retry(policy.reason)
+            await asyncio.sleep(wait_time)
+            self.metrics.record_wait('rate_limit' if policy.reason == 'rate_limit' else 'retry_backoff', wait_time)
+
+    async def document_request(self, url, headers=None):
+        # Document downloads, hedged with a second request when they run longer than usual
+        if not self.hedge_downloads:
+            return await self.controlled_request('get', url, headers=headers)
+        return await hedged_request(lambda: self.controlled_request('get', url, headers=headers),
+                                    self.download_latency,
+                                    on_hedge=lambda: self.metrics.record_retry('hedged_download'))
+
+    def sp_headers(self):
+        return {'x-amz-access-token': self.access_token, 'Content-Type': 'application/json'}
+
+    def ads_headers(self, scope, content_type=None):
+        headers = {
+            'Amazon-Advertising-API-ClientId': self.ads_client_id,
+            'Amazon-Advertising-API-Scope': scope,
+            'Authorization': f'Bearer {self.ads_access_token}'
+        }
+        if content_type:
+            headers['Content-Type'] = content_type
+        return headers
+
+    async def download(self, url, compression_algorithm=None):
+        """
+        Download a document from its presigned URL, as concurrent Range requests when
+        it is large (see downloads). Returns a binary file with the decompressed
+        content or None.
+        """
+        first = await self.document_request(url, headers=range_header(0, self.range_part_size - 1))
+        if not is_usable_first(first):
+            return None
+        spool = tempfile.TemporaryFile()
+        spool.write(first.content)
+        ranges = remaining_ranges(len(first.content), document_size(first), self.download_threshold,
+                                  self.range_part_size)
+
+        async def fetch_part(start, end):
+            async with self._range_parts:
+                response = await self.document_request(url, headers=range_header(start, end))
+            if not is_part(response, start, end):
+                raise ValueError(f"bytes {start}-{end}: {describe(response)}")
+            # Nothing else writes to the file between these two calls
+            spool.seek(start)
+            spool.write(response.content)
+
+        results = await asyncio.gather(*(fetch_part(start, end) for start, end in ranges), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            spool.close()
+            if not isinstance(failures[0], ValueError):
+                raise failures[0]
+            logging.error("Failed to download document %s", failures[0])
+            return None
+        if ranges:
+            logging.info("Document of %d bytes downloaded in %d ranges.", ranges[-1][1] + 1, len(ranges) + 1)
+        # Decompression of large documents would block the other lifecycles on the loop
+        return await asyncio.to_thread(open_document, spool, compression_algorithm, self.metrics)
+
+    # SP-API reports
+
+    async def create_report(self, report_type, marketplace_id, data_start, data_end, report_options=None):
+        logging.debug("Creating %s report from %s to %s for marketplace %s",
+                      report_type, data_start, data_end, marketplace_id)
+        payload = {
+            'marketplaceIds': [marketplace_id],
+            'reportType': report_type,
+            'dataStartTime': iso_utc(data_start, timespec='milliseconds'),
+            'dataEndTime': iso_utc(data_end, timespec='milliseconds'),
+        }
+        if report_options:
+            payload['reportOptions'] = report_options
+        response = await self.controlled_request('post', f'{self.sp_api_base_url}{REPORTS_PATH}/reports',
+                                                 headers=self.sp_headers(), json_body=payload)
+        if response is not None and response.status_code == 202:
+            self.events.count('reports_created', report_type, reports=1)
+            return response.json().get('reportId')
+        logging.error("Failed to create %s report: %s", report_type,
+                      response.text if response is not None else 'no response')
+        return None
+
+    async def wait_for_report(self, report_id, report_type=None):
+        """
+        Poll a report until it is processed. Returns (processingStatus, reportDocumentId),
+        with a None status when polling failed. The polls are counted by report_type.
+        """
+        url = f'{self.sp_api_base_url}{REPORTS_PATH}/reports/{report_id}'
+        while True:
+            response = await self.controlled_request('get', url, headers=self.sp_headers())
+            if response is None or response.status_code != 200:
+                logging.error("Failed to poll status of report %s: %s", report_id,
+                              response.text if response is not None else 'no response')
+                return None, None
+            report = response.json()
+            status = report.get('processingStatus')
+            logging.debug("Report %s status: %s", report_id, status)
+            self.events.count('report_polls', report_type or 'SP-API reports', polls=1, done=status == 'DONE')
+            if status == 'DONE':
+                return status, report.get('reportDocumentId')
+            if status in ['CANCELLED', 'FATAL']:
+                logging.error("Report %s processing ended with status: %s", report_id, status)
+                return status, None
+            await asyncio.sleep(self.report_poll_interval)
+            self.metrics.record_wait('report_polling', self.report_poll_interval)
+
+    async def get_report_document(self, document_id):
+        """
+        Returns (url, compressionAlgorithm) of a report document, or (None, None).
+        """
+        response = await self.controlled_request(
+            'get', f'{self.sp_api_base_url}{REPORTS_PATH}/documents/{document_id}', headers=self.sp_headers())
+        if response is None or response.status_code != 200:
+            logging.error("Failed to get report document %s: %s", document_id,
+                          response.text if response is not None else 'no response')
+            return None, None
+        document = response.json()
+        return document.get('url'), document.get('compressionAlgorithm', '')
+
+    async def report_lifecycle(self, report_type, marketplace_id, data_start, data_end, report_options=None):
+        """
+        Create a report, wait for it and download its document. Returns a ReportResult.
+        """
+        async with self._in_flight:
+            report_id = await self.create_report(report_type, marketplace_id, data_start, data_end, report_options)
+            if not report_id:
+                return ReportResult(None, None, None)
+            created = time.perf_counter()
+            status, document_id = await self.wait_for_report(report_id, report_type)
+            if status == 'DONE':
+                self.metrics.record_report_duration(report_type, time.perf_counter() - created)
+            if status != 'DONE':
+                return ReportResult(report_id, status, None)
+            url, compression_algorithm = await self.get_report_document(document_id)
+            if not url:
+                return ReportResult(report_id, None, None)
+            document = await self.download(url, compression_algorithm)
+            logging.debug("Report %s (%s) for %s downloaded.", report_id, report_type, marketplace_id)
+            return ReportResult(report_id, status if document is not None else None, document)
+
+    # Amazon Ads reports
+
+    async def create_ads_report(self, scope, payload):
+        response = await self.controlled_request(
+            'post', f'{self.ads_api_base_url}{ADS_REPORTS_PATH}',
+            headers=self.ads_headers(scope, 'application/vnd.createasyncreportrequest.v3+json'), json_body=payload)
+        if response is not None and response.status_code == 200:
+            return response.json().get('reportId')
+        logging.error("Failed to create Amazon Ads report: %s",
+                      response.text if response is not None else 'no response')
+        return None
+
+    async def wait_for_ads_report(self, report_id, scope, ad_product=None):
+        """
+        Poll an Ads report until it is processed. Returns its download URL or None.
+        """
+        url = f'{self.ads_api_base_url}{ADS_REPORTS_PATH}/{report_id}'
+        while True:
+            response = await self.controlled_request('get', url, headers=self.ads_headers(scope))
+            if response is None or response.status_code != 200:
+                logging.error("Failed to poll status of Ads report %s: %s", report_id,
+                              response.text if response is not None else 'no response')
+                return None
+            report = response.json()
+            status = report.get('status')
+            logging.debug("Ads report %s status: %s", report_id, status)
+            self.events.count('report_polls', ad_product or 'Ads reports', polls=1, done=status == 'COMPLETED')
+            if status == 'COMPLETED':
+                return report.get('url')
+            if status in ['FAILURE', 'CANCELLED']:
+                logging.error("Ads report %s processing ended with status: %s", report_id, status)
+                return None
+            await asyncio.sleep(self.ads_poll_interval)
+            self.metrics.record_wait('ads_report_polling', self.ads_poll_interval)
+
+    async def ads_report_lifecycle(self, scope, payload):
+        """
+        Create an Ads report, wait for it and download it. Returns the compressed
+        document, a binary file to be decoded as a stream (iter_ads_records), or None.
+        """
+        ad_product = payload.get('configuration', {}).get('adProduct', 'ads')
+        async with self._in_flight:
+            report_id = await self.create_ads_report(scope, payload)
+            if not report_id:
+                return None
+            self.events.count('reports_created', ad_product, reports=1)
+            created = time.perf_counter()
+            url = await self.wait_for_ads_report(report_id, scope, ad_product)
+            if not url:
+                return None
+            self.metrics.record_report_duration(ad_product, time.perf_counter() - created)
+            return await self.download(url)
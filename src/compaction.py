@@ -0,0 +1,85 @@
+"""
+Compact in-memory representation of the frames a step accumulates before writing.
+
+Report frames come out of the parsers with a text column for every field. Frames
+that are kept until the end of a step are compacted first: repetitive text columns
+(marketplace ids, currencies, statuses, rank types, one timestamp per run) become
+categoricals, integer columns the smallest type that holds them. Values written to
+the CSV do not change. Run-constant columns such as extracted_at are not stored at
+all and are added when the table is written.
+"""
+from __future__ import annotations
+
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Always categorical: few distinct values however small the frame
+CATEGORY_COLUMNS = {'marketplace_id', 'marketplace_name', 'currency', 'currency_code', 'status', 'order_status',
+                    'rank_type', 'condition', 'fulfillment_channel', 'event_type', 'transaction_type', 'country',
+                    'disposition', 'ad_product'}
+# Other text columns become categorical when they have at most this share of distinct values
+MAX_CATEGORY_RATIO = 0.5
+MIN_CATEGORY_ROWS = 64
+
+
+def constant_column(value, length: int) -> pd.Categorical:
+    # A column with one value in every row, stored as one category and int8 codes
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+
+def _is_text(series: pd.Series) -> bool:
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def compact_frame(df: pd.DataFrame, category_columns=CATEGORY_COLUMNS) -> pd.DataFrame:
+    """
+    df with repetitive text columns as categoricals and integer columns downcast.
+    Floats are kept: narrower floats would change the values written.
+    """
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+            # Row fingerprints hash unsigned and signed values alike only when they are not negative
+            if len(series) and series.min() >= 0:
+                columns[name] = pd.to_numeric(series, downcast='unsigned')
+        elif _is_text(series) and (name in category_columns or len(series) >= MIN_CATEGORY_ROWS):
+            try:
+                distinct = series.nunique(dropna=True)
+            except TypeError:
+                # Lists and dicts in the cells
+                continue
+            if name in category_columns or distinct <= MAX_CATEGORY_RATIO * len(series):
+                columns[name] = series.astype('category')
+    if not columns:
+        return df
+    return df.assign(**columns)
+
+
+def concat_frames(frames) -> pd.DataFrame:
+    """
+    Concatenate compacted frames. Categorical columns get the union of the frames'
+    categories first, so they stay categorical instead of turning back into text.
+    """
+    frames = list(frames)
+    categorical = {name for frame in frames for name, dtype in frame.dtypes.items()
+                   if isinstance(dtype, pd.CategoricalDtype)}
+    for name in categorical:
+        values = [frame[name].cat.categories if isinstance(frame[name].dtype, pd.CategoricalDtype)
+                  else pd.Index(frame[name].dropna().unique()) for frame in frames if name in frame.columns]
+        dtype = pd.CategoricalDtype(pd.Index(dict.fromkeys(value for index in values for value in index)))
+        frames = [frame.assign(**{name: frame[name].astype(dtype)}) if name in frame.columns else frame
+                  for frame in frames]
+    # Columns missing in some frames come back as text and are compacted again
+    return compact_frame(pd.concat(frames, ignore_index=True))
+
+
+def with_constants(df: pd.DataFrame, constants: dict) -> pd.DataFrame:
+    # df with the run-constant columns added at the end, for writing
+    if not constants:
+        return df
+    return df.assign(**{name: constant_column(value, len(df)) for name, value in constants.items()})
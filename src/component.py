@@ -1,19 +1,50 @@
 import logging
 import requests
+import urllib3
 from datetime import datetime, timedelta
-import pandas as pd
-from keboola.component.base import ComponentBase
+from keboola.component.base import ComponentBase, sync_action
 import time
-import gzip
-import io
 import json
-import xml.etree.ElementTree as ET
+import math
 import warnings
-import re
 import random
 import inspect
-import ast
 import gc
+import os
+import asyncio
+import copy
+import shutil
+import tempfile
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from async_client import AsyncApiClient
+from compaction import compact_frame, concat_frames, constant_column, with_constants
+from csv_output import CsvTableWriter, merge_tables
+from dates import DateFormats, RunClock, iso_utc
+from downloads import RANGE_WORKERS, download_document, open_document
+from fingerprints import (VOLATILE_COLUMNS, FingerprintStore, frame_fingerprints, record_fingerprints,
+                          record_key_indexes)
+from flattening import (SALES_RANK_COLUMNS, ColumnBuffer, append_sales_ranks, flatten_json, flatten_leaves,
+                        records_to_frame)
+from lazy import lazy_import
+from logs import EventLog, configure_logging
+from memory import MemoryGovernor
+from metrics import RunMetrics, operation_for
+from offload import ParsePool, parse_financial_events, parse_order_records, parse_return_records, parse_settlement
+from planner import (SETTLEMENT_PERIOD_DAYS, STATE_PAGE_COUNTS, STATE_REPORT_DURATIONS, RequestPlan,
+                     combine_estimates, remember_report_durations)
+from parsers import ADS_COLUMNS, ADS_REPORT_COLUMNS, ORDERS_COLUMNS, RETURNS_COLUMNS, ReportParsers
+from profiling import StepProfiler
+from regions import DEFAULT_REGION, REGIONS, group_by_region
+from retries import LatencyTracker, RetryPolicy, hedged_call, timeout_for
+from segmentation import AdaptiveSegments
+from sharding import (PLAN_FILE_NAME, SHARD_OUTPUT_TAG, STEPS, build_plan, merge_deduplicated, plan_id,
+                      read_plan_files, shard_file_name, shard_items, shard_paths, write_plan_file)
+from throttling import CircuitBreaker, TokenBucket
+
+pd = lazy_import('pandas')
 
 # Suppress FutureWarnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -28,6 +59,60 @@ KEY_REFRESH_TOKEN_ADS = '#refresh_token_ads'
 KEY_APP_ID_ADS = '#app_id_ads'
 KEY_CLIENT_SECRET_ID_ADS = '#client_secret_id_ads'
 KEY_STORES = 'stores'
+KEY_ADS_INITIAL_DAYS = 'ads_initial_days'  # days requested for a store and ad product seen for the first time
+KEY_ADS_SETTLEMENT_DAYS = 'ads_settlement_days'  # most recent days requested again by the next run
+KEY_INVENTORY_CHANGED_SINCE = 'inventory_changed_since'
+KEY_SP_API_BASE_URL = 'sp_api_base_url'
+KEY_ADS_API_BASE_URL = 'ads_api_base_url'
+KEY_LWA_TOKEN_URL = 'lwa_token_url'
+KEY_PROFILING = 'profiling'
+KEY_MEMORY_BUDGET_MB = 'memory_budget_mb'
+KEY_PARSE_WORKERS = 'parse_workers'
+KEY_HEDGE_DOWNLOADS = 'hedge_downloads'
+KEY_CHANGED_ROWS_ONLY = 'changed_rows_only'
+KEY_REGIONS = 'regions'  # per-region credentials and endpoint overrides
+KEY_ACCOUNTS = 'accounts'  # batch mode: seller accounts with their own credentials and marketplaces
+KEY_ACCOUNT_NAME = 'name'
+KEY_ACCOUNT_WORKERS = 'account_workers'
+KEY_SHARDING = 'sharding'  # shard_index and shard_count of a sharded run, or merge to combine the shards
+KEY_SHARD_INDEX = 'shard_index'
+KEY_SHARD_COUNT = 'shard_count'
+KEY_SHARD_MERGE = 'merge'
+KEY_LOG_FORMAT = 'log_format'  # 'text' (default) or 'json'
+
+# API endpoints; SP-API and Ads API hosts follow the region of the marketplaces (see regions.py) and are
+# overridable in the configuration, for all regions or per region (e.g. to point at a local stand-in server)
+DEFAULT_LWA_TOKEN_URL = 'https://api.amazon.com/auth/o2/token'
+
+# Waits between status checks and downloads, in seconds
+REPORT_POLL_INTERVAL = 10
+ADS_REPORT_POLL_INTERVAL = 30
+SETTLEMENT_DOWNLOAD_PACING = 3
+
+METRICS_FILE_NAME = 'run_metrics.json'
+# Row fingerprints of the previous run come back through a file input mapping on this tag
+FINGERPRINTS_FILE_NAME = 'row_fingerprints.sqlite'
+FINGERPRINTS_TAG = 'row_fingerprints'
+
+# Profiling can also be switched on from the environment without touching the configuration
+ENV_PROFILING = 'AMAZON_EX_PROFILING'  # '1' profiles every step
+ENV_LOG_FORMAT = 'AMAZON_EX_LOG_FORMAT'  # overrides log_format
+ENV_PROFILING_WALL_CLOCK = 'AMAZON_EX_PROFILING_WALL_CLOCK'  # wall-clock sampling interval in seconds
+DEFAULT_PROFILING_TOP_N = 30
+
+# Worker processes for parsing; by default all cores but the one running the main process
+DEFAULT_PARSE_WORKERS = min(max((os.cpu_count() or 1) - 1, 0), 4)
+# Steps whose reports are parsed in the worker processes
+PARSE_WORKER_STEPS = ('run_orders', 'run_returns', 'run_finances', 'run_settlement_report')
+
+# Rows per chunk for each parsed stream until the memory governor has measured its rows
+INITIAL_CHUNK_ROWS = {
+    'orders': 2000,
+    'settlement': 5000,
+    'returns': 2000,
+    'ledger': 5000,
+    'ads': 5000,
+}
 
 # Amazon marketplaces configuration keys
 KEY_MARKETPLACES = 'marketplaces'
@@ -47,33 +132,172 @@ KEY_RUN_SELLER_FEEDBACK = 'run_seller_feedback'
 KEY_RUN_PERFORMANCE_REPORT = 'run_performance_report'
 KEY_RUN_SETTLEMENT_REPORT = 'run_settlement_report'
 
-class Component(ComponentBase):
+# State file keys
+STATE_INVENTORY_LAST_RUN = 'inventory_last_run'  # marketplace_id -> start of last complete inventory fetch
+STATE_REPORT_DENSITY = 'report_density'  # learned rows per day by report type and marketplace
+STATE_ACCOUNTS = 'accounts'  # batch mode: account name -> the state of that account
+STATE_ADS_SETTLED = 'ads_settled_through'  # store name -> ad product -> last date no longer requested again
+
+# Longest date range one report may cover when the learned density allows merging segments
+REPORT_MAX_SEGMENT_DAYS = {
+    'GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL': 30,
+    'GET_XML_RETURNS_DATA_BY_RETURN_DATE': 60,
+}
+
+LEDGER_REPORT_OPTIONS = {
+    'GET_LEDGER_DETAIL_VIEW_DATA': None,
+    'GET_LEDGER_SUMMARY_VIEW_DATA': {'aggregatedByTimePeriod': 'DAILY', 'aggregateByLocation': 'COUNTRY'},
+}
+ADS_PRODUCTS = ['SPONSORED_PRODUCTS', 'SPONSORED_BRANDS', 'SPONSORED_DISPLAY']
+ADS_PRIMARY_KEYS = ['ad_id', 'campaign_id', 'date', 'advertised_sku', 'advertised_asin']
+# Ads reports are incremental from the settled dates; clicks and conversions keep being attributed for a few days
+DEFAULT_ADS_INITIAL_DAYS = 10
+DEFAULT_ADS_SETTLEMENT_DAYS = 3
+ADS_MAX_WINDOW_DAYS = 31  # longest range of one Ads report
+ADS_RETENTION_DAYS = 95  # oldest day the Ads API reports on
+
+# Batch mode: account and region extractions running at the same time, and the column naming the account
+DEFAULT_ACCOUNT_WORKERS = 8
+ACCOUNT_COLUMN = 'account'
+
+# Threads for hedged downloads: every ranged part may run with its hedge
+HEDGE_MAX_WORKERS = 2 * RANGE_WORKERS + 2
+
+# Catalog (strategic products) fetch engine
+CATALOG_BATCH_SIZE = 20  # searchCatalogItems accepts up to 20 identifiers per request
+CATALOG_MAX_WORKERS = 4
+CATALOG_MAX_RETRIES = 3
+CATALOG_BREAKER_THRESHOLD = 5  # consecutive failed batches before a marketplace is abandoned
+
+
+class Component(ReportParsers, ComponentBase):
     def __init__(self):
         super().__init__()
         self.setup_logging()
-        self.all_ads_data = pd.DataFrame()
+        self.sp_api_base_url = REGIONS[DEFAULT_REGION].sp_api_base_url
+        self.ads_api_base_url = REGIONS[DEFAULT_REGION].ads_api_base_url
+        self.lwa_token_url = DEFAULT_LWA_TOKEN_URL
+        self.metrics = RunMetrics()
+        # Counters of the events repeated in hot loops, logged as rate-limited summaries
+        self.events = EventLog()
+        self.profiler = None
+        self.memory = MemoryGovernor(initial_chunk_rows=INITIAL_CHUNK_ROWS)
+        self.fatal_report_ids = set()
+        self.parse_pool = None
+        self.hedge_executor = None
+        self.download_latency = LatencyTracker()
+        self.fingerprints = None
+        self.regions = {}
+        self.region_cfg = {}
+        self.region_name = None
+        self.staging_tables_path = None
+        self.accounts = []
+        self.account_name = None
+        self.plan_step = None
+        self.shard_index, self.shard_count, self.merge_shard_outputs = 0, 1, False
+        # Primary keys of the output tables by name, shared by all copies
+        self.table_primary_keys = {}
+        self.extract_sp_api = True
+        # Report id -> (report type, creation time) of the reports being polled
+        self.report_created = {}
+        # Report type -> seconds to process, recorded in previous runs; read by the request planner
+        self.report_durations = {}
+        # One reference timestamp for the windows and extracted_at stamps of the run
+        self.clock = RunClock()
+        self.date_formats = DateFormats()
 
     def setup_logging(self):
-        logging.basicConfig(level=logging.INFO,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
+        configure_logging(os.environ.get(ENV_LOG_FORMAT) or self.configuration.parameters.get(KEY_LOG_FORMAT, 'text'))
 
-    @staticmethod
-    def get_date_days_ago(days, date_format='%Y-%m-%dT%H:%M:%S.%fZ'):
-        # Return a formatted string of the datetime days ago from now
-        date = datetime.utcnow() - timedelta(days=days)
-        return date.strftime(date_format)
+    def get_date_days_ago(self, days, date_format='%Y-%m-%dT%H:%M:%S.%fZ'):
+        # Return a formatted string of the datetime days before the start of the run
+        return self.clock.days_ago(days).strftime(date_format)
 
-    @staticmethod
-    def camel_to_snake(name: str) -> str:
-        s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
-        return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+    def run(self):
+        self.read_parameters()
+        params = self.configuration.parameters
+        # Memory budget, defaults to a share of the container limit
+        if params.get(KEY_MEMORY_BUDGET_MB):
+            self.memory = MemoryGovernor(int(params[KEY_MEMORY_BUDGET_MB]) * 2 ** 20, INITIAL_CHUNK_ROWS)
+        logging.info("Memory budget: %.0f MiB", self.memory.budget_bytes / 2 ** 20)
+        # Parse worker processes
+        parse_workers = int(params.get(KEY_PARSE_WORKERS, DEFAULT_PARSE_WORKERS))
+        if parse_workers > 0 and self.parses_in_workers():
+            self.parse_pool = ParsePool(parse_workers, self.memory.budget_bytes, INITIAL_CHUNK_ROWS)
+            logging.info("Parsing reports in %d worker processes.", parse_workers)
+        # Hedged document downloads: a second request when a download runs longer than the p95
+        if params.get(KEY_HEDGE_DOWNLOADS, False):
+            self.hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS)
+        # Only rows that are new or changed since the previous run are written
+        if params.get(KEY_CHANGED_ROWS_ONLY, False):
+            self.fingerprints = self.open_fingerprints()
+        # Profiling
+        profiling_cfg = params.get(KEY_PROFILING, {})
+        if profiling_cfg.get('enabled') or os.environ.get(ENV_PROFILING) == '1':
+            self.profiler = StepProfiler(
+                self.files_out_path,
+                top_n=int(profiling_cfg.get('top_n', DEFAULT_PROFILING_TOP_N)),
+                wall_clock_interval=float(os.environ.get(ENV_PROFILING_WALL_CLOCK,
+                                                         profiling_cfg.get('wall_clock_interval', 0)))
+            )
 
-    @staticmethod
-    def shorten_column(name: str) -> str:
-        token = re.split(r'[._]', name)[-1]
-        return Component.camel_to_snake(token)
+        # Refresh tokens; in batch mode every account refreshes its own, merging shard outputs needs none
+        if not (self.accounts or self.merge_shard_outputs):
+            self.refresh_amazon_token()
+            self.refresh_amazon_ads_token()
 
-    def run(self):
+            if not getattr(self, 'access_token', None):
+                logging.error('Failed to refresh Seller Central token.')
+                return
+
+        succeeded = False
+        try:
+            if self.merge_shard_outputs:
+                with self.metrics.stage('merge_shards'):
+                    self.merge_shards()
+            elif self.shard_count > 1:
+                with self.profile_step('shard'):
+                    self.extract_shard()
+            elif self.accounts:
+                with self.profile_step('accounts'):
+                    self.extract_accounts()
+            elif len(self.regions) > 1:
+                with self.profile_step('regions'):
+                    self.extract_parallel([self.for_region(region) for region in self.regions], len(self.regions))
+            else:
+                self.extract()
+            succeeded = True
+        finally:
+            if self.parse_pool:
+                self.parse_pool.shutdown()
+            if self.hedge_executor:
+                # Losing hedged requests are not waited for
+                self.hedge_executor.shutdown(wait=False, cancel_futures=True)
+            if self.fingerprints:
+                self.fingerprints.close()
+                # A failed run keeps the previous fingerprints, its rows were not loaded
+                if succeeded:
+                    self.write_manifest(self.create_out_file_definition(
+                        FINGERPRINTS_FILE_NAME, tags=[FINGERPRINTS_TAG], is_permanent=True))
+            self.events.flush()
+            self.write_metrics()
+            if self.profiler:
+                for file_name in self.profiler.written_files:
+                    self.write_manifest(self.create_out_file_definition(file_name, tags=['profiling']))
+
+        # Processing times of this run's reports, for the request planner
+        remember_report_durations(self.state, self.metrics.mean_report_durations())
+        self.write_state_file(self.state)
+
+    def parses_in_workers(self):
+        # Only some steps parse in worker processes; other runs do not start the pool (or import multiprocessing)
+        return not self.merge_shard_outputs and any(getattr(self, flag) for flag in PARSE_WORKER_STEPS)
+
+    def read_parameters(self):
+        """
+        Read credentials, steps, marketplaces, regions, accounts and sharding from the
+        configuration, and the state.
+        """
         params = self.configuration.parameters
         # Seller Central credentials
         self.refresh_token = params.get(KEY_REFRESH_TOKEN)
@@ -99,152 +323,649 @@ class Component(ComponentBase):
         self.app_id_ads = params.get(KEY_APP_ID_ADS)
         self.client_secret_id_ads = params.get(KEY_CLIENT_SECRET_ID_ADS)
         self.stores = params.get(KEY_STORES, [])
+        self.ads_initial_days = int(params.get(KEY_ADS_INITIAL_DAYS, DEFAULT_ADS_INITIAL_DAYS))
+        self.ads_settlement_days = int(params.get(KEY_ADS_SETTLEMENT_DAYS, DEFAULT_ADS_SETTLEMENT_DAYS))
         # Marketplaces
         self.marketplaces_cfg = params.get(KEY_MARKETPLACES, [])
         self.marketplace_ids = [m['marketplace_id'] for m in self.marketplaces_cfg]
+        self.inventory_changed_since = params.get(KEY_INVENTORY_CHANGED_SINCE, False)
+        self.state = self.get_state_file() or {}
+        # Regions of the marketplaces and stores, each with its own endpoints and tokens
+        self.regions = group_by_region(self.marketplaces_cfg, self.stores) or {DEFAULT_REGION: ([], [])}
+        self.region_cfg = params.get(KEY_REGIONS, {})
+        self.sp_api_base_url, self.ads_api_base_url = self.region_endpoints(next(iter(self.regions)))
+        if len(self.regions) == 1:
+            only_region = self.region_cfg.get(next(iter(self.regions)), {})
+            self.refresh_token = only_region.get(KEY_REFRESH_TOKEN, self.refresh_token)
+            self.refresh_token_ads = only_region.get(KEY_REFRESH_TOKEN_ADS, self.refresh_token_ads)
+        self.lwa_token_url = params.get(KEY_LWA_TOKEN_URL, DEFAULT_LWA_TOKEN_URL)
+        # Batch mode: the accounts replace the credentials, marketplaces and stores above
+        self.accounts = params.get(KEY_ACCOUNTS, [])
+        self.account_workers = int(params.get(KEY_ACCOUNT_WORKERS, DEFAULT_ACCOUNT_WORKERS))
+        # Sharded runs extract their part of the run plan, a merge run combines the shard outputs
+        sharding_cfg = params.get(KEY_SHARDING, {})
+        self.shard_index = int(sharding_cfg.get(KEY_SHARD_INDEX, 0))
+        self.shard_count = int(sharding_cfg.get(KEY_SHARD_COUNT, 1))
+        self.merge_shard_outputs = bool(sharding_cfg.get(KEY_SHARD_MERGE, False))
+
+    def extract(self):
+        """
+        Run the enabled extraction steps and the ads flow.
+        """
+        steps = [
+            (self.run_inventory, 'inventory', 'Executing FBA inventory snapshot...', self.handle_inventory),
+            (self.run_inventory_planning, 'inventory_planning', 'Executing FBA inventory planning snapshot...',
+             self.handle_inventory_planning),
+            (self.run_orders, 'orders', 'Executing FBM orders...', self.handle_orders),
+            (self.run_returns, 'returns', 'Executing FBM returns...', self.handle_returns),
+            (self.run_finances, 'finances', 'Executing FBM finances...', self.handle_finances),
+            (self.run_strategic_products, 'strategic_products', 'Executing Amazon strategic products...',
+             self.handle_strategic_products),
+            (self.run_seller_feedback, 'seller_feedback', 'Executing Amazon seller feedback...',
+             self.handle_seller_feedback),
+            (self.run_performance_report, 'performance_report', 'Executing Amazon performance report...',
+             self.handle_performance_report),
+            (self.run_settlement_report, 'settlement_report', 'Executing Amazon settlement report...',
+             self.handle_settlement_report),
+            # FBA ledger reports (detail and summary) need correct date ordering
+            (self.run_ledger, 'ledger', 'Generating FBA ledger detail and summary view reports...',
+             self.handle_ledger),
+        ]
 
-        # Refresh tokens
-        self.refresh_amazon_token()
-        self.refresh_amazon_ads_token()
+        for enabled, name, message, handler in steps:
+            if enabled and self.extract_sp_api:
+                logging.info(message)
+                with self.metrics.stage(name), self.profile_step(name):
+                    handler()
+                self.events.flush()
 
-        if not getattr(self, 'access_token', None):
-            logging.error('Failed to refresh Seller Central token.')
-            return
+        # Ads reports flow
+        if self.run_ads and getattr(self, 'ads_access_token', None):
+            logging.info('Executing Amazon Ads reports...')
+            with self.metrics.stage('ads'), self.profile_step('ads'):
+                self.handle_ads()
+            self.events.flush()
+        elif self.run_ads:
+            logging.error('Failed to refresh Ads token.')
+        else:
+            logging.info('Skipping Amazon Ads reports as per configuration.')
+
+    def plan_requests(self):
+        """
+        The API operations extract() would perform, as a RequestPlan. Nothing is called:
+        segments, pages and report durations come from the configuration and the state.
+        """
+        plan = RequestPlan(self.report_durations, REPORT_POLL_INTERVAL, ADS_REPORT_POLL_INTERVAL)
+        page_counts = self.state.get(STATE_PAGE_COUNTS, {})
+        marketplace_ids = self.marketplace_ids if self.extract_sp_api else []
+
+        def segment_count(report_type, mp, default_days):
+            # Iterating without recording rows yields the segments of the learned density
+            return len(list(self.adaptive_segments(report_type, mp, default_days)))
 
-        # Core flows
         if self.run_inventory:
-            logging.info('Executing FBA inventory snapshot...')
-            self.handle_inventory()
+            for mp in marketplace_ids:
+                plan.calls('inventory', 'getInventorySummaries', page_counts.get('inventory', {}).get(mp, 1))
         if self.run_inventory_planning:
-            logging.info('Executing FBA inventory planning snapshot...')
-            self.handle_inventory_planning()
-        if self.run_orders:
-            logging.info('Executing FBM orders...')
-            self.handle_orders()
+            for mp in marketplace_ids:
+                plan.reports('inventory_planning', 'GET_FBA_INVENTORY_PLANNING_DATA',
+                             segment_count('GET_FBA_INVENTORY_PLANNING_DATA', mp, 30))
+        # Orders and settlements are requested for the first marketplace only
+        if self.run_orders and marketplace_ids:
+            report_type = 'GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL'
+            plan.reports('orders', report_type, segment_count(report_type, marketplace_ids[0], 15))
         if self.run_returns:
-            logging.info('Executing FBM returns...')
-            self.handle_returns()
-        if self.run_finances:
-            logging.info('Executing FBM finances...')
-            self.handle_finances()
-        if self.run_strategic_products:
-            logging.info('Executing Amazon strategic products...')
-            self.handle_strategic_products()
+            report_type = 'GET_XML_RETURNS_DATA_BY_RETURN_DATE'
+            for mp in marketplace_ids:
+                plan.reports('returns', report_type, segment_count(report_type, mp, 50))
+        if self.run_finances and marketplace_ids:
+            finances = page_counts.get('finances')
+            pages = math.ceil(finances['pages'] * self.date_range / finances['days']) if finances else 1
+            plan.calls('finances', 'listFinancialEvents', max(pages, 1))
+        if self.run_strategic_products and marketplace_ids:
+            batches = math.ceil(self.strategic_asin_count() / CATALOG_BATCH_SIZE)
+            plan.calls('strategic_products', 'searchCatalogItems', batches * len(marketplace_ids))
         if self.run_seller_feedback:
-            logging.info('Executing Amazon seller feedback...')
-            self.handle_seller_feedback()
-        if self.run_performance_report:
-            logging.info('Executing Amazon performance report...')
-            self.handle_performance_report()
-        if self.run_settlement_report:
-            logging.info('Executing Amazon settlement report...')
-            self.handle_settlement_report()
-        # FBA ledger reports (detail and summary) need correct date ordering
+            for mp in marketplace_ids:
+                plan.reports('seller_feedback', 'GET_SELLER_FEEDBACK_DATA',
+                             segment_count('GET_SELLER_FEEDBACK_DATA', mp, 100))
+        if self.run_performance_report and marketplace_ids:
+            plan.reports('performance_report', 'GET_V2_SELLER_PERFORMANCE_REPORT',
+                         math.ceil(self.date_range / 100) * len(marketplace_ids))
+        if self.run_settlement_report and marketplace_ids:
+            plan.calls('settlement_report', 'getReports', math.ceil(self.date_range / 50))
+            settlements = math.ceil(self.date_range / SETTLEMENT_PERIOD_DAYS)
+            for operation in ('getReport', 'getReportDocument', 'downloadDocument'):
+                plan.calls('settlement_report', operation, settlements)
+            plan.wait('settlement_report', settlements * SETTLEMENT_DOWNLOAD_PACING)
         if self.run_ledger:
-            logging.info('Generating FBA ledger detail and summary view reports...')
-            start_dt = datetime.utcnow() - timedelta(days=self.date_range)
-            end_dt = datetime.utcnow()
-            
-            all_details = []
-            all_summaries = []
+            for report_type in LEDGER_REPORT_OPTIONS:
+                plan.reports('ledger', report_type, len(marketplace_ids), concurrent=True)
+        if self.run_ads and self.refresh_token_ads and self.stores:
+            for ad_product in ADS_PRODUCTS:
+                plan.ads_reports('ads', ad_product,
+                                 sum(len(self.ads_windows(store, ad_product)) for store in self.stores))
+        return plan
+
+    def strategic_asin_count(self):
+        # Distinct ASINs of the input table, as read by listings_extract
+        input_tables = self.get_input_tables_definitions()
+        if not input_tables:
+            return 0
+        return pd.read_csv(input_tables[0].full_path, usecols=['products_asin'])['products_asin'].nunique()
 
-            for mp in self.marketplace_ids:
-                detail_id = self.create_ledger_report(start_dt, end_dt, 'GET_LEDGER_DETAIL_VIEW_DATA', marketplace_id=mp)
-                
-                if detail_id:
-                    df_detail = self.poll_report_status_and_download(detail_id, pd.DataFrame(), f'inventory_ledger_detail_{mp}.csv', False, [])
-                    
-                    if not df_detail.empty:
-                        df_detail['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        
-                        logging.info(f"Original ledger detail rows for {mp}: {len(df_detail)}")
-                        deduplicated_df = df_detail.drop_duplicates(keep='first')
-                        logging.info(f"After deduplication, ledger detail rows for {mp}: {len(deduplicated_df)}")
-                        
-                        all_details.append(deduplicated_df)
+    @sync_action('plan')
+    def plan(self):
+        """
+        Estimate the API calls, usage plan consumption and wall time of a run of this
+        configuration from the configuration and the state, without calling the API.
+        """
+        self.read_parameters()
+        self.report_durations = self.state.get(STATE_REPORT_DURATIONS, {})
+        if self.accounts:
+            extractions, workers = self.account_extractions(refresh_tokens=False), self.account_workers
+        elif len(self.regions) > 1:
+            extractions = [self.for_region(region, refresh_tokens=False) for region in self.regions]
+            workers = len(extractions)
+        else:
+            extractions, workers = [self], 1
+        estimates = []
+        for extraction in extractions:
+            label = '/'.join(filter(None, [extraction.account_name,
+                                           extraction.region_name or next(iter(self.regions))]))
+            estimates.append((label, extraction.plan_requests().estimate()))
+        return combine_estimates(estimates, workers)
+
+    def region_endpoints(self, region):
+        # SP-API and Ads API base URLs of a region: its own overrides, then the global ones, then the region's hosts
+        overrides = self.region_cfg.get(region, {})
+        params = self.configuration.parameters
+        sp_api_base_url = (overrides.get(KEY_SP_API_BASE_URL) or params.get(KEY_SP_API_BASE_URL)
+                           or REGIONS[region].sp_api_base_url)
+        ads_api_base_url = (overrides.get(KEY_ADS_API_BASE_URL) or params.get(KEY_ADS_API_BASE_URL)
+                            or REGIONS[region].ads_api_base_url)
+        return sp_api_base_url.rstrip('/'), ads_api_base_url.rstrip('/')
 
-                summary_id = self.create_ledger_report(start_dt, end_dt, 'GET_LEDGER_SUMMARY_VIEW_DATA', marketplace_id=mp)
+    def for_region(self, region, refresh_tokens=True):
+        """
+        A copy of the component that extracts the marketplaces and stores of one region.
+        It shares metrics, state, pools and the fingerprint store with this component;
+        endpoints, tokens and rate-limit buckets are its own.
+        """
+        marketplaces, stores = self.regions[region]
+        regional = copy.copy(self)
+        regional.region_name = region
+        regional.marketplaces_cfg = marketplaces
+        regional.marketplace_ids = [m['marketplace_id'] for m in marketplaces]
+        regional.stores = stores
+        # A region with ads stores only has no SP-API data to extract
+        regional.extract_sp_api = self.extract_sp_api and bool(marketplaces)
+        regional.sp_api_base_url, regional.ads_api_base_url = self.region_endpoints(region)
+        regional.profiler = None
+        # Regions the seller authorized separately have their own refresh tokens
+        overrides = self.region_cfg.get(region, {})
+        if not refresh_tokens:
+            return regional
+        if overrides.get(KEY_REFRESH_TOKEN):
+            regional.refresh_token = overrides[KEY_REFRESH_TOKEN]
+            regional.access_token = None
+            regional.refresh_amazon_token()
+            if not regional.access_token:
+                logging.error('Failed to refresh Seller Central token of region %s.', region)
+                regional.extract_sp_api = False
+        if overrides.get(KEY_REFRESH_TOKEN_ADS):
+            regional.refresh_token_ads = overrides[KEY_REFRESH_TOKEN_ADS]
+            regional.ads_access_token = None
+            regional.refresh_amazon_ads_token()
+        return regional
+
+    def for_account(self, account_cfg, refresh_tokens=True):
+        """
+        A copy of the component for one account of the batch, with the account's
+        credentials, marketplaces, stores and regions and its own part of the state.
+        """
+        name = account_cfg[KEY_ACCOUNT_NAME]
+        account = copy.copy(self)
+        account.account_name = name
+        account.refresh_token = account_cfg.get(KEY_REFRESH_TOKEN)
+        account.refresh_token_ads = account_cfg.get(KEY_REFRESH_TOKEN_ADS)
+        # The developer applications are usually shared by all accounts
+        account.app_id = account_cfg.get(KEY_APP_ID, self.app_id)
+        account.client_secret_id = account_cfg.get(KEY_CLIENT_SECRET_ID, self.client_secret_id)
+        account.app_id_ads = account_cfg.get(KEY_APP_ID_ADS, self.app_id_ads)
+        account.client_secret_id_ads = account_cfg.get(KEY_CLIENT_SECRET_ID_ADS, self.client_secret_id_ads)
+        account.marketplaces_cfg = account_cfg.get(KEY_MARKETPLACES, [])
+        account.marketplace_ids = [m['marketplace_id'] for m in account.marketplaces_cfg]
+        account.stores = account_cfg.get(KEY_STORES, [])
+        account.region_cfg = account_cfg.get(KEY_REGIONS, {})
+        account.regions = group_by_region(account.marketplaces_cfg, account.stores) or {DEFAULT_REGION: ([], [])}
+        # Learned densities and inventory cursors are per marketplace of one selling partner
+        account.state = self.state.setdefault(STATE_ACCOUNTS, {}).setdefault(name, {})
+        if not refresh_tokens:
+            account.run_ads = self.run_ads and bool(account.refresh_token_ads)
+            return account
+        account.access_token = None
+        account.ads_access_token = None
+        account.refresh_amazon_token()
+        if account.refresh_token_ads:
+            account.refresh_amazon_ads_token()
+        else:
+            # Accounts without Ads credentials have no ads reports
+            account.run_ads = False
+        if not account.access_token:
+            logging.error('Failed to refresh Seller Central token of account %s.', name)
+            account.extract_sp_api = False
+        return account
+
+    def account_extractions(self, refresh_tokens=True):
+        # Batch mode: one extraction per region of every account
+        names = [account_cfg.get(KEY_ACCOUNT_NAME) for account_cfg in self.accounts]
+        if not all(names) or len(set(names)) < len(names):
+            raise ValueError("Every account needs a unique name.")
+        extractions = []
+        for account_cfg in self.accounts:
+            account = self.for_account(account_cfg, refresh_tokens)
+            extractions.extend(account.for_region(region, refresh_tokens) for region in account.regions)
+        return extractions
+
+    def extract_accounts(self):
+        """
+        Batch mode: extract the regions of all accounts in parallel and merge them into
+        the output tables with an account column.
+        """
+        self.extract_parallel(self.account_extractions(), self.account_workers)
 
-                if summary_id:
-                    df_summary = self.poll_report_status_and_download(summary_id, pd.DataFrame(), f'inventory_ledger_summary_{mp}.csv', False, [])
-                    
-                    if not df_summary.empty:
-                        df_summary['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        all_summaries.append(df_summary)
-
-            # After the loop, combine and process the aggregated data
-            if all_details:
-                final_detail_df = pd.concat(all_details, ignore_index=True)
-                final_detail_df.drop_duplicates(keep='first', inplace=True) # Maybe redundant, but at least we will be safe
-                logging.info(f"Total processed ledger detail rows from all marketplaces after deduplication: {len(final_detail_df)}")
-                self.process_data(final_detail_df, 'inventory_ledger_detail.csv', [])
-            
-            if all_summaries:
-                final_summary_df = pd.concat(all_summaries, ignore_index=True)
-                final_summary_df.drop_duplicates(keep='first', inplace=True) # Maybe redundant, but at least we will be safe
-                logging.info(f"Total processed ledger summary rows from all marketplaces after deduplication: {len(final_summary_df)}")
-                self.process_data(final_summary_df, 'inventory_ledger_summary.csv', [])
+    def for_step(self, step, targets):
+        """
+        A copy of a region extraction that runs only `step`, for the marketplaces or ads
+        stores in targets (None: all of them).
+        """
+        part = copy.copy(self)
+        part.plan_step = step
+        for name in STEPS:
+            setattr(part, f'run_{name}', name == step)
+        if step == 'ads':
+            part.stores = [store for store in self.stores if store['name'] in targets]
+        elif None not in targets:
+            part.marketplaces_cfg = [m for m in self.marketplaces_cfg if m['marketplace_id'] in targets]
+            part.marketplace_ids = [m['marketplace_id'] for m in part.marketplaces_cfg]
+        return part
+
+    def extract_shard(self):
+        """
+        Build the run plan, extract the items of this shard and write its tables as shard
+        output files together with the plan file.
+        """
+        if self.accounts:
+            extractions = self.account_extractions()
+        else:
+            extractions = [self.for_region(region) for region in self.regions]
+        items = build_plan([
+            (e.account_name, e.region_name, [step for step in STEPS if getattr(e, f'run_{step}')], e.marketplace_ids,
+             [store['name'] for store in e.stores])
+            for e in extractions])
+        plan = plan_id(items, self.shard_count)
+        own_items = shard_items(items, self.shard_index, self.shard_count)
+        logging.info("Run plan %s has %d items, shard %d of %d extracts %d of them.", plan, len(items),
+                     self.shard_index, self.shard_count, len(own_items))
+        by_extraction = {(e.account_name, e.region_name): e for e in extractions}
+        targets = {}
+        for item in own_items:
+            targets.setdefault((item.account, item.region, item.step), []).append(item.target)
+        parts = [by_extraction[(account, region)].for_step(step, step_targets)
+                 for (account, region, step), step_targets in targets.items()]
+
+        with tempfile.TemporaryDirectory() as shard_tables:
+            self.extract_parallel(parts, self.account_workers, shard_tables)
+            tags = [SHARD_OUTPUT_TAG, f'plan_{plan}']
+            primary_keys = {}
+            for name in sorted(os.listdir(shard_tables)):
+                file_def = self.create_out_file_definition(
+                    shard_file_name(self.shard_index, self.shard_count, name), tags=tags)
+                shutil.move(os.path.join(shard_tables, name), file_def.full_path)
+                self.write_manifest(file_def)
+                # Rows of batch accounts are told apart by the account column
+                keys = self.table_primary_keys.get(name, [])
+                primary_keys[name] = [ACCOUNT_COLUMN] + keys if self.accounts and keys else keys
+        plan_def = self.create_out_file_definition(
+            shard_file_name(self.shard_index, self.shard_count, PLAN_FILE_NAME), tags=tags)
+        write_plan_file(plan_def.full_path, plan, self.shard_index, self.shard_count, own_items, primary_keys)
+        self.write_manifest(plan_def)
+
+    def merge_shards(self):
+        """
+        Merge mode: combine the tables of all shards of a plan, from the input files tagged
+        shard_output, into the output tables without repeating primary keys.
+        """
+        files = self.get_input_files_definitions(tags=[SHARD_OUTPUT_TAG], only_latest_files=True)
+        tables, plan_files = shard_paths([(file_def.name, file_def.full_path) for file_def in files])
+        shard_count, primary_keys = read_plan_files(plan_files)
+        for name, paths in tables.items():
+            keys = primary_keys.get(name, [])
+            written, duplicates = merge_deduplicated(paths, os.path.join(self.tables_out_path, name), keys)
+            self.metrics.record_rows_written(name, written)
+            logging.info("Merged %s from %d of %d shards: %d rows, %d duplicates dropped.", name, len(paths),
+                         shard_count, written, duplicates)
+
+    def extract_parallel(self, extractions, workers, destination=None):
+        """
+        Run extractions (copies from for_region or for_step) in up to `workers` threads, each
+        into its own staging folder, and merge their tables into destination (the output
+        tables by default). Extractions of batch accounts get an account column.
+        """
+        labels = ['_'.join(filter(None, (extraction.account_name, extraction.region_name, extraction.plan_step)))
+                  for extraction in extractions]
+        logging.info("Extracting %s in parallel.", ', '.join(labels))
+        with tempfile.TemporaryDirectory() as staging:
+            for index, extraction in enumerate(extractions):
+                extraction.staging_tables_path = os.path.join(staging, str(index))
+                os.makedirs(extraction.staging_tables_path)
+
+            def extract(extraction, label):
+                with self.metrics.stage(f'extraction_{label}'):
+                    extraction.extract()
+
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='extraction') as executor:
+                futures = [executor.submit(extract, extraction, label)
+                           for extraction, label in zip(extractions, labels)]
+            # Raise the first failure once all extractions have finished
+            for future in futures:
+                future.result()
+            merged = merge_tables(
+                [extraction.staging_tables_path for extraction in extractions], destination or self.tables_out_path,
+                [{ACCOUNT_COLUMN: extraction.account_name} if extraction.account_name else {}
+                 for extraction in extractions])
+            logging.info("Merged tables: %s", ', '.join(merged))
+
+    def create_out_table_definition(self, name, *args, primary_key=None, **kwargs):
+        # The primary keys are remembered for shard merges, which deduplicate on them
+        self.table_primary_keys[name] = list(primary_key or [])
+        return super().create_out_table_definition(name, *args, primary_key=primary_key, **kwargs)
+
+    @property
+    def tables_out_path(self):
+        # A parallel extraction writes its tables to its own staging folder
+        return getattr(self, 'staging_tables_path', None) or super().tables_out_path
+
+    def open_fingerprints(self):
+        # Continue from the fingerprints saved by the previous run, if the input mapping provides them
+        path = os.path.join(self.files_out_path, FINGERPRINTS_FILE_NAME)
+        previous = self.get_input_files_definitions(tags=[FINGERPRINTS_TAG], only_latest_files=True)
+        if previous:
+            shutil.copyfile(previous[0].full_path, path)
+            logging.info("Writing only changed rows, fingerprints loaded from %s.", previous[0].name)
+        else:
+            logging.info("Writing only changed rows, no fingerprints from a previous run found.")
+        return FingerprintStore(path)
 
-        # Ads reports flow
-        if self.run_ads and getattr(self, 'ads_access_token', None):
-            logging.info('Executing Amazon Ads reports...')
-            for store in self.stores:
-                self.create_and_download_ads_report(store['scope'], store['name'], 'SPONSORED_PRODUCTS')
-                self.create_and_download_ads_report(store['scope'], store['name'], 'SPONSORED_BRANDS')
-                self.create_and_download_ads_report(store['scope'], store['name'], 'SPONSORED_DISPLAY')
-            self.save_ads_data_to_csv()
-        elif self.run_ads:
-            logging.error('Failed to refresh Ads token.')
+    def drop_unchanged_rows(self, df, table, primary_keys):
+        """
+        Drop the rows of df that were emitted with the same content by an earlier run.
+        Snapshot tables keyed by extraction time are written as they are.
+        """
+        if self.fingerprints is None or df.empty or VOLATILE_COLUMNS.intersection(primary_keys):
+            return df
+        keys, fingerprints = frame_fingerprints(df, primary_keys)
+        changed = self.fingerprints.changed(self.fingerprint_table(table), keys, fingerprints)
+        self.metrics.record_rows_unchanged(table, len(df) - sum(changed))
+        return df[changed]
+
+    def fingerprint_table(self, table):
+        # Accounts of a batch may share keys, e.g. SKUs, so each keeps its own fingerprints
+        return f'{self.account_name}/{table}' if self.account_name else table
+
+    def drop_unchanged_records(self, rows, table, key_indexes):
+        # Record-stream counterpart of drop_unchanged_rows for row tuples
+        if self.fingerprints is None or not rows:
+            return rows
+        changed = self.fingerprints.changed(self.fingerprint_table(table), *record_fingerprints(rows, key_indexes))
+        kept = [row for row, is_changed in zip(rows, changed) if is_changed]
+        self.metrics.record_rows_unchanged(table, len(rows) - len(kept))
+        return kept
+
+    def profile_step(self, name):
+        # Profile the step when profiling is enabled, otherwise do nothing
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.profile(name)
+
+    @property
+    def parse_lag(self):
+        # Downloaded reports that may wait for their parsed chunks while the next report is requested;
+        # none near the memory budget, so the next download waits until the pending reports are written
+        if self.parse_pool is None or self.memory.above_high_water():
+            return 0
+        return self.parse_pool.workers
+
+    @staticmethod
+    def drain(pending, limit, consume):
+        # Consume pending parse results, oldest first, until at most limit are left
+        while len(pending) > limit:
+            consume(*pending.popleft())
+
+    def backpressure(self):
+        # Hold back a download while memory is close to the budget
+        waited = self.memory.wait_for_headroom()
+        if waited:
+            self.metrics.record_wait('memory_backpressure', waited)
+
+    def async_client(self):
+        return AsyncApiClient(
+            self.metrics, self.sp_api_base_url, self.access_token,
+            ads_api_base_url=self.ads_api_base_url, ads_client_id=self.app_id_ads,
+            ads_access_token=getattr(self, 'ads_access_token', None),
+            report_poll_interval=REPORT_POLL_INTERVAL, ads_poll_interval=ADS_REPORT_POLL_INTERVAL,
+            hedge_downloads=self.hedge_executor is not None, download_latency=self.download_latency,
+            events=self.events,
+        )
+
+    def run_async(self, lifecycles):
+        """
+        Run the coroutines returned by lifecycles(client) concurrently on one event loop
+        and return their results in order.
+        """
+        async def gather():
+            async with self.async_client() as client:
+                return await asyncio.gather(*lifecycles(client))
+        return asyncio.run(gather())
+
+    def write_metrics(self):
+        """
+        Write run metrics as a machine-readable JSON file to out/files.
+        """
+        file_def = self.create_out_file_definition(METRICS_FILE_NAME, tags=['run_metrics'])
+        self.metrics.write(file_def.full_path)
+        self.write_manifest(file_def)
+        logging.info("Run metrics written to %s", METRICS_FILE_NAME)
+
+    def handle_ledger(self):
+        # Fetch FBA ledger detail and summary view reports for all marketplaces concurrently
+        start_dt = self.clock.days_ago(self.date_range)
+        end_dt = self.clock.now
+        started_tables = set()
+        # Rows already written to each table; marketplaces' reports may repeat each other's rows
+        seen_rows = {}
+        jobs = [(mp, report_type) for mp in self.marketplace_ids for report_type in LEDGER_REPORT_OPTIONS]
+
+        def lifecycles(client):
+            return [client.report_lifecycle(report_type, mp, start_dt, end_dt, LEDGER_REPORT_OPTIONS[report_type])
+                    for mp, report_type in jobs]
+
+        for (mp, report_type), result in zip(jobs, self.run_async(lifecycles)):
+            if result.document is None:
+                logging.error("Ledger report %s for %s could not be downloaded.", report_type, mp)
+                continue
+            view = 'detail' if report_type == 'GET_LEDGER_DETAIL_VIEW_DATA' else 'summary'
+            with self.metrics.stage('ledger', mp):
+                chunks = self.parse_document(result.document, False, f'inventory_ledger_{view}_{mp}.csv')
+                output_file_name = f'inventory_ledger_{view}.csv'
+                written = self.write_ledger_chunks(chunks, output_file_name, started_tables,
+                                                   seen_rows.setdefault(output_file_name, set()))
+            logging.info("Ledger %s rows for %s after deduplication: %d", view, mp, written)
+
+    def write_ledger_chunks(self, chunks, output_file_name, started_tables, seen_rows):
+        """
+        Append the chunks of one ledger report to output_file_name, dropping rows already in
+        seen_rows, the rows written to the table in this run. started_tables holds the
+        tables already written in this run. Returns the number of rows written.
+        """
+        if not inspect.isgenerator(chunks):
+            return 0
+        table_path = self.create_out_table_definition(output_file_name, incremental=True, primary_key=[]).full_path
+        extracted_at = self.clock.timestamp
+        written = 0
+        for df in chunks:
+            df = self.drop_unchanged_rows(self.drop_seen_rows(df, seen_rows), output_file_name, [])
+            if df.empty:
+                continue
+            df = df.assign(extracted_at=extracted_at)
+            is_first_chunk = output_file_name not in started_tables
+            df.to_csv(table_path, mode='w' if is_first_chunk else 'a', header=is_first_chunk, index=False)
+            started_tables.add(output_file_name)
+            written += len(df)
+            self.metrics.record_rows_written(output_file_name, len(df))
+        return written
+
+    @staticmethod
+    def drop_seen_rows(df, seen_rows):
+        # Keep the first occurrence of each row across chunks; rows are identified by a hash of their values
+        keep = []
+        for row_hash in pd.util.hash_pandas_object(df, index=False).tolist():
+            keep.append(row_hash not in seen_rows)
+            seen_rows.add(row_hash)
+        return df[keep]
+
+    @staticmethod
+    def drop_seen_records(rows, seen_rows):
+        # Record-stream counterpart of drop_seen_rows for row tuples
+        kept = []
+        for row in rows:
+            if row not in seen_rows:
+                seen_rows.add(row)
+                kept.append(row)
+        return kept
+
+    def ads_windows(self, store, ad_product):
+        """
+        (start, end) dates of the Ads reports of store and ad_product in this run: from
+        the day after the settled dates in the state (ads_initial_days back for a store
+        seen for the first time, at least ads_settlement_days back) to today, in windows
+        of at most ADS_MAX_WINDOW_DAYS.
+        """
+        today = self.clock.now.date()
+        settled = self.state.get(STATE_ADS_SETTLED, {}).get(store['name'], {}).get(ad_product)
+        if settled:
+            start = min(datetime.strptime(settled, '%Y-%m-%d').date() + timedelta(days=1),
+                        today - timedelta(days=self.ads_settlement_days))
         else:
-            logging.info('Skipping Amazon Ads reports as per configuration.')
+            start = today - timedelta(days=self.ads_initial_days)
+        start = max(start, today - timedelta(days=ADS_RETENTION_DAYS))
+        windows = []
+        while start <= today:
+            end = min(start + timedelta(days=ADS_MAX_WINDOW_DAYS - 1), today)
+            windows.append((start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+            start = end + timedelta(days=1)
+        return windows
+
+    def handle_ads(self):
+        """
+        Reports of all stores, ad products and windows are created, polled and downloaded
+        concurrently. Each document is decompressed and decoded as a stream straight into
+        the table. A store and ad product whose reports all arrived is settled up to
+        ads_settlement_days before today.
+        """
+        file_name = 'advertising.csv'
+        table_path = self.create_out_table_definition(
+            file_name, incremental=True, primary_key=ADS_PRIMARY_KEYS).full_path
+        key_indexes = record_key_indexes(ADS_COLUMNS, ADS_PRIMARY_KEYS)
+        jobs = [(store, ad_product, window) for store in self.stores for ad_product in ADS_PRODUCTS
+                for window in self.ads_windows(store, ad_product)]
+
+        def lifecycles(client):
+            return [client.ads_report_lifecycle(store['scope'], self.generate_payload(ad_product, *window))
+                    for store, ad_product, window in jobs]
+
+        failed = set()
+        with CsvTableWriter(table_path, ADS_COLUMNS) as writer:
+            for (store, ad_product, (start_date, end_date)), document in zip(jobs, self.run_async(lifecycles)):
+                if document is None:
+                    logging.error("Failed to download report for %s in %s from %s to %s",
+                                  ad_product, store['name'], start_date, end_date)
+                    failed.add((store['name'], ad_product))
+                    continue
+                rows = 0
+                with document:
+                    records = self.iter_ads_records(document, store['name'], ad_product)
+                    for batch in self.record_batches(records, 'ads'):
+                        rows += len(batch)
+                        written = writer.write_rows(self.drop_unchanged_records(batch, file_name, key_indexes))
+                        self.metrics.record_rows_written(file_name, written)
+                logging.info("Processed %d records for %s in %s from %s to %s",
+                             rows, ad_product, store['name'], start_date, end_date)
+        if writer.rows_written == 0:
+            logging.warning("No Amazon Ads report data was written.")
+
+        settled_through = (self.clock.now.date() - timedelta(days=self.ads_settlement_days)).strftime('%Y-%m-%d')
+        settled = self.state.setdefault(STATE_ADS_SETTLED, {})
+        for store in self.stores:
+            for ad_product in ADS_PRODUCTS:
+                if (store['name'], ad_product) not in failed:
+                    settled.setdefault(store['name'], {})[ad_product] = settled_through
 
     def handle_orders(self):
-        order_segments = self.split_date_range(self.date_range, 15)
-        
+        report_type = "GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL"
         output_file_name = 'orders.csv'
         primary_keys = ['amazon-order-id', 'sku', 'asin']
         table_path = self.create_out_table_definition(
             output_file_name, incremental=True, primary_key=primary_keys
         ).full_path
-        
-        is_first_chunk = True
-
-        for mp in self.marketplace_ids:
+        # Parsed rows go straight to the CSV, there is no DataFrame-level transform
+        writer = CsvTableWriter(table_path, ORDERS_COLUMNS)
+        key_indexes = record_key_indexes(ORDERS_COLUMNS, primary_keys)
+        pending = deque()
+
+        def write_report(segments, segment, record_batches):
+            rows = 0
+            for batch in record_batches:
+                rows += len(batch)
+                written = writer.write_rows(self.drop_unchanged_records(batch, output_file_name, key_indexes))
+                self.metrics.record_rows_written(output_file_name, written)
+            segments.record_rows(rows, segment)
+
+        for mp in self.metrics.per_marketplace('orders', self.marketplace_ids):
+            order_segments = self.adaptive_segments(report_type, mp, 15)
             for start_date, end_date in order_segments:
-                logging.info(f"Creating report for marketplace: {mp}")
-                report_id = self.create_report(
-                    start_date, end_date, "GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL", mp)
+                logging.debug("Creating report for marketplace: %s", mp)
+                report_id = self.create_report(start_date, end_date, report_type, mp)
                 
                 if report_id:
                     report_generator = self.poll_report_status_and_download(
                         report_id, None, 'orders.csv', is_xml=True, primary_keys=primary_keys
                     )
-                    
-                    for df_chunk in report_generator:
-                        if not df_chunk.empty:
-                            df_chunk.to_csv(
-                                table_path, 
-                                mode='a',
-                                header=is_first_chunk, 
-                                index=False
-                            )
-                            is_first_chunk = False
+                    if report_id in self.fatal_report_ids:
+                        order_segments.split()
+                        continue
+
+                    pending.append((order_segments, (start_date, end_date), report_generator))
+                    self.drain(pending, self.parse_lag, write_report)
+            self.drain(pending, 0, write_report)
+            order_segments.save()
             break
-        
-        if is_first_chunk:
+        writer.close()
+
+        if writer.rows_written == 0:
             logging.warning("No order data was processed, skipping deduplication.")
             return
 
     def handle_seller_feedback(self):
         logging.info("Fetching Seller Feedback for marketplaces: %s", self.marketplace_ids)
-        review_segments = self.split_date_range(self.date_range, 100)
-        
         target_columns = ['date', 'rating', 'comments', 'response', 'order_id', 'rater_email']
         all_dfs = []
 
-        for mp in self.marketplace_ids:
+        for mp in self.metrics.per_marketplace('seller_feedback', self.marketplace_ids):
+            review_segments = self.adaptive_segments("GET_SELLER_FEEDBACK_DATA", mp, 100)
             for start_date, end_date in review_segments:
-                logging.info(f"Creating Seller Feedback report for marketplace: {mp}")
+                logging.debug("Creating Seller Feedback report for marketplace: %s", mp)
                 
                 report_id = self.create_report(
                     start_date, 
@@ -262,49 +983,45 @@ class Component(ComponentBase):
                         primary_keys=[],
                         is_json=False
                     )
+                    if report_id in self.fatal_report_ids:
+                        review_segments.split()
+                        continue
+                    review_segments.record_rows(len(df))
                     
                     if not df.empty:
                         if len(df.columns) == len(target_columns):
                             df.columns = target_columns
                         else:
-                            logging.warning(f"Column count mismatch in {mp}. Expected {len(target_columns)}, got {len(df.columns)}")
+                            logging.warning("Column count mismatch in %s. Expected %d, got %d",
+                                            mp, len(target_columns), len(df.columns))
                             df.rename(columns=lambda x: self.shorten_column(x), inplace=True)
                         
-                        df['date'] = df['date'].str.replace('.', '/', regex=False)
-                        df['date'] = pd.to_datetime(df['date'], dayfirst=True, errors='coerce').dt.strftime('%Y-%m-%d')
-
-                        df['marketplace_id'] = mp
-                        df['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        all_dfs.append(df)
+                        df['date'] = self.date_formats.feedback_dates(df['date'], mp)
+                        # extracted_at is added when the table is written
+                        all_dfs.append(compact_frame(df.assign(marketplace_id=constant_column(mp, len(df)))))
 
                     else:
-                        logging.warning(f"No feedback data found for marketplace {mp}.")
+                        logging.warning("No feedback data found for marketplace %s.", mp)
+            review_segments.save()
 
         if all_dfs:
-            combined_df = pd.concat(all_dfs, ignore_index=True)
+            combined_df = concat_frames(all_dfs)
             
             final_pks = ['date', 'rating', 'comments', 'response', 'order_id', 'rater_email']
             
-            self.process_data(combined_df, 'seller_feedback.csv', final_pks)
-            logging.info(f"Total Seller Feedback records processed: {len(combined_df)}")
+            self.process_data(combined_df, 'seller_feedback.csv', final_pks,
+                              constants={'extracted_at': self.clock.timestamp})
+            logging.info("Total Seller Feedback records processed: %d", len(combined_df))
         else:
             logging.warning("No Seller Feedback data fetched.")
     
     def handle_performance_report(self):
         review_segments = self.split_date_range(self.date_range, 100)
-        all_dfs = []
-
-        def flatten_all_lists(obj):
-            if isinstance(obj, list):
-                # Convert list to dict with string indices
-                return {str(i): flatten_all_lists(v) for i, v in enumerate(obj)}
-            if isinstance(obj, dict):
-                return {k: flatten_all_lists(v) for k, v in obj.items()}
-            return obj
+        records = []
 
-        for mp in self.marketplace_ids:
+        for mp in self.metrics.per_marketplace('performance_report', self.marketplace_ids):
             for start_date, end_date in review_segments:
-                logging.info(f"Creating Performance report for marketplace: {mp}")
+                logging.debug("Creating Performance report for marketplace: %s", mp)
                 
                 report_id = self.create_report(
                     start_date, 
@@ -314,7 +1031,7 @@ class Component(ComponentBase):
                 )
                 
                 if report_id:
-                    df = self.poll_report_status_and_download(
+                    report = self.poll_report_status_and_download(
                         report_id, 
                         pd.DataFrame(), 
                         'delivery_performance_raw.csv', 
@@ -323,115 +1040,115 @@ class Component(ComponentBase):
                         is_json=True 
                     )
                     
-                    if not df.empty and 'performanceMetrics' in df.columns:
-                        def _extract_and_flatten(row):
-                            try:
-                                if isinstance(row, list): 
-                                    data_list = row
-                                elif isinstance(row, str): 
-                                    data_list = ast.literal_eval(row)
-                                else: 
-                                    return {}
-                                    
-                                if data_list and isinstance(data_list, list) and len(data_list) > 0:
-                                    raw_data = data_list[0]
-                                    return flatten_all_lists(raw_data)
-                                return {}
-                            except (ValueError, SyntaxError):
-                                return {}
-
-                        metrics_dicts = df['performanceMetrics'].apply(_extract_and_flatten).tolist()
-                        
-                        flat_metrics_df = pd.json_normalize(metrics_dicts)
-                        
-                        flat_metrics_df['marketplace_id'] = mp
-                        flat_metrics_df['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        
-                        if 'accountStatuses' in df.columns:
-                            statuses_dicts = df['accountStatuses'].apply(_extract_and_flatten).tolist()
-                            flat_statuses = pd.json_normalize(statuses_dicts)
-                            flat_statuses = flat_statuses.add_prefix('account_')
-                            flat_metrics_df = pd.concat([flat_metrics_df, flat_statuses], axis=1)
-
-                        all_dfs.append(flat_metrics_df)
+                    if isinstance(report, dict) and report.get('performanceMetrics'):
+                        record = flatten_json(report['performanceMetrics'][0])
+                        if report.get('accountStatuses'):
+                            record.update(flatten_json(report['accountStatuses'][0], parent_key='account'))
+                        # The report's own marketplaceId wins over the requested one
+                        record.setdefault('marketplace_id', mp)
+                        record['extracted_at'] = self.clock.timestamp
+                        records.append(record)
                     else:
-                        logging.warning(f"No performance data found for marketplace {mp}.")
+                        logging.warning("No performance data found for marketplace %s.", mp)
 
-        if all_dfs:
-            combined_df = pd.concat(all_dfs, ignore_index=True)
-            combined_df.columns = [self.camel_to_snake(col).replace('.', '_') for col in combined_df.columns]
-            
-            # Remove duplicate marketplace_id columns - keep only the first one
-            marketplace_id_cols = [col for col in combined_df.columns if col == 'marketplace_id']
-            if len(marketplace_id_cols) > 1:
-                # Keep the first occurrence, remove all others
-                cols_to_drop = marketplace_id_cols[1:]
-                combined_df = combined_df.drop(columns=cols_to_drop)
-            
+        if records:
+            combined_df = records_to_frame(records, leading_columns=('marketplace_id', 'extracted_at'))
             final_pks = ['extracted_at', 'marketplace_id']
             self.process_data(combined_df, 'delivery_performance.csv', final_pks)
-            logging.info(f"Total Delivery Performance records processed: {len(combined_df)}")
+            logging.info("Total Delivery Performance records processed: %d", len(combined_df))
         else:
             logging.warning("No Delivery Performance data fetched.")
 
-    def handle_inventory(self):
-            """
-            Fetch and process daily FBA inventory for each configured marketplace.
-            Handles pagination via NextToken to retrieve all pages.
-            """
-            logging.info("Fetching daily FBA inventory for marketplaces: %s", self.marketplace_ids)
-            all_dfs = []
-            for mp in self.marketplace_ids:
-                logging.info("Starting inventory fetch for marketplace: %s", mp)
-                next_token = None
-                while True:
-                    url = "https://sellingpartnerapi-eu.amazon.com/fba/inventory/v1/summaries"
-                    headers = {
-                        'x-amz-access-token': self.access_token,
-                        'Content-Type': 'application/json'
-                    }
-                    params = {
-                        'marketplaceIds': mp,
-                        'granularityType': 'Marketplace',
-                        'granularityId': mp,
-                        'details': 'true'
-                    }
-                    if next_token:
-                        params['nextToken'] = next_token
-                    response = self.controlled_request('get', url, headers=headers, params=params)
-                    if not response or response.status_code != 200:
-                        logging.error(
-                            "FBA inventory fetch failed for %s: %s",
-                            mp,
-                            response.text if response else 'No response'
-                        )
-                        break
-
-                    data = response.json()
-                    summaries = data.get('payload', {}).get('inventorySummaries', [])
-                    if summaries:
-                        df = pd.json_normalize(summaries,sep='_')
-                        df.rename(columns=lambda x: self.shorten_column(x), inplace=True)
-                        df['marketplace_id'] = mp
-                        df['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        all_dfs.append(df)
-
-                    # Check for pagination
-                    next_token = data.get('pagination', {}).get('nextToken')
-                    if not next_token:
-                        logging.info("Completed inventory pages for %s", mp)
-                        break
-
-            if all_dfs:
-                result = pd.concat(all_dfs, ignore_index=True)
-                self.process_data(
-                    result,
-                    'inventory.csv',
-                    primary_keys=['seller_sku', 'asin', 'marketplace_id']
+    def fetch_inventory_marketplace(self, mp, bucket, start_date_time=None):
+        """
+        Page through FBA inventory summaries of one marketplace into a column buffer.
+        Returns the buffer and whether all pages were fetched successfully.
+        """
+        url = f"{self.sp_api_base_url}/fba/inventory/v1/summaries"
+        headers = {
+            'x-amz-access-token': self.access_token,
+            'Content-Type': 'application/json'
+        }
+        buffer = ColumnBuffer()
+        extracted_at = self.clock.timestamp
+        next_token = None
+        pages = 0
+        while True:
+            params = {
+                'marketplaceIds': mp,
+                'granularityType': 'Marketplace',
+                'granularityId': mp,
+                'details': 'true'
+            }
+            if start_date_time:
+                params['startDateTime'] = start_date_time
+            if next_token:
+                params['nextToken'] = next_token
+            self.backpressure()
+            self.metrics.record_wait('rate_limit', bucket.acquire())
+            response = self.controlled_request('get', url, headers=headers, params=params)
+            if not response or response.status_code != 200:
+                logging.error(
+                    "FBA inventory fetch failed for %s: %s",
+                    mp,
+                    response.text if response else 'No response'
                 )
-                logging.info("Total FBA inventory records: %d", len(result))
-            else:
-                logging.warning("No FBA inventory data fetched.")
+                return buffer, False
+
+            pages += 1
+            data = response.json()
+            summaries = data.get('payload', {}).get('inventorySummaries', [])
+            for summary in summaries:
+                record = flatten_leaves(summary)
+                record['marketplace_id'] = mp
+                record['extracted_at'] = extracted_at
+                buffer.append(record)
+            self.events.count('pages', f'inventory in {mp}', pages=1, records=len(summaries))
+
+            # Check for pagination
+            next_token = data.get('pagination', {}).get('nextToken')
+            if not next_token:
+                logging.info("Completed inventory pages for %s", mp)
+                self.state.setdefault(STATE_PAGE_COUNTS, {}).setdefault('inventory', {})[mp] = pages
+                return buffer, True
+
+    def handle_inventory(self):
+        """
+        Fetch and process daily FBA inventory for all configured marketplaces concurrently.
+        In changed-since mode only summaries changed after the last successful run of each
+        marketplace are requested.
+        """
+        logging.info("Fetching daily FBA inventory for marketplaces: %s", self.marketplace_ids)
+        last_runs = self.state.setdefault(STATE_INVENTORY_LAST_RUN, {})
+        run_started = iso_utc(self.clock.now, timespec='seconds')
+        # getInventorySummaries is limited per selling partner, so marketplaces share one bucket
+        bucket = TokenBucket.for_operation('getInventorySummaries')
+
+        def fetch(mp):
+            start_date_time = last_runs.get(mp) if self.inventory_changed_since else None
+            if start_date_time:
+                logging.info("Fetching inventory for %s changed since %s", mp, start_date_time)
+            with self.metrics.stage('inventory', mp):
+                return self.fetch_inventory_marketplace(mp, bucket, start_date_time)
+
+        frames = []
+        with ThreadPoolExecutor(max_workers=max(1, len(self.marketplace_ids))) as executor:
+            for mp, (buffer, complete) in zip(self.marketplace_ids, executor.map(fetch, self.marketplace_ids)):
+                if len(buffer):
+                    frames.append(compact_frame(buffer.to_frame()))
+                if complete:
+                    last_runs[mp] = run_started
+
+        if frames:
+            result = concat_frames(frames)
+            self.process_data(
+                result,
+                'inventory.csv',
+                primary_keys=['seller_sku', 'asin', 'marketplace_id']
+            )
+            logging.info("Total FBA inventory records: %d", len(result))
+        else:
+            logging.warning("No FBA inventory data fetched.")
 
     def handle_inventory_planning(self):
         """
@@ -441,9 +1158,9 @@ class Component(ComponentBase):
         logging.info("Fetching FBA Inventory Planning data for marketplaces: %s", self.marketplace_ids)
         all_dfs = []
 
-        for mp in self.marketplace_ids:
+        for mp in self.metrics.per_marketplace('inventory_planning', self.marketplace_ids):
             logging.info("Starting Inventory Planning report for marketplace: %s", mp)
-            planning_segments = self.split_date_range(self.date_range, 30)
+            planning_segments = self.adaptive_segments("GET_FBA_INVENTORY_PLANNING_DATA", mp, 30)
 
             for start_date, end_date in planning_segments:
                 report_id = self.create_report(
@@ -461,73 +1178,114 @@ class Component(ComponentBase):
                         is_xml=False,
                         primary_keys=['sku', 'asin']
                     )
+                    if report_id in self.fatal_report_ids:
+                        planning_segments.split()
+                        continue
+                    planning_segments.record_rows(len(df))
 
                     if not df.empty:
                         df.rename(columns=lambda x: self.shorten_column(x), inplace=True)
-                        df['marketplace_id'] = mp
-                        df['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        all_dfs.append(df)
+                        # extracted_at is added when the table is written
+                        all_dfs.append(compact_frame(df.assign(marketplace_id=constant_column(mp, len(df)))))
                     else:
-                        logging.warning(f"No data for planning report in marketplace {mp} from {start_date} to {end_date}")
+                        logging.warning("No data for planning report in marketplace %s from %s to %s",
+                                        mp, start_date, end_date)
                 else:
-                    logging.warning(f"Failed to create planning report for marketplace {mp}")
+                    logging.warning("Failed to create planning report for marketplace %s", mp)
 
                 report_id = None
+            planning_segments.save()
 
         if all_dfs:
-            combined = pd.concat(all_dfs, ignore_index=True)
+            combined = concat_frames(all_dfs)
             logging.info("Total inventory planning records across marketplaces: %d", len(combined))
-            self.process_data(combined, 'inventory_planning.csv', ['snapshot-date', 'sku', 'asin', 'marketplace_id'])
+            self.process_data(combined, 'inventory_planning.csv', ['snapshot-date', 'sku', 'asin', 'marketplace_id'],
+                              constants={'extracted_at': self.clock.timestamp})
         else:
             logging.warning("No FBA Inventory Planning data fetched from any marketplace.")
 
 
     def handle_returns(self):
-        # Fetch and process return data
-        self.all_returns_data = pd.DataFrame()
-        return_segments = self.split_date_range(self.date_range, 50)
-        all_returns_data = pd.DataFrame()
-        for mp in self.marketplace_ids:
+        # Fetch return data and write it batch by batch, dropping rows already written
+        report_type = "GET_XML_RETURNS_DATA_BY_RETURN_DATE"
+        output_file_name = 'returns.csv'
+        primary_keys = ['return-id', 'order-id']
+        table_path = self.create_out_table_definition(
+            output_file_name, incremental=True, primary_key=primary_keys
+        ).full_path
+        # In case of endpoint not being marketplace-sensitive
+        seen_rows = set()
+        writer = CsvTableWriter(table_path, RETURNS_COLUMNS)
+        key_indexes = record_key_indexes(RETURNS_COLUMNS, primary_keys)
+        pending = deque()
+
+        def write_report(segments, segment, record_batches):
+            rows = 0
+            for batch in record_batches:
+                rows += len(batch)
+                batch = self.drop_unchanged_records(self.drop_seen_records(batch, seen_rows), output_file_name,
+                                                    key_indexes)
+                written = writer.write_rows(batch)
+                self.metrics.record_rows_written(output_file_name, written)
+            segments.record_rows(rows, segment)
+
+        for mp in self.metrics.per_marketplace('returns', self.marketplace_ids):
+            return_segments = self.adaptive_segments(report_type, mp, 50)
             for start_date, end_date in return_segments:
-                report_id = self.create_report(
-                    start_date, end_date, "GET_XML_RETURNS_DATA_BY_RETURN_DATE", mp)
+                report_id = self.create_report(start_date, end_date, report_type, mp)
                 if report_id:
-                    temp_data = self.poll_report_status_and_download(report_id, pd.DataFrame(
-                    ), 'returns.csv', is_xml=True, primary_keys=['return-id', 'order-id'])
-                    if not temp_data.empty:
-                        all_returns_data = pd.concat(
-                            [all_returns_data, temp_data], ignore_index=True)
-        # Log before processing data
-        logging.info(
-            f"Number of records to process for returns: {len(all_returns_data)}")
-        if not all_returns_data.empty:
-            # In case of endpoint not being marketplace-sensitive
-            all_returns_data.drop_duplicates(keep='first', inplace=True)
-            self.process_data(all_returns_data, 'returns.csv', [
-                              'return-id', 'order-id'])
-        else:
+                    chunks = self.poll_report_status_and_download(report_id, pd.DataFrame(
+                    ), output_file_name, is_xml=True, primary_keys=primary_keys)
+                    if report_id in self.fatal_report_ids:
+                        return_segments.split()
+                        continue
+                    if not inspect.isgenerator(chunks):
+                        return_segments.record_rows(0)
+                        continue
+                    pending.append((return_segments, (start_date, end_date), chunks))
+                    self.drain(pending, self.parse_lag, write_report)
+            self.drain(pending, 0, write_report)
+            return_segments.save()
+        writer.close()
+        total_records = writer.rows_written
+        logging.info("Number of records written for returns: %d", total_records)
+        if total_records == 0:
             logging.warning("No return data to process.")
 
     def handle_finances(self):
         # Fetch and process financial data
         self.all_financial_data = pd.DataFrame()
         financial_data = self.fetch_financial_events()
-        # Initialize the dataframe to hold all data.
-        all_financial_data = pd.DataFrame()
+
+        pages = []
 
         while financial_data:
-            processed_data = self.process_financial_data(financial_data)
-            # Ensure data is concatenated correctly.
-            all_financial_data = pd.concat(
-                [all_financial_data, processed_data], ignore_index=True)
+            if self.parse_pool:
+                # Parsed in a worker while the next page is fetched
+                pages.append(self.parse_pool.submit(parse_financial_events, financial_data))
+            else:
+                parse_start = time.perf_counter()
+                processed_data = self.process_financial_data(financial_data)
+                self.metrics.record_rows_parsed('finance.csv', len(processed_data), time.perf_counter() - parse_start)
+                pages.append(compact_frame(processed_data))
 
             next_token = financial_data.get('payload', {}).get('NextToken')
             if next_token:
-                logging.info(
-                    f"Fetching next page of financial events with NextToken.")
+                logging.debug("Fetching next page of financial events with NextToken.")
                 financial_data = self.fetch_financial_events(next_token)
             else:
                 break
+        # Pages of this date range, for the request planner
+        self.state.setdefault(STATE_PAGE_COUNTS, {})['finances'] = {'pages': len(pages), 'days': self.date_range}
+
+        frames = []
+        for page in pages:
+            if isinstance(page, Future):
+                page = compact_frame(page.result())
+                self.metrics.record_rows_parsed('finance.csv', len(page))
+            frames.append(page)
+        # One concatenation of all pages instead of one per page
+        all_financial_data = concat_frames(frames) if frames else pd.DataFrame()
 
         # Only write to CSV after all data is gathered.
         if not all_financial_data.empty:
@@ -550,99 +1308,110 @@ class Component(ComponentBase):
         else:
             raise Exception("Unable to retrieve country words")
 
+    def fetch_catalog_batch(self, mp_id, asin_batch, bucket):
+        """
+        Fetch sales ranks for one ASIN batch in one marketplace, following pageToken pagination.
+        Each page is retried up to CATALOG_MAX_RETRIES times with exponential backoff.
+        Returns the list of catalog items, or None when the batch failed.
+        """
+        url = f"{self.sp_api_base_url}/catalog/2022-04-01/items"
+        headers = {
+            'x-amz-access-token': self.access_token,
+            'Content-Type': 'application/json'
+        }
+        items = []
+        next_token = None
+        while True:
+            params = {
+                'marketplaceIds': mp_id,
+                'keywords': ','.join(asin_batch),
+                'includedData': 'salesRanks'
+            }
+            if next_token:
+                params['pageToken'] = next_token
+
+            response = None
+            self.backpressure()
+            for attempt in range(CATALOG_MAX_RETRIES + 1):
+                self.metrics.record_wait('rate_limit', bucket.acquire())
+                response = self.controlled_request('get', url, headers=headers, params=params)
+                if response is not None and response.status_code == 200:
+                    break
+                if attempt < CATALOG_MAX_RETRIES:
+                    backoff = (2 ** attempt) + random.uniform(0, 1)
+                    time.sleep(backoff)
+                    self.metrics.record_wait('retry_backoff', backoff)
+
+            if response is None or response.status_code != 200:
+                logging.error("Catalog item fetch failed for batch starting with %s in %s after %d attempts: %s",
+                              asin_batch[0], mp_id, CATALOG_MAX_RETRIES + 1,
+                              response.text if response is not None else 'No response')
+                return None
+
+            data = response.json()
+            items.extend(data.get('items', []))
+            next_token = data.get('pagination', {}).get('nextToken')
+            if not next_token:
+                return items
+
     def handle_strategic_products(self):
         # Fetch and process catalog item data
-        all_dfs = []
+        ranks = ColumnBuffer(SALES_RANK_COLUMNS)
 
         # Fetch input table with ASIN for Amazon products
         input_tables = self.get_input_tables_definitions()
 
         strategic_products = self.listings_extract(table_path=input_tables[0].full_path)
 
-        # Outer loop for each marketplace
-        for marketplace_data in self.marketplaces_cfg:
-            mp_id = marketplace_data['marketplace_id']
-
-            if not strategic_products:
-                continue
-
-            for i in range(0, len(strategic_products), 20):
-                asin_batch = strategic_products[i:i + 20]
-                
-                next_token = None
-                while True:
-                    url = "https://sellingpartnerapi-eu.amazon.com/catalog/2022-04-01/items"
-                    headers = {
-                        'x-amz-access-token': self.access_token,
-                        'Content-Type': 'application/json'
-                    }
-                    params = {
-                        'marketplaceIds': mp_id,
-                        'keywords': ','.join(asin_batch),
-                        'includedData': 'salesRanks'
-                    }
-                    if next_token:
-                        params['pageToken'] = next_token
-
-                    response = self.controlled_request('get', url, headers=headers, params=params)
-
-                    if not response or response.status_code != 200:
-                        logging.error(
-                            f"Catalog item fetch failed for batch starting with {asin_batch[0]} in {mp_id}: {response.text}" if response else 'No response'
-                        )
-                        continue
-                
-                    data = response.json()
-                    extracted_time = datetime.utcnow().isoformat() + 'Z'
-                    
-                    for item in data.get('items', []):
-                        asin = item.get('asin')
-                        dfs_for_asin = []
-
-                        if item.get('salesRanks'):
-                            df_class = pd.json_normalize(
-                                item['salesRanks'],
-                                record_path=['classificationRanks'],
-                                meta=['marketplaceId']
-                            )
-                            if not df_class.empty:
-                                df_class['rank_type'] = 'classification'
-                                dfs_for_asin.append(df_class)
-
-                            df_display = pd.json_normalize(
-                                item['salesRanks'],
-                                record_path=['displayGroupRanks'],
-                                meta=['marketplaceId']
-                            )
-                            if not df_display.empty:
-                                df_display['rank_type'] = 'display_group'
-                                dfs_for_asin.append(df_display)
-
-                        if dfs_for_asin:
-                            asin_df = pd.concat(dfs_for_asin, ignore_index=True)
-                            asin_df['asin'] = asin
-                            asin_df['extracted_at'] = extracted_time
-                            all_dfs.append(asin_df)
-                            logging.info(f"Successfully processed ranks for ASIN {asin} in {mp_id}.")
-                        else:
-                            logging.warning(f"No sales rank data found for ASIN {asin} in {mp_id}.")
-
-                    pagination_data = data.get('pagination', {})
-                    next_token = pagination_data.get('nextToken')
-
-                    if not next_token:
-                        break
-
-        # Combine and save the final results
-        cols_order = ['asin', 'marketplaceId', 'rank_type', 'title', 'rank', 'link', 'classificationId', 'websiteDisplayGroup', 'extracted_at']
-        if all_dfs:
-            result = pd.concat(all_dfs, ignore_index=True)
-            # Reorder columns for clarity
-            result = result.reindex(columns=[col for col in cols_order if col in result.columns])
-            
-            logging.info(f"Total strategic product rank records processed: {len(result)}")
+        batches = [strategic_products[i:i + CATALOG_BATCH_SIZE]
+                   for i in range(0, len(strategic_products), CATALOG_BATCH_SIZE)]
+        # searchCatalogItems is limited per selling partner, so all marketplaces share one bucket
+        bucket = TokenBucket.for_operation('searchCatalogItems')
+        breakers = {m['marketplace_id']: CircuitBreaker(CATALOG_BREAKER_THRESHOLD) for m in self.marketplaces_cfg}
+
+        def fetch(mp_id, asin_batch):
+            if breakers[mp_id].is_open:
+                return None
+            items = self.fetch_catalog_batch(mp_id, asin_batch, bucket)
+            if items is None:
+                breakers[mp_id].record_failure()
+            else:
+                breakers[mp_id].record_success()
+            return items
+
+        with ThreadPoolExecutor(max_workers=CATALOG_MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(fetch, mp_id, asin_batch): mp_id
+                for mp_id in breakers
+                for asin_batch in batches
+            }
+            for future in as_completed(futures):
+                mp_id = futures[future]
+                items = future.result()
+                if items is None:
+                    self.events.count('catalog_batches', mp_id, batches=1,
+                                      **{'skipped' if breakers[mp_id].is_open else 'failed': 1})
+                    continue
+
+                extracted_time = self.clock.timestamp
+                without_ranks = 0
+                for item in items:
+                    if not append_sales_ranks(ranks, item, extracted_time):
+                        without_ranks += 1
+                self.events.count('catalog_batches', mp_id, batches=1, asins=len(items), without_ranks=without_ranks)
+
+        # Final progress of every marketplace
+        self.events.flush()
+        for mp_id in breakers:
+            if breakers[mp_id].is_open:
+                logging.error("Circuit breaker opened for marketplace %s after %d consecutive failed batches.",
+                              mp_id, CATALOG_BREAKER_THRESHOLD)
+
+        # Build the final frame once from the accumulated columns
+        result = ranks.to_frame()
+        if len(result):
+            logging.info("Total strategic product rank records processed: %d", len(result))
         else:
-            result = pd.DataFrame(columns=cols_order)
             logging.warning("No strategic product rank data was fetched.")
 
         self.process_data(
@@ -663,9 +1432,9 @@ class Component(ComponentBase):
         unique_report_ids = set()
         settlement_segments = self.split_date_range(self.date_range, 50)
 
-        for mp in self.marketplace_ids:
+        for mp in self.metrics.per_marketplace('settlement_report', self.marketplace_ids):
             for start_date, end_date in settlement_segments:
-                logging.info(f"Querying settlement reports for marketplace: {mp}")
+                logging.debug("Querying settlement reports for marketplace: %s", mp)
                 report_ids = self.get_existing_reports(
                     start_date,
                     end_date,
@@ -678,10 +1447,10 @@ class Component(ComponentBase):
             break
 
         if not unique_report_ids:
-            logging.warning(f"No settlement reports found from {end_date} to {start_date}")
+            logging.warning("No settlement reports found from %s to %s", end_date, start_date)
             return None
 
-        logging.info(f"Found {len(unique_report_ids)} unique settlement reports to download.")
+        logging.info("Found %d unique settlement reports to download.", len(unique_report_ids))
         output_file_name = 'settlement_report.csv'
         primary_keys = ['settlement_id', 'order_id', 'sku', 'amount_type', 'amount_description', 'transaction_type', 'split_index']
         
@@ -691,9 +1460,36 @@ class Component(ComponentBase):
         
         is_first_chunk = True
         total_records_processed = 0
+        pending = deque()
+
+        def write_report(report_id, report_generator):
+            nonlocal is_first_chunk, total_records_processed
+            # Process chunk-by-chunk if a generator is returned
+            if inspect.isgenerator(report_generator):
+                for df in report_generator:
+                    df['extracted_at'] = self.clock.timestamp
+
+                    # Write directly to disk to free up memory.
+                    df.to_csv(
+                        table_path, 
+                        mode='w' if is_first_chunk else 'a', 
+                        header=is_first_chunk, 
+                        index=False
+                    )
+
+                    is_first_chunk = False
+                    total_records_processed += len(df)
+                    self.metrics.record_rows_written(output_file_name, len(df))
+
+                    del df
+
+                gc.collect()
+
+            else:
+                logging.warning("No data downloaded for report ID %s", report_id)
 
         for report_id in unique_report_ids:
-            logging.info(f"Downloading settlement report ID: {report_id}")
+            logging.debug("Downloading settlement report ID: %s", report_id)
             report_generator = self.poll_report_status_and_download(
                 report_id,
                 pd.DataFrame(),
@@ -701,106 +1497,23 @@ class Component(ComponentBase):
                 is_xml=False,
                 primary_keys=[]
             )
+            pending.append((report_id, report_generator))
+            self.drain(pending, self.parse_lag, write_report)
 
-            # Process chunk-by-chunk if a generator is returned
-            if inspect.isgenerator(report_generator):
-                
-                # File-level metadata to hold across all chunks.
-                file_primary_mkp = None
-                file_start_date = None
-                file_end_date = None
-                file_settlement_id = None
-                split_tracker = {}
-
-                for df in report_generator:
-                    if not df.empty:
-                        # Rename columns to snake_case.
-                        df.rename(columns=lambda x: self.shorten_column(x).replace('-', '_'), inplace=True)
-
-                        # Extract file-level data from the first valid rows we see.
-                        if file_start_date is None and 'settlement_start_date' in df.columns:
-                            valid_starts = df['settlement_start_date'].replace(r'^\s*$', pd.NA, regex=True).dropna()
-                            if not valid_starts.empty:
-                                file_start_date = valid_starts.mode()[0]
-
-                        if file_end_date is None and 'settlement_end_date' in df.columns:
-                            valid_ends = df['settlement_end_date'].replace(r'^\s*$', pd.NA, regex=True).dropna()
-                            if not valid_ends.empty:
-                                file_end_date = valid_ends.mode()[0]
-                                
-                        if file_settlement_id is None and 'settlement_id' in df.columns:
-                            valid_ids = df['settlement_id'].replace(r'^\s*$', pd.NA, regex=True).dropna()
-                            if not valid_ids.empty:
-                                file_settlement_id = valid_ids.mode()[0]
-
-                        mkp_col = 'marketplace_name' if 'marketplace_name' in df.columns else None
-                        if mkp_col and file_primary_mkp is None:
-                            valid_marketplaces = df[mkp_col].replace(r'^\s*$', pd.NA, regex=True).dropna()
-                            if not valid_marketplaces.empty:
-                                file_primary_mkp = valid_marketplaces.mode()[0]
-
-                        # Apply the extracted file-level data to the current chunk.
-                        if 'settlement_start_date' in df.columns and file_start_date:
-                            df['settlement_start_date'] = file_start_date
-                            
-                        if 'settlement_end_date' in df.columns and file_end_date:
-                            df['settlement_end_date'] = file_end_date
-                            
-                        if 'settlement_id' in df.columns and file_settlement_id:
-                            df['settlement_id'] = file_settlement_id
-
-                        if mkp_col:
-                            df[mkp_col] = df[mkp_col].replace(r'^\s*$', pd.NA, regex=True)
-                            df[mkp_col] = df[mkp_col].fillna(file_primary_mkp if file_primary_mkp else 'Unallocated')
-
-                        # Identify split records by assigning an incrementing split_index (0, 1, 2...) to duplicate PKs across chunks.
-                        base_pk_cols = ['settlement_id', 'order_id', 'sku', 'amount_type', 'amount_description', 'transaction_type']
-                        existing_pk_cols = [col for col in base_pk_cols if col in df.columns]
-                        
-                        if len(existing_pk_cols) == len(base_pk_cols):
-                            records = df[existing_pk_cols].fillna('').itertuples(index=False, name=None)
-                            
-                            split_indices = []
-                            for pk_tuple in records:
-                                current_count = split_tracker.get(pk_tuple, 0)
-                                split_indices.append(current_count)
-                                split_tracker[pk_tuple] = current_count + 1
-                                
-                            df['split_index'] = split_indices
-                        else:
-                            df['split_index'] = 0
-
-                        df['extracted_at'] = datetime.utcnow().isoformat() + 'Z'
-                        
-                        # Write directly to disk to free up memory.
-                        df.to_csv(
-                            table_path, 
-                            mode='w' if is_first_chunk else 'a', 
-                            header=is_first_chunk, 
-                            index=False
-                        )
-                        
-                        is_first_chunk = False
-                        total_records_processed += len(df)
-                        
-                        del df
-                
-                gc.collect()
-                
-            else:
-                logging.warning(f"No data downloaded for report ID {report_id}")
-            
-            time.sleep(3)
+            time.sleep(SETTLEMENT_DOWNLOAD_PACING)
+            self.metrics.record_wait('download_pacing', SETTLEMENT_DOWNLOAD_PACING)
+        self.drain(pending, 0, write_report)
 
         if total_records_processed > 0:
-            logging.info(f"Total Amazon settlement report records successfully written to disk: {total_records_processed}")
+            logging.info("Total Amazon settlement report records successfully written to disk: %d",
+                         total_records_processed)
         else:
             logging.warning("No Amazon settlement report data fetched.")
 
     def refresh_amazon_token(self):
         # Refresh the Amazon API token
         logging.info("Attempting to refresh the Amazon token.")
-        url = "https://api.amazon.com/auth/o2/token"
+        url = self.lwa_token_url
         payload = {
             'grant_type': 'refresh_token',
             'refresh_token': self.refresh_token,
@@ -808,7 +1521,7 @@ class Component(ComponentBase):
             'client_secret': self.client_secret_id
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        response = requests.post(url, data=payload, headers=headers)
+        response = self.send_request('post', url, data=payload, headers=headers)
         if response.ok:
             self.access_token = response.json().get("access_token")
             logging.info("Token refreshed successfully.")
@@ -818,7 +1531,7 @@ class Component(ComponentBase):
     def refresh_amazon_ads_token(self):
         # Refresh the Amazon Ads API token
         logging.info("Attempting to refresh the Amazon Ads token.")
-        url = "https://api.amazon.com/auth/o2/token"
+        url = self.lwa_token_url
         payload = {
             'grant_type': 'refresh_token',
             'refresh_token': self.refresh_token_ads,
@@ -826,18 +1539,25 @@ class Component(ComponentBase):
             'client_secret': self.client_secret_id_ads
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        response = requests.post(url, data=payload, headers=headers)
+        response = self.send_request('post', url, data=payload, headers=headers)
         if response.ok:
             self.ads_access_token = response.json().get("access_token")
             logging.info("Ads token refreshed successfully.")
         else:
             logging.error("Failed to refresh ads token: %s", response.text)
 
+    def adaptive_segments(self, report_type, marketplace_id, default_days):
+        # Date-range segments sized from the row density learned for this report type and marketplace
+        return AdaptiveSegments(
+            self.state.setdefault(STATE_REPORT_DENSITY, {}), report_type, marketplace_id, self.date_range,
+            default_days, max_days=REPORT_MAX_SEGMENT_DAYS.get(report_type, default_days), clock=self.clock
+        )
+
     def split_date_range(self, total_days, segment_length):
         # Split the specified date range into segments for processing
         logging.info("Splitting the date range into segments.")
         segments = []
-        start_date = datetime.utcnow() - timedelta(minutes=5)
+        start_date = self.clock.report_end
         while total_days > 0:
             current_segment_length = min(segment_length, total_days)
             end_date = start_date - timedelta(days=current_segment_length)
@@ -848,9 +1568,9 @@ class Component(ComponentBase):
 
     def create_report(self, start_date, end_date, report_type, marketplace_id=None):
         # Request a new report from Amazon SP-API
-        logging.info("Creating %s report from %s to %s for marketplace %s",
-                    report_type, start_date, end_date, marketplace_id)
-        url = "https://sellingpartnerapi-eu.amazon.com/reports/2021-06-30/reports"
+        logging.debug("Creating %s report from %s to %s for marketplace %s",
+                      report_type, start_date, end_date, marketplace_id)
+        url = f"{self.sp_api_base_url}/reports/2021-06-30/reports"
         headers = {
             'Content-Type': 'application/json',
             'x-amz-access-token': self.access_token
@@ -858,71 +1578,58 @@ class Component(ComponentBase):
         payload = json.dumps({
             "marketplaceIds": [marketplace_id],
             "reportType": report_type,
-            "dataStartTime": end_date.isoformat(timespec='milliseconds') + 'Z',
-            "dataEndTime": start_date.isoformat(timespec='milliseconds') + 'Z'
+            "dataStartTime": iso_utc(end_date, timespec='milliseconds'),
+            "dataEndTime": iso_utc(start_date, timespec='milliseconds')
         })
 
-        response = requests.post(url, headers=headers, data=payload)
-        if response.status_code == 202:
+        response = self.controlled_request('post', url, headers=headers, data=payload)
+        if response and response.status_code == 202:
             report_id = response.json().get('reportId')
-            logging.info("Report created successfully with ID: %s", report_id)
+            logging.debug("Report created successfully with ID: %s", report_id)
+            self.events.count('reports_created', report_type, reports=1)
+            self.report_created[report_id] = (report_type, time.perf_counter())
             return report_id
         else:
-            logging.error("Failed to create report: %s", response.text)
-            return None
-
-    def create_ledger_report(self, start_date, end_date, report_type, marketplace_id):
-            logging.info(f"Creating {report_type} ledger report from {start_date} to {end_date}")
-            url = "https://sellingpartnerapi-eu.amazon.com/reports/2021-06-30/reports"
-            headers = {'Content-Type':'application/json','x-amz-access-token':self.access_token}
-            payload = {
-                'marketplaceIds':[marketplace_id],
-                'reportType':report_type,
-                'dataStartTime':start_date.isoformat(timespec='milliseconds')+'Z',
-                'dataEndTime':end_date.isoformat(timespec='milliseconds')+'Z'
-            }
-            if report_type=='GET_LEDGER_SUMMARY_VIEW_DATA':
-                payload['reportOptions']={
-                    'aggregatedByTimePeriod':'DAILY',
-                    'aggregateByLocation':'COUNTRY'
-                }
-            resp=requests.post(url, headers=headers, data=json.dumps(payload))
-            if resp.status_code==202:
-                return resp.json()['reportId']
-            logging.error(f"Failed to create ledger report: {resp.text}")
+            logging.error("Failed to create report: %s", response.text if response is not None else "No response")
             return None
 
     def poll_report_status_and_download(self, report_id, data_frame, file_name, is_xml, primary_keys, is_json=False):
         # Check report status and download when ready
-        logging.info(f"Polling report status for ID {report_id}.")
-        url = f"https://sellingpartnerapi-eu.amazon.com/reports/2021-06-30/reports/{report_id}"
+        logging.debug("Polling report status for ID %s.", report_id)
+        url = f"{self.sp_api_base_url}/reports/2021-06-30/reports/{report_id}"
         headers = {'x-amz-access-token': self.access_token,
                    'Content-Type': 'application/json'}
+        report_type = self.report_created.get(report_id, (file_name,))[0]
         while True:
             response = self.controlled_request('get', url, headers=headers)
             if response and response.status_code == 200:
                 status = response.json().get('processingStatus')
-                logging.info("Report status: %s", status)
+                logging.debug("Report %s status: %s", report_id, status)
+                self.events.count('report_polls', report_type, polls=1, done=status == 'DONE')
                 if status == 'DONE':
+                    if report_id in self.report_created:
+                        report_type, created = self.report_created.pop(report_id)
+                        self.metrics.record_report_duration(report_type, time.perf_counter() - created)
                     document_id = response.json().get('reportDocumentId')
                     data_frame = self.download_report(
                         document_id, data_frame, file_name, is_xml, primary_keys, is_json)
                     if inspect.isgenerator(data_frame):
-                        logging.info(f"Data stream from report {report_id} is ready for processing.")
+                        logging.debug("Data stream from report %s is ready for processing.", report_id)
                     else:
-                        logging.info(
-                            f"Data from report {report_id} loaded, records: {len(data_frame)}")
+                        logging.debug("Data from report %s loaded, records: %d", report_id, len(data_frame))
                     return data_frame # Return the updated dataframe or generator
                 elif status in ['CANCELLED', 'FATAL']:
                     logging.error(
                         "Report processing ended with status: %s", status)
+                    if status == 'FATAL':
+                        self.fatal_report_ids.add(report_id)
                     break
                 else:
-                    logging.info("Waiting before the next status check...")
-                    time.sleep(10)
+                    time.sleep(REPORT_POLL_INTERVAL)
+                    self.metrics.record_wait('report_polling', REPORT_POLL_INTERVAL)
             else:
                 logging.error(
-                    "Failed to poll report status: %s", response.text)
+                    "Failed to poll report status: %s", response.text if response is not None else "No response")
                 break
         # Return an empty DataFrame on failure instead of empty list
         return pd.DataFrame()
@@ -933,7 +1640,7 @@ class Component(ComponentBase):
         """
         logging.info("Querying existing %s reports from %s to %s for marketplace %s",
                      report_type, end_date, start_date, marketplace_id)
-        url = "https://sellingpartnerapi-eu.amazon.com/reports/2021-06-30/reports"
+        url = f"{self.sp_api_base_url}/reports/2021-06-30/reports"
         headers = {
             'x-amz-access-token': self.access_token
         }
@@ -941,8 +1648,8 @@ class Component(ComponentBase):
         params = {
             "reportTypes": report_type,
             "marketplaceIds": marketplace_id,
-            "createdSince": end_date.isoformat(timespec='milliseconds') + 'Z',
-            "createdUntil": start_date.isoformat(timespec='milliseconds') + 'Z',
+            "createdSince": iso_utc(end_date, timespec='milliseconds'),
+            "createdUntil": iso_utc(start_date, timespec='milliseconds'),
             "pageSize": 100 
         }
 
@@ -959,8 +1666,8 @@ class Component(ComponentBase):
 
     def download_report(self, document_id, data_frame, file_name, is_xml, primary_keys, is_json=False):
         # Download the report document from Amazon SP-API
-        logging.info(f"Downloading report document ID: {document_id}.")
-        url = f"https://sellingpartnerapi-eu.amazon.com/reports/2021-06-30/documents/{document_id}"
+        logging.debug("Downloading report document ID: %s.", document_id)
+        url = f"{self.sp_api_base_url}/reports/2021-06-30/documents/{document_id}"
         headers = {'x-amz-access-token': self.access_token,
                    'Content-Type': 'application/json'}
         response = self.controlled_request('get', url, headers=headers)
@@ -968,196 +1675,72 @@ class Component(ComponentBase):
             document_url = response.json().get('url')
             return self.process_document(document_url, response.json().get('compressionAlgorithm', ''), is_xml, file_name, is_json)
         else:
-            logging.error(f"Failed to download document: {response.text}")
+            logging.error("Failed to download document: %s", response.text)
             # Ensure this returns an empty DataFrame on failure.
             return pd.DataFrame()
 
     def process_document(self, document_url, compression_algorithm, is_xml, file_name, is_json=False):
         # Process the document after downloading, convert from XML/CSV/JSON as needed
-        response = self.controlled_request('get', document_url)
-        if response and response.status_code == 200:
-            content = gzip.decompress(
-                response.content) if compression_algorithm == 'GZIP' else response.content
-            if is_xml:
-                if file_name == 'orders.csv':
-                    data_frame = self.parse_all_orders_xml_report(content)
-                else:
-                    data_frame = self.parse_xml_data(content)
-            elif is_json:
-                json_data = json.loads(content.decode('utf-8'))
-                data_frame = pd.json_normalize(json_data)
-            else:
-                byte_stream = io.BytesIO(content)
-                if file_name == 'settlement_report.csv':
-                    chunk_iter = pd.read_csv(byte_stream, delimiter='\t', encoding='utf-8', chunksize=5000)
-                    data_frame = (chunk for chunk in chunk_iter) 
-                else:
-                    data_frame = pd.read_csv(byte_stream, delimiter='\t', encoding='utf-8')
-                    
-            return data_frame
-        else:
+        self.backpressure()
+        spool = download_document(self.document_request, document_url)
+        if spool is None:
             logging.error("Failed to download or process document.")
             return pd.DataFrame()
+        return self.parse_document(open_document(spool, compression_algorithm, self.metrics), is_xml, file_name,
+                                   is_json)
+
+    def parse_document(self, document, is_xml, file_name, is_json=False):
+        # Convert a downloaded document file from XML/CSV/JSON as needed. Tab-separated
+        # documents parsed in this process are streamed from the file; the others are read whole.
+        parse_start = time.perf_counter()
+        streamed = (not is_xml and not is_json
+                    and not (file_name == 'settlement_report.csv' and self.parse_pool))
+        if not streamed:
+            with document:
+                content = document.read()
+        if is_xml:
+            # Orders and returns come out as batches of row tuples for CsvTableWriter
+            if file_name == 'orders.csv':
+                data_frame = (self.parse_pool.chunks(parse_order_records, content) if self.parse_pool
+                              else self.order_record_batches(content))
+            else:
+                data_frame = (self.parse_pool.chunks(parse_return_records, content) if self.parse_pool
+                              else self.return_record_batches(content))
+        elif is_json:
+            # JSON reports are returned parsed; callers flatten them with flatten_json
+            data_frame = json.loads(content)
+        elif not streamed:
+            data_frame = self.parse_pool.chunks(parse_settlement, content)
+        elif file_name == 'settlement_report.csv':
+            data_frame = self.transform_settlement_chunks(self.read_tsv_chunks(document, 'settlement'))
+        elif file_name.startswith('inventory_ledger_'):
+            # Read as text so every chunk formats its values the same way
+            data_frame = self.read_tsv_chunks(document, 'ledger', dtype=str)
+        else:
+            with document:
+                data_frame = pd.read_csv(document, delimiter='\t', encoding='utf-8')
 
-    def parse_xml_data(self, xml_data):
-        # Parse XML and extract data into a DataFrame
-        logging.info("Starting XML data parsing.")
-        """ Parse XML and extract data into a DataFrame. """
-        root = ET.fromstring(xml_data)
-        all_records = []
-
-        # Iterate over each return_detail element in the XML
-        for return_detail in root.findall('.//return_details'):
-            item_detail = return_detail.find('.//item_details')
-
-            # Extracting fields from item_details and return_details
-            record = {
-                'item_name': item_detail.findtext('item_name', ''),
-                'asin': item_detail.findtext('asin', ''),
-                'return_reason_code': item_detail.findtext('return_reason_code', ''),
-                'merchant_sku': item_detail.findtext('merchant_sku', ''),
-                'in_policy': item_detail.findtext('in_policy', ''),
-                'return_quantity': item_detail.findtext('return_quantity', ''),
-                'resolution': item_detail.findtext('resolution', ''),
-                'category': item_detail.findtext('category', ''),
-                'refund_amount': item_detail.findtext('refund_amount', ''),
-                'order_id': return_detail.findtext('order_id', ''),
-                'order_date': return_detail.findtext('order_date', ''),
-                'amazon_rma_id': return_detail.findtext('amazon_rma_id', ''),
-                'return_request_date': return_detail.findtext('return_request_date', ''),
-                'return_request_status': return_detail.findtext('return_request_status', ''),
-                'a_to_z_claim': return_detail.findtext('a_to_z_claim', ''),
-                'is_prime': return_detail.findtext('is_prime', ''),
-                'label_cost': return_detail.find('.//label_details/label_cost').text if return_detail.find('.//label_details/label_cost') is not None else '',
-                'label_type': return_detail.find('.//label_details/label_type').text if return_detail.find('.//label_details/label_type') is not None else '',
-                'label_to_be_paid_by': return_detail.findtext('label_to_be_paid_by', ''),
-                'return_type': return_detail.findtext('return_type', ''),
-                'order_amount': return_detail.findtext('order_amount', ''),
-                'order_quantity': return_detail.findtext('order_quantity', '')
-            }
-            all_records.append(record)
-        logging.info("Completed parsing XML data.")
-        return pd.DataFrame(all_records)
-
-    def parse_all_orders_xml_report(self, xml_data):
-        """
-        Parses XML data from an All Orders report using a memory-efficient
-        stream parser (iterparse) and yields the data in manageable chunks.
-        """
-        CHUNK_SIZE = 2000
-
-        # Helper functions are unchanged
-        def get_text_from_node(node, path, default=''):
-            if node is None:
-                return default
-            found_node = node.find(path)
-            return found_node.text.strip() if found_node is not None and found_node.text else default
-
-        def get_price_component(item_price_node, component_type, default=0.0):
-            if item_price_node is None:
-                return default
-            for component in item_price_node.findall('Component'):
-                if get_text_from_node(component, 'Type') == component_type:
-                    amount_node = component.find('Amount')
-                    return float(amount_node.text) if amount_node is not None and amount_node.text else default
-            return default
+        if inspect.isgenerator(data_frame):
+            return self.metered_chunks(file_name, data_frame)
+        rows = len(data_frame) if isinstance(data_frame, pd.DataFrame) else 1
+        self.metrics.record_rows_parsed(file_name, rows, time.perf_counter() - parse_start)
+        return data_frame
 
-        try:
-            chunk_items = []
-            context = io.BytesIO(xml_data)
-
-            for event, elem in ET.iterparse(context, events=('end',)):
-                if elem.tag == 'Message':
-                    order = elem.find('Order')
-                    if order is None:
-                        elem.clear()
-                        continue
+    def metered_chunks(self, stream, chunks):
+        # Pass parsed chunks through while recording their rows and the time spent producing them
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            self.metrics.record_rows_parsed(stream, len(chunk), time.perf_counter() - start)
+            yield chunk
 
-                    fulfillment_data = order.find('FulfillmentData')
-                    address = fulfillment_data.find('Address') if fulfillment_data is not None else None
-                    
-                    order_details = {
-                        'amazon_order_id': get_text_from_node(order, 'AmazonOrderID'),
-                        'merchant_order_id': get_text_from_node(order, 'MerchantOrderID'),
-                        'purchase_date': get_text_from_node(order, 'PurchaseDate'),
-                        'last_updated_date': get_text_from_node(order, 'LastUpdatedDate'),
-                        'order_status': get_text_from_node(order, 'OrderStatus'),
-                        'sales_channel': get_text_from_node(order, 'SalesChannel'),
-                        'fulfillment_channel': get_text_from_node(fulfillment_data, 'FulfillmentChannel'),
-                        'ship_service_level': get_text_from_node(fulfillment_data, 'ShipServiceLevel'),
-                        'address_type': get_text_from_node(address, 'AddressType', default=get_text_from_node(order, 'AddressType')),
-                        'ship_city': get_text_from_node(address, 'City'),
-                        'ship_state': get_text_from_node(address, 'State'),
-                        'ship_postal_code': get_text_from_node(address, 'PostalCode'),
-                        'ship_country': get_text_from_node(address, 'Country'),
-                        'is_business_order': get_text_from_node(order, 'IsBusinessOrder'),
-                        'payment_method_details': get_text_from_node(order, 'PaymentMethodDetails'),
-                        'buyer_tax_registration_country': get_text_from_node(order, 'BuyerTaxRegistrationCountry'),
-                        'buyer_tax_registration_type': get_text_from_node(order, 'BuyerTaxRegistrationType'),
-                        'purchase_order_number': get_text_from_node(order, 'PurchaseOrderNumber'),
-                        'is_replacement_order': get_text_from_node(order, 'IsReplacementOrder'),
-                        'is_exchange_order': get_text_from_node(order, 'IsExchangeOrder'),
-                        'original_order_id': get_text_from_node(order, 'OriginalOrderID'),
-                        'is_iba': get_text_from_node(order, 'IsIba'),
-                        'ioss_number': get_text_from_node(order, 'IossNumber'),
-                    }
-
-                    for item in order.findall('OrderItem'):
-                        item_price_node = item.find('ItemPrice')
-                        promotion_node = item.find('Promotion')
-                        item_details = {
-                            'amazon_order_item_code': get_text_from_node(item, 'AmazonOrderItemCode'),
-                            'product_name': get_text_from_node(item, 'ProductName'),
-                            'sku': get_text_from_node(item, 'SKU'),
-                            'asin': get_text_from_node(item, 'ASIN'),
-                            'item_status': get_text_from_node(item, 'ItemStatus'),
-                            'quantity': int(get_text_from_node(item, 'Quantity', '0')),
-                            'number_of_items': int(get_text_from_node(item, 'NumberOfItems', '0')),
-                            'currency': item_price_node.find('.//Amount').get('currency') if item_price_node and item_price_node.find('.//Amount') is not None else '',
-                            'item_price': get_price_component(item_price_node, 'Principal'),
-                            'item_tax': get_price_component(item_price_node, 'Tax'),
-                            'shipping_price': get_price_component(item_price_node, 'Shipping'),
-                            'shipping_tax': get_price_component(item_price_node, 'ShippingTax'),
-                            'gift_wrap_price': get_price_component(item_price_node, 'GiftWrap'),
-                            'gift_wrap_tax': get_price_component(item_price_node, 'GiftWrapTax'),
-                            'vat_exclusive_item_price': get_price_component(item_price_node, 'VatExclusiveItemPrice'),
-                            'vat_exclusive_shipping_price': get_price_component(item_price_node, 'VatExclusiveShippingPrice'),
-                            'vat_exclusive_giftwrap_price': get_price_component(item_price_node, 'VatExclusiveGiftWrapPrice'),
-                            'promotion_ids': get_text_from_node(promotion_node, 'PromotionIDs'),
-                            'item_promotion_discount': float(get_text_from_node(promotion_node, 'ItemPromotionDiscount', '0.0')),
-                            'ship_promotion_discount': float(get_text_from_node(promotion_node, 'ShipPromotionDiscount', '0.0')),
-                            'tax_collection_model': get_text_from_node(item, 'TaxCollectionModel'),
-                            'tax_collection_responsible_party': get_text_from_node(item, 'TaxCollectionResponsibleParty'),
-                            'is_heavy_or_bulky': get_text_from_node(item, 'IsHeavyOrBulky'),
-                            'is_amazon_invoiced': get_text_from_node(item, 'IsAmazonInvoiced'),
-                            'is_transparency': get_text_from_node(item, 'IsTransparency'),
-                            'is_buyer_requested_cancellation': get_text_from_node(item, 'IsBuyerRequestedCancellation'),
-                            'buyer_requested_cancel_reason': get_text_from_node(item, 'BuyerRequestedCancel/Reason'),
-                            'amazon_programs': get_text_from_node(item, './/AmazonProgramName'),
-                            'buyer_company_name': get_text_from_node(item, 'BuyerInfo/BuyerCompanyName'),
-                        }
-                        flat_record = {**order_details, **item_details}
-                        chunk_items.append(flat_record)
-
-                    # When the chunk is full, yield it as a DataFrame and reset the list
-                    if len(chunk_items) >= CHUNK_SIZE:
-                        yield pd.DataFrame(chunk_items)
-                        chunk_items = []
-
-                    elem.clear()
-
-            # After the loop, yield any remaining items in the last partial chunk
-            if chunk_items:
-                yield pd.DataFrame(chunk_items)
-                
-        except ET.ParseError as e:
-            logging.error(f"Failed to parse XML data: {e}")
-            return
-    
     def fetch_financial_events(self, next_token=None):
         # Fetch financial events from Amazon SP-API
-        logging.info("Fetching financial events.")
-        url = "https://sellingpartnerapi-eu.amazon.com/finances/v0/financialEvents"
+        logging.debug("Fetching financial events.")
+        url = f"{self.sp_api_base_url}/finances/v0/financialEvents"
         headers = {'x-amz-access-token': self.access_token,
                    'Content-Type': 'application/json'}
         params = {'NextToken': next_token} if next_token else {
@@ -1166,221 +1749,89 @@ class Component(ComponentBase):
         response = self.controlled_request(
             'get', url, headers=headers, params=params)
         if response and response.status_code == 200:
-            logging.info("Financial events fetched successfully.")
-            return response.json()
+            logging.debug("Financial events fetched successfully.")
+            data = response.json()
+            events = data.get('payload', {}).get('FinancialEvents', {})
+            self.events.count('pages', 'financial events', pages=1,
+                              records=sum(len(group) for group in events.values() if isinstance(group, list)))
+            return data
         else:
-            logging.error(f"Failed to fetch financial events: {response.text}")
+            logging.error("Failed to fetch financial events: %s",
+                          response.text if response is not None else 'No response')
             return None
 
-    def controlled_request(self, method, url, headers=None, params=None, data=None, retry_count=0):
-        # Send requests and handle rate limits with exponential backoff
+    def send_request(self, method, url, **kwargs):
+        # Send a single HTTP request with the operation's deadlines and record its duration and status code
+        operation = operation_for(method, url)
+        kwargs.setdefault('timeout', timeout_for(operation))
+        start = time.perf_counter()
+        status_code = 'error'
         try:
-            response = requests.request(method, url, headers=headers, params=params, data=data)
-            if response.status_code == 429:  # Check if rate limit was hit
-                if retry_count < 7: # Limit the number of retries to prevent infinite loop
-                    wait_time = (2 ** (retry_count + 2)) + random.uniform(0, 1) # Exponential backoff with jitter
-                    logging.warning(f"Rate limit hit, retrying after {wait_time:.2f} seconds...")
-                    time.sleep(wait_time)
-                    return self.controlled_request(method, url, headers, params, data, retry_count + 1)
-                else:
-                    logging.error("Rate limit hit repeatedly, stopping retries.")
-                    return None
+            response = requests.request(method, url, **kwargs)
+            status_code = response.status_code
             return response
-        except requests.exceptions.RequestException as e:
-            logging.error("HTTP Request failed: %s", e)
-            return None
+        finally:
+            self.metrics.record_request(operation, status_code, time.perf_counter() - start)
 
     @staticmethod
-    def camel_to_snake(name):
-        # Converts CamelCase to snake_case
-        """Converts CamelCase to snake_case"""
-        name = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
-        return re.sub('([a-z0-9])([A-Z])', r'\1_\2', name).lower()
-
-    def process_financial_data(self, data):
-        # Process raw financial data into structured DataFrame
-        logging.info("Starting to process financial data.")
-        if not data or 'payload' not in data or 'FinancialEvents' not in data['payload']:
-            logging.error("No data or incorrect data structure received.")
-            # Return an empty DataFrame to handle this scenario gracefully.
-            return pd.DataFrame()
-
-        # Base columns for financial data DataFrame
-        columns = [
-            'amazon_order_id', 'marketplace_name', 'posted_date', 'seller_sku', 'order_item_id',
-            'quantity_shipped'
-        ]
-        charge_types = set()
-        fee_types = set()
-        promotion_ids = set()
-
-        # Collect all types of charges, fees, and promotions for shipments
-        for event in data['payload']['FinancialEvents']['ShipmentEventList']:
-            for item in event.get('ShipmentItemList', []):
-                for charge in item.get('ItemChargeList', []):
-                    charge_types.add(self.camel_to_snake(charge.get('ChargeType', '')))
-                for fee in item['ItemFeeList']:
-                    fee_types.add(self.camel_to_snake(fee.get('FeeType', '')))
-                # if 'PromotionList' in item:
-                #     for promo in item['PromotionList']:
-                #         promotion_ids.add((self.camel_to_snake(promo['PromotionType']), promo['PromotionId']))
-
-        # Collect all types of charges, fees, and promotions for refunds
-        for event in data['payload']['FinancialEvents']['RefundEventList']:
-            for item in event['ShipmentItemAdjustmentList']:
-                for charge in item.get('ItemChargeAdjustmentList', []):
-                    charge_types.add(self.camel_to_snake(charge.get('ChargeType', '')))
-                for fee in item.get('ItemFeeAdjustmentList', []):
-                    fee_types.add(self.camel_to_snake(fee.get('FeeType', '')))
-
-        # Define all possible charge and fee types that Amazon API can return
-        # This ensures consistent schema even when some types are missing from current data
-        # Based on the complete list from Keboola error message
-        all_possible_charge_types = {
-            'gift_wrap', 'shipping_charge', 'shipping_tax', 'principal', 'tax',
-            'gift_wrap_tax', 'giftwrap_commission', 'renewed_program_fee',
-            'shipping_hb', 'variable_closing_fee', 'fixed_closing_fee',
-            'commission', 'refund_commission', 'return_shipping', 'goodwill',
-            'digital_services_fee', 'giftwrap_chargeback', 'shipping_chargeback',
-            'fba_per_unit_fulfillment_fee', 'generic_deduction', 'digital_services_fee_fba'
-        }
-        
-        # Add all possible charge and fee types to ensure consistent schema
-        all_charge_fee_types = charge_types.union(fee_types).union(all_possible_charge_types)
-        
-        # Adding columns for each type of charge and fee
-        for charge_type in all_charge_fee_types:
-            columns.append(f"{charge_type}_amount")
-            columns.append(f"{charge_type}_currency")
-        for promo_type, promo_id in promotion_ids:
-            columns.append(f"{promo_type}_amount")
-            columns.append(f"{promo_type}_currency")
-            columns.append(f"{promo_type}_id")
-
-        # Initialize DataFrame with new columns
-        financial_data_df = pd.DataFrame(columns=columns)
-        all_rows = []
-
-        # Populate DataFrame with shipment data
-        for event in data['payload']['FinancialEvents']['ShipmentEventList']:
-            for item in event['ShipmentItemList']:
-                # Initialize row: 0 for _amount columns, '' for others
-                row = {col: (0 if col.endswith('_amount') else '') for col in columns}
-                row.update({
-                    'amazon_order_id': event.get('AmazonOrderId', ''),
-                    'marketplace_name': event.get('MarketplaceName', ''),
-                    'posted_date': event.get('PostedDate', ''),
-                    'seller_sku': item.get('SellerSKU', ''),
-                    'order_item_id': item.get('OrderItemId', ''),
-                    'quantity_shipped': item.get('QuantityShipped', 0)
-                })
-                for charge in item.get('ItemChargeList', []):
-                    charge_type_snake = self.camel_to_snake(charge.get('ChargeType', ''))
-                    charge_amount_dict = charge.get('ChargeAmount', {})
-                    if charge_type_snake and charge_amount_dict:
-                        row[f"{charge_type_snake}_amount"] = charge_amount_dict.get('CurrencyAmount')
-                        row[f"{charge_type_snake}_currency"] = charge_amount_dict.get('CurrencyCode')
-
-                for fee in item.get('ItemFeeList', []):
-                    fee_type_snake = self.camel_to_snake(fee.get('FeeType', ''))
-                    fee_amount_dict = fee.get('FeeAmount', {})
-                    if fee_type_snake and fee_amount_dict:
-                        row[f"{fee_type_snake}_amount"] = fee_amount_dict.get('CurrencyAmount')
-                        row[f"{fee_type_snake}_currency"] = fee_amount_dict.get('CurrencyCode')
-
-                # if 'PromotionList' in item:
-                #     for promo in item['PromotionList']:
-                #         promo_type_snake = self.camel_to_snake(promo['PromotionType'])
-                #         promo_type_id = f"{promo_type_snake}_id"
-                #         promo_type_amount = f"{promo_type_snake}_amount"
-                #         promo_type_currency = f"{promo_type_snake}_currency"
-                #         row[promo_type_id] = promo['PromotionId']
-                #         row[promo_type_amount] = promo['PromotionAmount']['CurrencyAmount']
-                #         row[promo_type_currency] = promo['PromotionAmount']['CurrencyCode']
-
-                all_rows.append(row)  # Append each item as a row to the list
-
-        # Populate DataFrame with refund data
-        for event in data['payload']['FinancialEvents']['RefundEventList']:
-            for item in event['ShipmentItemAdjustmentList']:
-                # Initialize row: 0 for _amount columns, '' for others
-                row = {col: (0 if col.endswith('_amount') else '') for col in columns}
-                row.update({
-                    'amazon_order_id': event.get('AmazonOrderId', ''),
-                    'marketplace_name': event.get('MarketplaceName', ''),
-                    'posted_date': event.get('PostedDate', ''),
-                    'seller_sku': item.get('SellerSKU', ''),
-                    'order_item_id': item.get('OrderAdjustmentItemId', ''),
-                    'quantity_shipped': item.get('QuantityShipped', 0)
-                })
-                for charge in item.get('ItemChargeAdjustmentList', []):
-                    charge_type_snake = self.camel_to_snake(charge.get('ChargeType', ''))
-                    charge_amount_dict = charge.get('ChargeAmount', {})
-                    if charge_type_snake and charge_amount_dict:
-                        row[f"{charge_type_snake}_amount"] = charge_amount_dict.get('CurrencyAmount')
-                        row[f"{charge_type_snake}_currency"] = charge_amount_dict.get('CurrencyCode')
-
-                for fee in item.get('ItemFeeAdjustmentList', []):
-                    fee_type_snake = self.camel_to_snake(fee.get('FeeType', ''))
-                    fee_amount_dict = fee.get('FeeAmount', {})
-                    if fee_type_snake and fee_amount_dict:
-                        row[f"{fee_type_snake}_amount"] = fee_amount_dict.get('CurrencyAmount')
-                        row[f"{fee_type_snake}_currency"] = fee_amount_dict.get('CurrencyCode')
-
-                all_rows.append(row)  # Append each item as a row to the list
-
-        return pd.DataFrame(all_rows, columns=columns)
-
-    def process_data(self, df, file_name, primary_keys, process_empty = False):
-        # Process and save data to a file
-        logging.info(f"Processing {len(df)} records to write to {file_name}.")
+    def connect_failed(error) -> bool:
+        # Nothing was sent: the connection timed out or was refused, as httpx.ConnectError
+        # and httpx.ConnectTimeout in the async client
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return (isinstance(error, requests.exceptions.ConnectionError)
+                and isinstance(reason, urllib3.exceptions.NewConnectionError))
+
+    def controlled_request(self, method, url, headers=None, params=None, data=None):
+        # Send requests with deadlines; rate limits back off exponentially, server errors
+        # and broken connections are retried with jitter (see retries.RetryPolicy)
+        operation = operation_for(method, url)
+        policy = RetryPolicy(method)
+        while True:
+            try:
+                response = self.send_request(method, url, headers=headers, params=params, data=data)
+                wait_time = policy.backoff(response.status_code)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                response = None
+                wait_time = policy.backoff(connect_failed=self.connect_failed(e))
+                if wait_time is None:
+                    logging.error("HTTP Request failed: %s", e)
+            except requests.exceptions.RequestException as e:
+                logging.error("HTTP Request failed: %s", e)
+                return None
+            if wait_time is None:
+                if response is not None and response.status_code == 429:
+                    logging.error("Rate limit hit repeatedly, stopping retries.")
+                    return None
+                return response
+            if policy.reason == 'rate_limit':
+                logging.warning("Rate limit hit, retrying after %.2f seconds...", wait_time)
+            else:
+                logging.warning("%s on %s, retrying after %.2f seconds...", policy.reason, operation, wait_time)
+            self.metrics.record_retry(policy.reason)
+            time.sleep(wait_time)
+            self.metrics.record_wait('rate_limit' if policy.reason == 'rate_limit' else 'retry_backoff', wait_time)
+
+    def document_request(self, method, url, headers=None):
+        # Document downloads, hedged with a second request when they run longer than usual
+        if self.hedge_executor is None:
+            return self.controlled_request(method, url, headers=headers)
+        return hedged_call(self.hedge_executor, lambda: self.controlled_request(method, url, headers=headers),
+                           self.download_latency, on_hedge=lambda: self.metrics.record_retry('hedged_download'))
+
+    def process_data(self, df, file_name, primary_keys, process_empty = False, constants=None):
+        # Process and save data to a file; constants are run-constant columns added only now
+        logging.info("Processing %d records to write to %s.", len(df), file_name)
+        df = self.drop_unchanged_rows(with_constants(df, constants), file_name, primary_keys)
         if not df.empty or process_empty == True:
             table_path = self.create_out_table_definition(
                 file_name, incremental=True, primary_key=primary_keys).full_path
             df.to_csv(table_path, index=False)
-            logging.info(
-                f"File {file_name} created and data written successfully.")
-        else:
-            logging.warning(
-                f"No data available to write to {file_name}. DataFrame is empty.")
-
-    def create_and_download_ads_report(self, scope, country, ad_product):
-        logging.info(f"Starting report creation for ad product: {ad_product} in country: {country}")
-        report_id = self.create_ads_report(scope, ad_product)
-        if report_id:
-            logging.info(f"Report created successfully for {ad_product} in {country} with ID: {report_id}")
-            report_url = self.poll_ads_report_status(report_id, scope)
-            if report_url:
-                logging.info(f"Downloading report for {ad_product} in {country}")
-                report_data = self.download_ads_report(report_url)
-                self.process_ads_data(report_data, country, ad_product)
-            else:
-                logging.error(f"Failed to download report for {ad_product} in {country}")
-        else:
-            logging.error(f"Failed to create report for {ad_product} in {country}")
-
-    def create_ads_report(self, scope, ad_product):
-        # Create an Amazon Ads report
-        url = 'https://advertising-api-eu.amazon.com/reporting/reports'
-        headers = {
-            'Content-Type': 'application/vnd.createasyncreportrequest.v3+json',
-            'Amazon-Advertising-API-ClientId': self.app_id_ads,
-            'Amazon-Advertising-API-Scope': scope,
-            'Authorization': f'Bearer {self.ads_access_token}'
-        }
-
-        start_date = (datetime.utcnow() - timedelta(days=10)).strftime('%Y-%m-%d')
-        end_date = datetime.utcnow().strftime('%Y-%m-%d')
-        payload = self.generate_payload(ad_product, start_date, end_date)
-
-        response = requests.post(url, headers=headers, json=payload)
-        if response.status_code == 200:
-            report_id = response.json().get('reportId')
-            logging.info(f"Report created successfully with ID: {report_id}")
-            return report_id
+            self.metrics.record_rows_written(file_name, len(df))
+            logging.info("File %s created and data written successfully.", file_name)
         else:
-            logging.error(f"Failed to create Amazon Ads report: {response.text}")
-            return None
+            logging.warning("No data available to write to %s. DataFrame is empty.", file_name)
 
     def generate_payload(self, ad_product, start_date, end_date):
         base_payload = {
@@ -1388,7 +1839,7 @@ class Component(ComponentBase):
             "endDate": end_date,
             "configuration": {
                 "groupBy": ["campaign"],
-                "columns": ["campaignId", "campaignName", "date", "impressions", "clicks", "cost"],
+                "columns": list(ADS_REPORT_COLUMNS),
                 "timeUnit": "DAILY",
                 "format": "GZIP_JSON"
             }
@@ -1409,71 +1860,6 @@ class Component(ComponentBase):
 
         return base_payload
 
-    def poll_ads_report_status(self, report_id, scope):
-        # Poll the status of the Amazon Ads report
-        url = f'https://advertising-api-eu.amazon.com/reporting/reports/{report_id}'
-        headers = {
-            'Amazon-Advertising-API-ClientId': self.app_id_ads,
-            'Amazon-Advertising-API-Scope': scope,
-            'Authorization': f'Bearer {self.ads_access_token}'
-        }
-        while True:
-            response = self.controlled_request('get', url, headers=headers)
-            if response and response.status_code == 200:
-                status = response.json().get('status')
-                logging.info(f"Report status: {status}")
-                if status == 'COMPLETED':
-                    return response.json().get('url')
-                elif status in ['FAILURE', 'CANCELLED']:
-                    logging.error(f"Report processing ended with status: {status}")
-                    break
-                else:
-                    logging.info("Waiting before the next status check...")
-                    time.sleep(30)  # Wait for 30 seconds before checking again
-            else:
-                logging.error(f"Failed to poll report status: {response.text}")
-                break
-        return None
-
-    def download_ads_report(self, report_url):
-        # Download the Amazon Ads report
-        response = self.controlled_request('get', report_url)
-        if response and response.status_code == 200:
-            content = gzip.decompress(response.content)
-            return json.loads(content.decode('utf-8'))
-        else:
-            logging.error(f"Failed to download Amazon Ads report: {response.text}")
-            return None
-
-    def process_ads_data(self, report_data, country, ad_product):
-        logging.info(f"Processing Amazon Ads report data for ad product: {ad_product} in country: {country}.")
-        if report_data:
-            df = pd.json_normalize(report_data)
-            df.rename(columns={
-                "campaignId": "campaign_id",
-                "campaignName": "campaign_name",
-                "date": "date",
-                "impressions": "impressions",
-                "clicks": "clicks",
-                "cost": "cost"
-            }, inplace=True)
-            df['market'] = country
-            df['adProduct'] = ad_product  # Add adProduct type to the data
-            self.all_ads_data = pd.concat([self.all_ads_data, df], ignore_index=True)
-            logging.info(f"Processed {len(df)} records for {ad_product} in {country}")
-        else:
-            logging.warning(f"No data to process for Amazon Ads report: {ad_product} in {country}.")
-
-    def save_ads_data_to_csv(self):
-        # Save combined ads data to a single CSV file
-        logging.info("Saving all combined Amazon Ads report data to CSV.")
-        if not self.all_ads_data.empty:
-            file_name = 'advertising.csv'
-            primary_keys = ['ad_id', 'campaign_id', 'date', 'advertised_sku', 'advertised_asin']
-            self.process_data(self.all_ads_data, file_name, primary_keys)
-        else:
-            logging.warning("No data available to save. DataFrame is empty.")
-
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,91 @@
+"""
+Record-stream output: parser rows (tuples in the parser's fixed column order) are
+written straight to the output CSV with the csv module, without building
+DataFrames. The dialect matches DataFrame.to_csv (minimal quoting, '\\n' line
+ends), and ints and floats are written through their repr like pandas does, so a
+table looks the same whichever path wrote it.
+
+merge_tables combines the tables that regional extractions wrote to separate
+folders.
+"""
+import csv
+import os
+import shutil
+
+
+class CsvTableWriter:
+    """
+    Writes batches of rows to one output table; the header goes out with the first
+    non-empty batch, so tables without rows are not created.
+    """
+
+    def __init__(self, path: str, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def write_rows(self, rows) -> int:
+        if not rows:
+            return 0
+        if self._file is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file, lineterminator='\n')
+            self._writer.writerow(self.columns)
+        self._writer.writerows(rows)
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def merge_tables(source_dirs, destination_dir, source_columns=None):
+    """
+    Merge the tables written to several folders into destination_dir. A table found in
+    one folder is moved; a table found in more is written with one header row, and its
+    columns are the union of the source columns in order of appearance.
+    source_columns optionally holds, per folder, constant columns added in front of the
+    rows of its tables (e.g. the account they were extracted for).
+    Returns the names of the merged tables.
+    """
+    source_columns = source_columns or [{}] * len(source_dirs)
+    tables = {}
+    for source_dir, constants in zip(source_dirs, source_columns):
+        for name in sorted(os.listdir(source_dir)):
+            tables.setdefault(name, []).append((os.path.join(source_dir, name), constants))
+    os.makedirs(destination_dir, exist_ok=True)
+    for name, sources in tables.items():
+        destination = os.path.join(destination_dir, name)
+        if len(sources) == 1 and not sources[0][1]:
+            shutil.move(sources[0][0], destination)
+            continue
+        headers = []
+        for path, constants in sources:
+            with open(path, newline='', encoding='utf-8') as source:
+                headers.append(list(constants) + next(csv.reader(source), []))
+        columns = list(dict.fromkeys(column for header in headers for column in header))
+        with open(destination, 'w', newline='', encoding='utf-8') as out:
+            if all(header == columns for header in headers) and not any(constants for _, constants in sources):
+                # Same columns everywhere: copy the rows as they are
+                for index, (path, _) in enumerate(sources):
+                    with open(path, newline='', encoding='utf-8') as source:
+                        if index:
+                            source.readline()
+                        shutil.copyfileobj(source, out)
+                continue
+            writer = csv.DictWriter(out, columns, lineterminator='\n')
+            writer.writeheader()
+            for path, constants in sources:
+                with open(path, newline='', encoding='utf-8') as source:
+                    writer.writerows({**constants, **row} for row in csv.DictReader(source))
+    return list(tables)
@@ -0,0 +1,126 @@
+"""
+Date and time normalization.
+
+A RunClock holds the one reference timestamp of a run: report windows, date ranges
+and extracted_at stamps are all derived from it, so windows computed in different
+steps (or threads) line up. Report date columns are parsed with explicit formats per
+report and marketplace; when a column does not match its expected format, the
+format is detected once from a sample and cached for the rest of the run. Parsing is
+vectorized with pandas.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# Reports end a little before now: Amazon rejects data end times in the future
+REPORT_END_LAG = timedelta(minutes=5)
+# Values a detected format must parse
+DETECTION_SAMPLE_SIZE = 200
+
+ISO_DATE = '%Y-%m-%d'
+ISO_UTC = '%Y-%m-%dT%H:%M:%SZ'
+
+# Seller feedback dates are written in the marketplace's locale
+FEEDBACK_DATE_FORMATS = {
+    'ATVPDKIKX0DER': '%m/%d/%y',  # United States
+    'A2EUQ1WTGCTBG2': '%m/%d/%y',  # Canada
+    'A1AM78C64UM0Y8': '%d/%m/%y',  # Mexico
+    'A2Q3Y263D00KWC': '%d/%m/%y',  # Brazil
+    'A1PA6795UKMFR9': '%d.%m.%y',  # Germany
+    'A1F83G8C2ARO7P': '%d/%m/%y',  # United Kingdom
+    'A28R8C7NBKEWEA': '%d/%m/%y',  # Ireland
+    'A13V1IB3VIYZZH': '%d/%m/%y',  # France
+    'APJ6JRA9NG5V4': '%d/%m/%y',  # Italy
+    'A1RKKUPIHCS9HS': '%d/%m/%y',  # Spain
+    'A1805IZSGTT6HS': '%d-%m-%y',  # Netherlands
+    'AMEN7PMS3EDWL': '%d/%m/%y',  # Belgium
+    'A2NODRKZP88ZB9': '%Y-%m-%d',  # Sweden
+    'A1C3SOZRARQ6R3': '%d.%m.%y',  # Poland
+    'A33AVAJ2PDY3EV': '%d.%m.%y',  # Turkey
+    'A21TJRUUN4KGV': '%d/%m/%y',  # India
+    'A1VC38T7YXB528': '%y/%m/%d',  # Japan
+    'A39IBJ37TRP1C6': '%d/%m/%y',  # Australia
+    'A19VAU5U5O7RUS': '%d/%m/%y',  # Singapore
+}
+# Tried in order when the marketplace's format does not match
+FEEDBACK_FALLBACK_FORMATS = ['%d.%m.%y', '%d/%m/%y', '%m/%d/%y', '%Y-%m-%d', '%y/%m/%d', '%d.%m.%Y', '%d/%m/%Y',
+                             '%d-%m-%y']
+
+
+def iso_utc(value: datetime, timespec: str = 'auto') -> str:
+    # Naive UTC datetime as an ISO 8601 string with a Z suffix
+    return value.isoformat(timespec=timespec) + 'Z'
+
+
+class RunClock:
+    """
+    The reference timestamp of one run, taken once when the run starts.
+    """
+
+    def __init__(self, now: datetime = None):
+        self.now = now or datetime.utcnow()
+        # extracted_at of every row written in this run
+        self.timestamp = iso_utc(self.now)
+
+    @property
+    def report_end(self) -> datetime:
+        return self.now - REPORT_END_LAG
+
+    def days_ago(self, days: float) -> datetime:
+        return self.now - timedelta(days=days)
+
+
+class DateFormats:
+    """
+    Parses report date columns into ISO strings with the format expected for the
+    column. Formats detected for a (report, marketplace, column) key are cached, so
+    only the first chunk of a column pays for detection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._formats = {}
+
+    def detect(self, key, values: pd.Series, candidates):
+        """
+        The first of candidates that parses every value of a sample of values, None when
+        none does or there are no candidates. A detected format is cached under key.
+        """
+        with self._lock:
+            if key in self._formats:
+                return self._formats[key]
+        candidates = list(dict.fromkeys(candidate for candidate in candidates if candidate))
+        sample = values.dropna().head(DETECTION_SAMPLE_SIZE)
+        if sample.empty:
+            # Nothing to detect from; not cached
+            return candidates[0] if candidates else None
+        for date_format in candidates:
+            if pd.to_datetime(sample, format=date_format, errors='coerce').notna().all():
+                with self._lock:
+                    self._formats[key] = date_format
+                return date_format
+        logging.warning("No known date format matches %s, e.g. %r.", key, sample.iloc[0])
+        return None
+
+    def normalize(self, values: pd.Series, key, candidates, output_format: str = ISO_UTC) -> pd.Series:
+        """
+        values parsed with the detected format and written in output_format; values that
+        do not parse become NaN.
+        """
+        date_format = self.detect(key, values, candidates)
+        if date_format is None:
+            return pd.Series(float('nan'), index=values.index, dtype=object)
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+        return parsed.dt.strftime(output_format)
+
+    def feedback_dates(self, values: pd.Series, marketplace_id: str) -> pd.Series:
+        # Seller feedback dates of one marketplace as YYYY-MM-DD
+        candidates = [FEEDBACK_DATE_FORMATS.get(marketplace_id)] + FEEDBACK_FALLBACK_FORMATS
+        key = ('GET_SELLER_FEEDBACK_DATA', marketplace_id, 'date')
+        return self.normalize(values.astype('string').str.strip(), key, candidates, ISO_DATE)
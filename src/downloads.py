@@ -0,0 +1,129 @@
+"""
+Downloads of report documents from presigned S3 URLs into temporary files.
+
+The first request asks for the first part of the document only. Servers with range
+support answer 206 with the total size in Content-Range; documents above
+RANGED_DOWNLOAD_THRESHOLD are then fetched as concurrent Range requests and
+reassembled in the file, smaller ones with one request for the rest. Servers
+without range support answer 200 with the whole document, which is the
+single-stream fallback. Decompression runs on the reassembled file, so parsers can
+stream the document from disk.
+"""
+import logging
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from lazy import lazy_import
+
+gzip = lazy_import('gzip')
+
+RANGED_DOWNLOAD_THRESHOLD = 32 * 2 ** 20
+RANGE_PART_SIZE = 8 * 2 ** 20
+RANGE_WORKERS = 8
+COPY_BUFFER_SIZE = 2 ** 20
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+def range_header(start: int, end: int) -> dict:
+    return {'Range': f'bytes={start}-{end}'}
+
+
+def document_size(response):
+    """
+    Total size of the document from the Content-Range of a 206 response, None when
+    the server ignored the Range header.
+    """
+    if response.status_code != 206:
+        return None
+    match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+    return int(match.group(3)) if match else None
+
+
+def remaining_ranges(received: int, total, threshold: int = RANGED_DOWNLOAD_THRESHOLD,
+                     part_size: int = RANGE_PART_SIZE):
+    """
+    Inclusive (start, end) byte ranges still to be fetched after the first response.
+    """
+    if total is None or received >= total:
+        return []
+    if total < threshold:
+        return [(received, total - 1)]
+    return [(start, min(start + part_size, total) - 1) for start in range(received, total, part_size)]
+
+
+def is_part(response, start: int, end: int) -> bool:
+    return response is not None and response.status_code == 206 and len(response.content) == end - start + 1
+
+
+def describe(response) -> str:
+    return response.text if response is not None else 'no response'
+
+
+def is_usable_first(response) -> bool:
+    """
+    Whether the first response can start a download: the whole document (200), or
+    a part with the total size in Content-Range (206). Without the size the rest of
+    a partial document cannot be requested, so it would be cut off silently.
+    """
+    if response is None or response.status_code not in (200, 206):
+        logging.error("Failed to download document: %s", describe(response))
+        return False
+    if response.status_code == 206 and document_size(response) is None:
+        logging.error("Failed to download document: partial response with Content-Range %r",
+                      response.headers.get('Content-Range'))
+        return False
+    return True
+
+
+def download_document(request, url, workers: int = RANGE_WORKERS, threshold: int = RANGED_DOWNLOAD_THRESHOLD,
+                      part_size: int = RANGE_PART_SIZE):
+    """
+    Download url into a temporary file with request(method, url, headers=...), a
+    blocking controlled_request. Returns the file or None when the download failed.
+    """
+    first = request('get', url, headers=range_header(0, part_size - 1))
+    if not is_usable_first(first):
+        return None
+    spool = tempfile.TemporaryFile()
+    spool.write(first.content)
+    ranges = remaining_ranges(len(first.content), document_size(first), threshold, part_size)
+    if not ranges:
+        return spool
+    with ThreadPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        futures = {executor.submit(request, 'get', url, headers=range_header(start, end)): (start, end)
+                   for start, end in ranges}
+        for future in as_completed(futures):
+            start, end = futures[future]
+            response = future.result()
+            if not is_part(response, start, end):
+                logging.error("Failed to download bytes %d-%d of document: %s", start, end, describe(response))
+                for pending in futures:
+                    pending.cancel()
+                spool.close()
+                return None
+            spool.seek(start)
+            spool.write(response.content)
+    logging.info("Document of %d bytes downloaded in %d ranges.", ranges[-1][1] + 1, len(ranges) + 1)
+    return spool
+
+
+def open_document(spool, compression_algorithm, metrics):
+    """
+    Decompress a downloaded document file if needed. Returns a binary file with the
+    document content positioned at the start; spool is closed when it is replaced.
+    """
+    downloaded = spool.seek(0, 2)
+    spool.seek(0)
+    if compression_algorithm == 'GZIP':
+        document = tempfile.TemporaryFile()
+        with spool, gzip.GzipFile(fileobj=spool) as compressed:
+            shutil.copyfileobj(compressed, document, COPY_BUFFER_SIZE)
+    else:
+        document = spool
+    metrics.record_bytes('downloaded', downloaded)
+    metrics.record_bytes('decompressed', document.seek(0, 2))
+    document.seek(0)
+    return document
@@ -0,0 +1,134 @@
+"""
+Row fingerprints for incremental loads.
+
+Every output table is loaded incrementally, but each run re-extracts its whole date
+window, so most rows are the same as in the previous run. The store maps the
+primary key of every emitted row to a 64-bit hash of its content and lets the
+writers drop rows whose content has not changed since they were last emitted.
+
+The store is one sqlite file (integer keys, WITHOUT ROWID) that the component
+writes to out/files at the end of a run and reads back from in/files in the next
+one. Entries not seen for FINGERPRINT_TTL_DAYS are pruned.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+sqlite3 = lazy_import('sqlite3')
+
+FINGERPRINT_TTL_DAYS = 90
+# Columns that change on every run without the row changing
+VOLATILE_COLUMNS = frozenset({'extracted_at'})
+# Keys looked up per SELECT; sqlite allows 999 parameters by default
+LOOKUP_BATCH_SIZE = 900
+
+
+def _hash_frame(df):
+    try:
+        return pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64)
+    except TypeError:
+        # Unhashable cells, e.g. lists from nested JSON, are hashed through their text
+        return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().view(np.int64)
+
+
+def frame_fingerprints(df, primary_keys):
+    """
+    (keys, fingerprints) of the rows of df as int64 arrays. Rows are keyed by their
+    primary key columns, or by their whole content when the frame does not carry
+    all of them (e.g. tables without a primary key).
+    """
+    content = df[[column for column in df.columns if column not in VOLATILE_COLUMNS]]
+    fingerprints = _hash_frame(content)
+    if primary_keys and all(column in df.columns for column in primary_keys):
+        keys = _hash_frame(df[list(primary_keys)])
+    else:
+        keys = fingerprints
+    return keys, fingerprints
+
+
+def _hash64(values) -> int:
+    digest = hashlib.blake2b('\x1f'.join(map(str, values)).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def record_key_indexes(columns, primary_keys):
+    """
+    Positions of the primary key columns in parser rows, None when the rows do not
+    carry all of them and are keyed by their whole content.
+    """
+    if primary_keys and all(column in columns for column in primary_keys):
+        return [columns.index(column) for column in primary_keys]
+    return None
+
+
+def record_fingerprints(rows, key_indexes=None):
+    """
+    (keys, fingerprints) of row tuples; key_indexes are the positions of the primary
+    key values, None keys rows by their whole content.
+    """
+    fingerprints = [_hash64(row) for row in rows]
+    if key_indexes is None:
+        return fingerprints, fingerprints
+    return [_hash64([row[i] for i in key_indexes]) for row in rows], fingerprints
+
+
+class FingerprintStore:
+    """
+    Fingerprints of emitted rows by table and key, kept in a sqlite file.
+    """
+
+    def __init__(self, path: str, today: int = None):
+        self.path = path
+        # Days since the epoch; entries remember the last run that saw them
+        self.today = today if today is not None else int(time.time() // 86400)
+        # Regional extractions share the store from their threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS fingerprints ('
+            ' tbl TEXT NOT NULL, key INTEGER NOT NULL, fingerprint INTEGER NOT NULL, seen INTEGER NOT NULL,'
+            ' PRIMARY KEY (tbl, key)) WITHOUT ROWID')
+
+    def changed(self, table: str, keys, fingerprints):
+        """
+        Boolean mask of the rows that are new or changed since they were last emitted,
+        and record all of them as seen today.
+        """
+        keys = [int(key) for key in keys]
+        fingerprints = [int(fingerprint) for fingerprint in fingerprints]
+        with self._lock:
+            return self._changed(table, keys, fingerprints)
+
+    def _changed(self, table, keys, fingerprints):
+        known = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), LOOKUP_BATCH_SIZE):
+            batch = unique_keys[start:start + LOOKUP_BATCH_SIZE]
+            known.update(self._connection.execute(
+                f"SELECT key, fingerprint FROM fingerprints WHERE tbl = ? AND key IN ({','.join('?' * len(batch))})",
+                [table, *batch]))
+        mask = []
+        for key, fingerprint in zip(keys, fingerprints):
+            mask.append(known.get(key) != fingerprint)
+            known[key] = fingerprint
+        self._connection.executemany(
+            'INSERT INTO fingerprints (tbl, key, fingerprint, seen) VALUES (?, ?, ?, ?)'
+            ' ON CONFLICT (tbl, key) DO UPDATE SET fingerprint = excluded.fingerprint, seen = excluded.seen',
+            [(table, key, fingerprint, self.today) for key, fingerprint in known.items()])
+        return mask
+
+    def prune(self, ttl_days: int = FINGERPRINT_TTL_DAYS) -> int:
+        cursor = self._connection.execute('DELETE FROM fingerprints WHERE seen < ?', (self.today - ttl_days,))
+        return cursor.rowcount
+
+    def close(self):
+        pruned = self.prune()
+        self._connection.commit()
+        self._connection.execute('VACUUM')
+        self._connection.close()
+        logging.info("Row fingerprints saved to %s, %d expired entries pruned.", self.path, pruned)
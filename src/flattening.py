@@ -0,0 +1,133 @@
+"""
+Helpers for turning parsed API payloads into tabular data without building
+intermediate DataFrames per record.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+
+class ColumnBuffer:
+    """
+    Accumulates records straight into per-column lists. With a fixed column list,
+    keys outside of it are ignored; without one, columns are added as they first
+    appear. Missing values are filled with None.
+    """
+
+    def __init__(self, columns=None):
+        self._fixed = columns is not None
+        self.columns = list(columns) if self._fixed else []
+        self._data = {col: [] for col in self.columns}
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, record: dict):
+        if not self._fixed:
+            for col in record:
+                if col not in self._data:
+                    self.columns.append(col)
+                    self._data[col] = [None] * self._rows
+        for col in self.columns:
+            self._data[col].append(record.get(col))
+        self._rows += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self._data, columns=self.columns)
+
+
+SALES_RANK_COLUMNS = ['asin', 'marketplaceId', 'rank_type', 'title', 'rank', 'link', 'classificationId',
+                      'websiteDisplayGroup', 'extracted_at']
+
+# salesRanks list key -> rank_type value written to the output
+_RANK_LISTS = (('classificationRanks', 'classification'), ('displayGroupRanks', 'display_group'))
+
+
+def append_sales_ranks(buffer: ColumnBuffer, item: dict, extracted_at: str) -> int:
+    """
+    Append all classification and display group ranks of one catalog item to the buffer.
+    Returns the number of rank records appended.
+    """
+    asin = item.get('asin')
+    appended = 0
+    for sales_rank in item.get('salesRanks') or []:
+        marketplace_id = sales_rank.get('marketplaceId')
+        for list_key, rank_type in _RANK_LISTS:
+            for rank in sales_rank.get(list_key) or []:
+                buffer.append({
+                    **rank,
+                    'asin': asin,
+                    'marketplaceId': marketplace_id,
+                    'rank_type': rank_type,
+                    'extracted_at': extracted_at,
+                })
+                appended += 1
+    return appended
+
+
+@lru_cache(maxsize=4096)
+def to_snake(name: str) -> str:
+    """
+    CamelCase to snake_case, cached because report keys repeat for every record.
+    """
+    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
+    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+
+
+def flatten_json(obj, parent_key: str = '', sep: str = '_') -> dict:
+    """
+    Flatten parsed JSON in a single pass. Nested objects are joined with `sep`,
+    list elements are addressed by their index and all key parts are converted
+    to snake_case, e.g. {"lateShipmentRate": {"rate": 0.1}} -> {"late_shipment_rate_rate": 0.1}.
+    """
+    flat = {}
+    stack = [(parent_key, obj)]
+    while stack:
+        key, value = stack.pop()
+        if isinstance(value, dict):
+            children = [(f"{key}{sep}{to_snake(k)}" if key else to_snake(k), v) for k, v in value.items()]
+        elif isinstance(value, list):
+            children = [(f"{key}{sep}{i}" if key else str(i), v) for i, v in enumerate(value)]
+        else:
+            flat[key] = value
+            continue
+        # Reversed so that keys come out in document order
+        stack.extend(reversed(children))
+    return flat
+
+
+def records_to_frame(records, leading_columns=()) -> pd.DataFrame:
+    """
+    Build one DataFrame from flattened records. Columns are the leading columns
+    followed by the union of all other keys in sorted order, so the output schema
+    does not depend on which record happened to come first.
+    """
+    seen = set()
+    for record in records:
+        seen.update(record)
+    columns = list(leading_columns) + sorted(seen.difference(leading_columns))
+    buffer = ColumnBuffer(columns)
+    for record in records:
+        buffer.append(record)
+    return buffer.to_frame()
+
+
+def flatten_leaves(obj: dict) -> dict:
+    """
+    Flatten nested objects keeping only the snake_cased leaf key names, e.g.
+    {"inventoryDetails": {"fulfillableQuantity": 3}} -> {"fulfillable_quantity": 3}.
+    Lists are kept as values.
+    """
+    flat = {}
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            flat.update(flatten_leaves(value))
+        else:
+            flat[to_snake(key)] = value
+    return flat
@@ -0,0 +1,75 @@
+"""
+Iterative decoding of JSON array documents.
+
+Amazon Ads reports are one JSON array of row objects. iter_json_array reads such a
+document from a binary file in fixed-size chunks and yields one element at a time,
+so only the current chunk and element are held in memory instead of the whole
+decoded document.
+"""
+import codecs
+import json
+
+READ_SIZE = 2 ** 16
+_WHITESPACE = ' \t\n\r'
+# Characters that may follow an array element
+_ELEMENT_END = _WHITESPACE + ',]'
+
+
+def iter_json_array(stream, read_size: int = READ_SIZE):
+    """
+    Yield the elements of the top-level JSON array in the binary file stream.
+    Raises ValueError when the document is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        # Drop the consumed part and append the next chunk; False at the end of the stream
+        nonlocal buffer, position, eof
+        chunk = stream.read(read_size)
+        eof = not chunk
+        buffer = buffer[position:] + text.decode(chunk, final=eof)
+        position = 0
+        return not eof
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    skip_whitespace()
+    if buffer[position:position + 1] != '[':
+        raise ValueError("The document is not a JSON array.")
+    position += 1
+    skip_whitespace()
+    if buffer[position:position + 1] == ']':
+        return
+    while True:
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element continues in the next chunk
+                if not fill():
+                    raise
+                continue
+            # A number cut by the end of the chunk decodes as its prefix, e.g. 1 of 1e-05
+            if not eof and (end == len(buffer) or buffer[end] not in _ELEMENT_END) and fill():
+                continue
+            break
+        position = end
+        yield element
+        skip_whitespace()
+        separator = buffer[position:position + 1]
+        position += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' in the JSON array, found {separator!r}.")
+        skip_whitespace()
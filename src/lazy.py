@@ -0,0 +1,40 @@
+"""
+Deferred imports of heavy dependencies.
+
+Importing pandas (with numpy), httpx or the XML parser takes a large share of the
+startup of a short run, and many configurations never need some of them: an
+inventory-only run does not parse XML, a run without ledger or ads reports does not
+open an asyncio client. Modules bind these dependencies with lazy_import, and the
+import happens when the first attribute is read, i.e. in the first step that uses
+the module.
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    Stands in for the module `name` and imports it on first attribute access.
+    importlib serializes concurrent imports, so threads may race for the first access.
+    Attributes read once are kept on the proxy, so later reads cost what a module
+    attribute costs.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        # Only called for attributes not found on the proxy itself
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        value = getattr(module, attribute)
+        self.__dict__[attribute] = value
+        return value
+
+    def __repr__(self):
+        return f'<lazy module {self._name!r}>'
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
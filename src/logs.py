@@ -0,0 +1,143 @@
+"""
+Structured logging.
+
+Messages take %-style arguments, so they are only formatted when a handler emits
+them. Events repeated in hot loops (catalog batches, report status polls, pages,
+created report segments) are not logged one by one: EventLog counts them by key,
+e.g. by marketplace, and logs a summary per key at most every SUMMARY_INTERVAL
+seconds, plus a final one when a step ends. The single events are logged at DEBUG.
+
+With the JSON format every record is one JSON object; summaries carry the event
+name, the key and the counts as fields.
+"""
+import json
+import logging
+import threading
+import time
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FORMATS = ('text', 'json')
+# Seconds between two summaries of the same event and key
+SUMMARY_INTERVAL = 30.0
+# Libraries logging every request at INFO, e.g. each report status poll of the async client
+QUIET_LOGGERS = ('httpx', 'httpcore')
+
+# Summarized events: message (with the key and the counts as mapping keys) and counted fields
+EVENTS = {
+    'catalog_batches': ("Catalog progress in %(key)s: %(batches)d batches, %(asins)d ASINs, %(without_ranks)d "
+                        "without ranks, %(failed)d failed, %(skipped)d skipped",
+                        ('batches', 'asins', 'without_ranks', 'failed', 'skipped')),
+    'report_polls': ("Report status polls for %(key)s: %(polls)d polls, %(done)d reports done",
+                     ('polls', 'done')),
+    'reports_created': ("Reports created for %(key)s: %(reports)d", ('reports',)),
+    'pages': ("Pages fetched for %(key)s: %(pages)d pages, %(records)d records", ('pages', 'records')),
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger and message, plus the event and
+    fields of structured records.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        event = getattr(record, 'event', None)
+        if event:
+            entry['event'] = event
+            entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(log_format='text', level=logging.INFO):
+    """
+    Configure the root logger. Handlers installed by the Keboola library (or by
+    basicConfig) write JSON lines with log_format 'json'. QUIET_LOGGERS only log
+    warnings and errors.
+    """
+    logging.basicConfig(level=level, format=TEXT_FORMAT)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    if log_format not in LOG_FORMATS:
+        logging.warning("Unknown log format %r, using text; the formats are %s.", log_format, ', '.join(LOG_FORMATS))
+        return
+    if log_format == 'json':
+        formatter = JsonFormatter()
+        for handler in logging.getLogger().handlers:
+            # Only console handlers; test capture and GELF handlers keep their formatting
+            if getattr(handler, '_keboola_owned', False) or type(handler) is logging.StreamHandler:
+                handler.setFormatter(formatter)
+
+
+def log_event(level, event, message, *args, **fields):
+    # A record with an event name and fields for the JSON format; formatted only when emitted
+    logging.log(level, message, *args, extra={'event': event, 'fields': fields})
+
+
+class EventLog:
+    """
+    Counts the events of EVENTS by key and logs rate-limited summaries. Shared by
+    the threads and copies of one run.
+    """
+
+    def __init__(self, interval: float = SUMMARY_INTERVAL, level=logging.INFO, clock=time.monotonic):
+        self.interval = interval
+        self.level = level
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._counts = {}
+        # (event, key) -> time of the last summary, or of the first count
+        self._summarized = {}
+        self._pending = set()
+
+    def count(self, event: str, key: str, **increments):
+        """
+        Add increments to the counts of event for key; logs a summary when the last one
+        is at least `interval` seconds old.
+        """
+        now = self.clock()
+        entry = (event, key)
+        with self._lock:
+            counts = self._counts.get(entry)
+            if counts is None:
+                counts = self._counts[entry] = dict.fromkeys(EVENTS[event][1], 0)
+                self._summarized[entry] = now
+            for field, increment in increments.items():
+                counts[field] += increment
+            due = now - self._summarized[entry] >= self.interval
+            if due:
+                self._summarized[entry] = now
+                self._pending.discard(entry)
+                counts = dict(counts)
+            else:
+                self._pending.add(entry)
+        if due:
+            self._summary(event, key, counts)
+
+    def totals(self, event: str, key: str) -> dict:
+        with self._lock:
+            return dict(self._counts.get((event, key)) or dict.fromkeys(EVENTS[event][1], 0))
+
+    def flush(self):
+        # Summaries of the counts that changed since their last summary, e.g. at the end of a step
+        with self._lock:
+            entries = sorted(self._pending)
+            self._pending.clear()
+            now = self.clock()
+            summaries = []
+            for entry in entries:
+                self._summarized[entry] = now
+                summaries.append((*entry, dict(self._counts[entry])))
+        for event, key, counts in summaries:
+            self._summary(event, key, counts)
+
+    def _summary(self, event, key, counts):
+        if logging.getLogger().isEnabledFor(self.level):
+            log_event(self.level, event, EVENTS[event][0], dict(counts, key=key), key=key, **counts)
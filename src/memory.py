@@ -0,0 +1,149 @@
+"""
+Memory governor: keeps the process within a memory budget by sizing parser
+chunks from the measured width of rows and the remaining headroom, and by
+holding back new downloads while resident memory is close to the budget.
+"""
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+# Share of the remaining headroom a single chunk may occupy. Parsed rows exist
+# several times over while a chunk is built (dicts, DataFrame, CSV buffer).
+CHUNK_HEADROOM_FRACTION = 0.02
+MIN_CHUNK_ROWS = 500
+MAX_CHUNK_ROWS = 50000
+# Rows sampled to estimate the in-memory width of a row
+ROW_SAMPLE_SIZE = 256
+# Default budget when none is configured, as a share of the container limit
+DEFAULT_BUDGET_FRACTION = 0.8
+# Backpressure starts above this share of the budget
+HIGH_WATER_FRACTION = 0.9
+BACKPRESSURE_POLL_INTERVAL = 0.5
+BACKPRESSURE_MAX_WAIT = 60
+
+_CGROUP_LIMIT_FILES = (
+    '/sys/fs/cgroup/memory.max',  # cgroup v2
+    '/sys/fs/cgroup/memory/memory.limit_in_bytes',  # cgroup v1
+)
+
+
+def process_rss_bytes() -> int:
+    """
+    Current resident set size of this process. Falls back to the peak RSS where
+    /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is reported in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def detect_memory_limit() -> int:
+    """
+    Memory available to the container: the cgroup limit if one is set,
+    otherwise the physical memory of the machine.
+    """
+    physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    for path in _CGROUP_LIMIT_FILES:
+        try:
+            with open(path) as limit_file:
+                value = limit_file.read().strip()
+        except OSError:
+            continue
+        # "max" (v2) or a huge number (v1) means no limit
+        if value.isdigit() and int(value) < physical:
+            return int(value)
+    return physical
+
+
+class MemoryGovernor:
+    """
+    Picks rows per chunk for each stream and applies backpressure near the budget.
+    Streams start at their initial chunk size until a chunk has been observed.
+    """
+
+    def __init__(self, budget_bytes: int = None, initial_chunk_rows: dict = None,
+                 min_rows: int = MIN_CHUNK_ROWS, max_rows: int = MAX_CHUNK_ROWS):
+        self.budget_bytes = budget_bytes or int(detect_memory_limit() * DEFAULT_BUDGET_FRACTION)
+        self.initial_chunk_rows = initial_chunk_rows or {}
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self._row_bytes = {}
+        self._lock = threading.Lock()
+        # Set when a wait ran out without memory falling below the high-water mark
+        self._stalled = False
+
+    def headroom(self) -> int:
+        return max(self.budget_bytes - process_rss_bytes(), 0)
+
+    def above_high_water(self) -> bool:
+        return process_rss_bytes() > self.budget_bytes * HIGH_WATER_FRACTION
+
+    def chunk_size(self, stream: str) -> int:
+        """
+        Rows the next chunk of `stream` should hold.
+        """
+        with self._lock:
+            row_bytes = self._row_bytes.get(stream)
+        if not row_bytes:
+            return self.initial_chunk_rows.get(stream, self.min_rows)
+        rows = int(self.headroom() * CHUNK_HEADROOM_FRACTION / row_bytes)
+        return min(max(rows, self.min_rows), self.max_rows)
+
+    def observe(self, stream: str, df) -> None:
+        """
+        Update the row width of `stream` from a parsed chunk.
+        """
+        if df.empty:
+            return
+        sample = df.head(ROW_SAMPLE_SIZE)
+        self._update(stream, sample.memory_usage(index=False, deep=True).sum() / len(sample))
+
+    def observe_records(self, stream: str, records) -> None:
+        """
+        Update the row width of `stream` from a batch of row tuples.
+        """
+        if not records:
+            return
+        sample = records[:ROW_SAMPLE_SIZE]
+        row_bytes = sum(sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in sample) / len(sample)
+        self._update(stream, row_bytes)
+
+    def _update(self, stream, row_bytes):
+        with self._lock:
+            previous = self._row_bytes.get(stream)
+            # Smooth so one unusually wide chunk does not collapse the chunk size
+            self._row_bytes[stream] = row_bytes if previous is None else 0.7 * previous + 0.3 * row_bytes
+
+    def wait_for_headroom(self, max_wait: float = BACKPRESSURE_MAX_WAIT) -> float:
+        """
+        Block while RSS is above the high-water mark, up to max_wait seconds, so
+        concurrent consumers can release memory. When a wait runs out, later calls
+        do not wait again until RSS has been below the mark. Returns the seconds waited.
+        """
+        high_water = self.budget_bytes * HIGH_WATER_FRACTION
+        if process_rss_bytes() <= high_water:
+            self._stalled = False
+            return 0.0
+        if self._stalled:
+            return 0.0
+        start = time.perf_counter()
+        gc.collect()
+        while True:
+            rss = process_rss_bytes()
+            if rss <= high_water:
+                break
+            if time.perf_counter() - start >= max_wait:
+                logging.warning("Memory at %.0f MiB stayed above %.0f MiB of the budget for %d seconds, continuing.",
+                                rss / 2 ** 20, high_water / 2 ** 20, max_wait)
+                self._stalled = True
+                break
+            time.sleep(BACKPRESSURE_POLL_INTERVAL)
+            gc.collect()
+        return time.perf_counter() - start
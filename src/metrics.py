@@ -0,0 +1,182 @@
+"""
+Run-level metrics: stage timings, HTTP calls, rate-limit waits, bytes and rows.
+Collected in memory during the run and written as one JSON document at the end.
+"""
+import json
+import re
+import resource
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+
+# (HTTP method, path regex, operation name); first match wins
+_OPERATIONS = [
+    ('POST', r'/auth/o2/token$', 'refreshToken'),
+    ('POST', r'/reports/2021-06-30/reports$', 'createReport'),
+    ('GET', r'/reports/2021-06-30/reports$', 'getReports'),
+    ('GET', r'/reports/2021-06-30/reports/[^/]+$', 'getReport'),
+    ('GET', r'/reports/2021-06-30/documents/[^/]+$', 'getReportDocument'),
+    ('GET', r'/fba/inventory/v1/summaries$', 'getInventorySummaries'),
+    ('GET', r'/catalog/2022-04-01/items$', 'searchCatalogItems'),
+    ('GET', r'/finances/v0/financialEvents$', 'listFinancialEvents'),
+    ('POST', r'/reporting/reports$', 'adsCreateReport'),
+    ('GET', r'/reporting/reports/[^/]+$', 'adsGetReport'),
+]
+
+
+def operation_for(method: str, url: str) -> str:
+    """
+    Map a request to its API operation name. Anything unknown is treated as a
+    document download from a presigned URL.
+    """
+    method = method.upper()
+    path = urlparse(url).path
+    for op_method, pattern, operation in _OPERATIONS:
+        if op_method == method and re.search(pattern, path):
+            return operation
+    return 'downloadDocument'
+
+
+class RunMetrics:
+    """
+    Thread-safe metrics collector shared by all handlers of one run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.utcnow().isoformat() + 'Z'
+        self._start = time.perf_counter()
+        self.stages = defaultdict(lambda: {'seconds': 0.0, 'marketplaces': defaultdict(float)})
+        self.requests = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'status_codes': defaultdict(int)})
+        self.waits = defaultdict(float)
+        self.retries = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.rows_parsed = defaultdict(int)
+        self.rows_written = defaultdict(int)
+        self.rows_unchanged = defaultdict(int)
+        self.parse_seconds = defaultdict(float)
+        self.report_seconds = defaultdict(lambda: [0, 0.0])
+
+    @contextmanager
+    def stage(self, name: str, marketplace: str = None):
+        """
+        Time a step (or one marketplace within a step) of the run.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if marketplace is None:
+                    self.stages[name]['seconds'] += elapsed
+                else:
+                    self.stages[name]['marketplaces'][marketplace] += elapsed
+
+    def per_marketplace(self, name: str, marketplace_ids):
+        """
+        Iterate over marketplaces, timing the loop body of each one under stage `name`.
+        """
+        for marketplace_id in marketplace_ids:
+            start = time.perf_counter()
+            try:
+                yield marketplace_id
+            finally:
+                with self._lock:
+                    self.stages[name]['marketplaces'][marketplace_id] += time.perf_counter() - start
+
+    def record_request(self, operation: str, status_code, seconds: float):
+        with self._lock:
+            stats = self.requests[operation]
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['status_codes'][str(status_code)] += 1
+
+    def record_wait(self, reason: str, seconds: float):
+        """
+        Time spent sleeping, e.g. 'rate_limit', 'report_polling' or 'retry_backoff'.
+        """
+        with self._lock:
+            self.waits[reason] += seconds
+
+    def record_retry(self, reason: str):
+        """
+        A repeated request, e.g. after 'rate_limit', 'server_error' or 'connection_error',
+        or a 'hedged_download'.
+        """
+        with self._lock:
+            self.retries[reason] += 1
+
+    def record_bytes(self, kind: str, count: int):
+        with self._lock:
+            self.bytes[kind] += count
+
+    def record_rows_parsed(self, stream: str, count: int, seconds: float = 0.0):
+        with self._lock:
+            self.rows_parsed[stream] += count
+            self.parse_seconds[stream] += seconds
+
+    def record_rows_written(self, table: str, count: int):
+        with self._lock:
+            self.rows_written[table] += count
+
+    def record_rows_unchanged(self, table: str, count: int):
+        """
+        Rows dropped from an output table because they were emitted unchanged before.
+        """
+        with self._lock:
+            self.rows_unchanged[table] += count
+
+    def record_report_duration(self, report_type: str, seconds: float):
+        """
+        Time from creating a report until Amazon finished processing it.
+        """
+        with self._lock:
+            stats = self.report_seconds[report_type]
+            stats[0] += 1
+            stats[1] += seconds
+
+    def mean_report_durations(self) -> dict:
+        with self._lock:
+            return {report_type: total / count for report_type, (count, total) in self.report_seconds.items()}
+
+    def to_dict(self) -> dict:
+        wall_time = time.perf_counter() - self._start
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'finished_at': datetime.utcnow().isoformat() + 'Z',
+                'wall_time_seconds': round(wall_time, 3),
+                # ru_maxrss is reported in kilobytes on Linux
+                'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                'stages': {
+                    name: {'seconds': round(stage['seconds'], 3),
+                           'marketplaces': {mp: round(s, 3) for mp, s in stage['marketplaces'].items()}}
+                    for name, stage in self.stages.items()
+                },
+                'requests': {
+                    op: {'count': s['count'], 'seconds': round(s['seconds'], 3),
+                         'status_codes': dict(s['status_codes'])}
+                    for op, s in self.requests.items()
+                },
+                'waits_seconds': {reason: round(s, 3) for reason, s in self.waits.items()},
+                'retries': dict(self.retries),
+                'bytes': dict(self.bytes),
+                'rows_parsed': {
+                    stream: {'rows': rows,
+                             'rows_per_sec': round(rows / self.parse_seconds[stream], 1)
+                             if self.parse_seconds[stream] else None}
+                    for stream, rows in self.rows_parsed.items()
+                },
+                'rows_written': dict(self.rows_written),
+                'rows_unchanged': dict(self.rows_unchanged),
+                'report_seconds': {report_type: {'count': count, 'mean_seconds': round(total / count, 3)}
+                                   for report_type, (count, total) in self.report_seconds.items()},
+            }
+
+    def write(self, path: str):
+        with open(path, 'w') as out:
+            json.dump(self.to_dict(), out, indent=2, sort_keys=True)
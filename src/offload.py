@@ -0,0 +1,110 @@
+"""
+Process pool for the CPU-bound report parsers.
+
+Downloaded documents and API pages are sent to worker processes while the main
+process keeps creating, polling and downloading reports. Every worker has its own
+parsers and memory governor with a share of the memory budget. Chunked tasks do
+not return the parsed document at once: the worker pickles every chunk into a
+spill file as it is parsed, and the main process reads the chunks back one at a
+time, so neither side holds more than a chunk of the document.
+"""
+import io
+import os
+import pickle
+import tempfile
+
+from lazy import lazy_import
+from memory import MemoryGovernor
+from parsers import ReportParsers
+
+futures = lazy_import('concurrent.futures')
+multiprocessing = lazy_import('multiprocessing')
+
+_worker_parsers = None
+
+
+class WorkerParsers(ReportParsers):
+
+    def __init__(self, memory: MemoryGovernor):
+        self.memory = memory
+
+
+def _init_worker(budget_bytes, initial_chunk_rows):
+    global _worker_parsers
+    _worker_parsers = WorkerParsers(MemoryGovernor(budget_bytes, initial_chunk_rows))
+
+
+# Tasks executed in the workers; the chunked ones return generators for _spill
+
+def parse_order_records(content):
+    return _worker_parsers.order_record_batches(content)
+
+
+def parse_return_records(content):
+    return _worker_parsers.return_record_batches(content)
+
+
+def parse_settlement(content):
+    chunks = _worker_parsers.read_tsv_chunks(io.BytesIO(content), 'settlement')
+    return _worker_parsers.transform_settlement_chunks(chunks)
+
+
+def parse_financial_events(page):
+    return _worker_parsers.process_financial_data(page)
+
+
+def _spill(task, *args):
+    # Pickle the chunks of task one after another into a file and return its path
+    with tempfile.NamedTemporaryFile(prefix='parsed_', suffix='.pickle', delete=False) as spill:
+        try:
+            for chunk in task(*args):
+                pickle.dump(chunk, spill, pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            spill.close()
+            os.unlink(spill.name)
+            raise
+    return spill.name
+
+
+class ParsePool:
+    """
+    Runs parsing tasks in `workers` spawned processes.
+    """
+
+    def __init__(self, workers: int, budget_bytes: int, initial_chunk_rows: dict):
+        self.workers = workers
+        # The main process keeps one share of the budget for downloads and writing
+        self._executor = futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(budget_bytes // (workers + 1), initial_chunk_rows),
+        )
+
+    def submit(self, task, *args):
+        return self._executor.submit(task, *args)
+
+    def chunks(self, task, *args):
+        """
+        Start a task returning a generator of chunks now; the returned generator
+        yields them one at a time from the spill file once the task has finished.
+        """
+        future = self.submit(_spill, task, *args)
+        return self._iter_spilled(future)
+
+    @staticmethod
+    def _iter_spilled(future):
+        path = future.result()
+        try:
+            with open(path, 'rb') as spill:
+                while True:
+                    try:
+                        chunk = pickle.load(spill)
+                    except EOFError:
+                        return
+                    yield chunk
+        finally:
+            os.unlink(path)
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
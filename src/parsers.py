@@ -0,0 +1,452 @@
+"""
+Parsers that turn downloaded report documents and API payloads into DataFrames.
+
+They are CPU-bound and independent of the Keboola component interface, so the
+component can run them inline or in worker processes (see offload.py). Chunk
+sizes come from the memory governor in self.memory.
+"""
+import io
+import logging
+import re
+
+from json_stream import iter_json_array
+from lazy import lazy_import
+
+ET = lazy_import('xml.etree.ElementTree')
+gzip = lazy_import('gzip')
+pd = lazy_import('pandas')
+
+# Column order of the rows produced by iter_return_records
+RETURNS_COLUMNS = [
+    'item_name', 'asin', 'return_reason_code', 'merchant_sku', 'in_policy', 'return_quantity', 'resolution',
+    'category', 'refund_amount', 'order_id', 'order_date', 'amazon_rma_id', 'return_request_date',
+    'return_request_status', 'a_to_z_claim', 'is_prime', 'label_cost', 'label_type', 'label_to_be_paid_by',
+    'return_type', 'order_amount', 'order_quantity',
+]
+
+# Column order of the rows produced by iter_order_records: order fields, then item fields
+ORDERS_COLUMNS = [
+    'amazon_order_id', 'merchant_order_id', 'purchase_date', 'last_updated_date', 'order_status', 'sales_channel',
+    'fulfillment_channel', 'ship_service_level', 'address_type', 'ship_city', 'ship_state', 'ship_postal_code',
+    'ship_country', 'is_business_order', 'payment_method_details', 'buyer_tax_registration_country',
+    'buyer_tax_registration_type', 'purchase_order_number', 'is_replacement_order', 'is_exchange_order',
+    'original_order_id', 'is_iba', 'ioss_number',
+    'amazon_order_item_code', 'product_name', 'sku', 'asin', 'item_status', 'quantity', 'number_of_items',
+    'currency', 'item_price', 'item_tax', 'shipping_price', 'shipping_tax', 'gift_wrap_price', 'gift_wrap_tax',
+    'vat_exclusive_item_price', 'vat_exclusive_shipping_price', 'vat_exclusive_giftwrap_price', 'promotion_ids',
+    'item_promotion_discount', 'ship_promotion_discount', 'tax_collection_model',
+    'tax_collection_responsible_party', 'is_heavy_or_bulky', 'is_amazon_invoiced', 'is_transparency',
+    'is_buyer_requested_cancellation', 'buyer_requested_cancel_reason', 'amazon_programs', 'buyer_company_name',
+]
+
+# Columns requested in Ads campaign reports, and the output columns of iter_ads_records: the report columns
+# (renamed), the store and the ad product
+ADS_REPORT_COLUMNS = ['campaignId', 'campaignName', 'date', 'impressions', 'clicks', 'cost']
+ADS_COLUMNS = ['campaign_id', 'campaign_name', 'date', 'impressions', 'clicks', 'cost', 'market', 'adProduct']
+
+
+class ReportParsers:
+    """
+    Mixin with the report parsers. Subclasses provide self.memory (a MemoryGovernor).
+    """
+
+    @staticmethod
+    def camel_to_snake(name: str) -> str:
+        s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
+        return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+
+    @staticmethod
+    def shorten_column(name: str) -> str:
+        token = re.split(r'[._]', name)[-1]
+        return ReportParsers.camel_to_snake(token)
+
+    def read_tsv_chunks(self, byte_stream, stream, **read_options):
+        # Read a tab-separated document in chunks sized by the memory governor
+        with pd.read_csv(byte_stream, delimiter='\t', encoding='utf-8', iterator=True, **read_options) as reader:
+            while True:
+                try:
+                    chunk = reader.get_chunk(self.memory.chunk_size(stream))
+                except StopIteration:
+                    return
+                self.memory.observe(stream, chunk)
+                yield chunk
+
+    def record_batches(self, records, stream):
+        # Group row tuples into lists sized by the memory governor
+        batch = []
+        batch_rows = self.memory.chunk_size(stream)
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_rows:
+                self.memory.observe_records(stream, batch)
+                yield batch
+                batch = []
+                batch_rows = self.memory.chunk_size(stream)
+        if batch:
+            yield batch
+
+    def iter_return_records(self, xml_data):
+        """
+        Parse a returns XML report with a stream parser (iterparse) and yield one
+        tuple per return, in RETURNS_COLUMNS order.
+        """
+        logging.info("Starting XML data parsing.")
+
+        # Iterate over each return_detail element in the XML
+        for _, return_detail in ET.iterparse(io.BytesIO(xml_data), events=('end',)):
+            if return_detail.tag != 'return_details':
+                continue
+            item_detail = return_detail.find('.//item_details')
+            label_cost = return_detail.find('.//label_details/label_cost')
+            label_type = return_detail.find('.//label_details/label_type')
+
+            # Fields from item_details and return_details
+            yield (
+                item_detail.findtext('item_name', ''),
+                item_detail.findtext('asin', ''),
+                item_detail.findtext('return_reason_code', ''),
+                item_detail.findtext('merchant_sku', ''),
+                item_detail.findtext('in_policy', ''),
+                item_detail.findtext('return_quantity', ''),
+                item_detail.findtext('resolution', ''),
+                item_detail.findtext('category', ''),
+                item_detail.findtext('refund_amount', ''),
+                return_detail.findtext('order_id', ''),
+                return_detail.findtext('order_date', ''),
+                return_detail.findtext('amazon_rma_id', ''),
+                return_detail.findtext('return_request_date', ''),
+                return_detail.findtext('return_request_status', ''),
+                return_detail.findtext('a_to_z_claim', ''),
+                return_detail.findtext('is_prime', ''),
+                label_cost.text if label_cost is not None else '',
+                label_type.text if label_type is not None else '',
+                return_detail.findtext('label_to_be_paid_by', ''),
+                return_detail.findtext('return_type', ''),
+                return_detail.findtext('order_amount', ''),
+                return_detail.findtext('order_quantity', ''),
+            )
+            return_detail.clear()
+        logging.info("Completed parsing XML data.")
+
+    def return_record_batches(self, xml_data):
+        return self.record_batches(self.iter_return_records(xml_data), 'returns')
+
+    def parse_xml_data(self, xml_data):
+        """
+        Parse a returns XML report and yield DataFrame chunks sized by the memory governor.
+        """
+        for batch in self.return_record_batches(xml_data):
+            yield pd.DataFrame(batch, columns=RETURNS_COLUMNS)
+
+    @staticmethod
+    def iter_ads_records(document, market, ad_product):
+        """
+        Rows of a GZIP_JSON Ads report document, decompressed and decoded as a stream:
+        one tuple per row, in ADS_COLUMNS order.
+        """
+        with gzip.GzipFile(fileobj=document) as report:
+            for row in iter_json_array(report):
+                yield tuple(row.get(column) for column in ADS_REPORT_COLUMNS) + (market, ad_product)
+
+    def iter_order_records(self, xml_data):
+        """
+        Parse an All Orders XML report with a stream parser (iterparse) and yield
+        one tuple per order item, in ORDERS_COLUMNS order. Quantities are ints and
+        amounts floats.
+        """
+        def get_text_from_node(node, path, default=''):
+            if node is None:
+                return default
+            found_node = node.find(path)
+            return found_node.text.strip() if found_node is not None and found_node.text else default
+
+        def get_price_component(item_price_node, component_type, default=0.0):
+            if item_price_node is None:
+                return default
+            for component in item_price_node.findall('Component'):
+                if get_text_from_node(component, 'Type') == component_type:
+                    amount_node = component.find('Amount')
+                    return float(amount_node.text) if amount_node is not None and amount_node.text else default
+            return default
+
+        try:
+            for event, elem in ET.iterparse(io.BytesIO(xml_data), events=('end',)):
+                if elem.tag != 'Message':
+                    continue
+                order = elem.find('Order')
+                if order is None:
+                    elem.clear()
+                    continue
+
+                fulfillment_data = order.find('FulfillmentData')
+                address = fulfillment_data.find('Address') if fulfillment_data is not None else None
+
+                order_values = (
+                    get_text_from_node(order, 'AmazonOrderID'),
+                    get_text_from_node(order, 'MerchantOrderID'),
+                    get_text_from_node(order, 'PurchaseDate'),
+                    get_text_from_node(order, 'LastUpdatedDate'),
+                    get_text_from_node(order, 'OrderStatus'),
+                    get_text_from_node(order, 'SalesChannel'),
+                    get_text_from_node(fulfillment_data, 'FulfillmentChannel'),
+                    get_text_from_node(fulfillment_data, 'ShipServiceLevel'),
+                    get_text_from_node(address, 'AddressType', default=get_text_from_node(order, 'AddressType')),
+                    get_text_from_node(address, 'City'),
+                    get_text_from_node(address, 'State'),
+                    get_text_from_node(address, 'PostalCode'),
+                    get_text_from_node(address, 'Country'),
+                    get_text_from_node(order, 'IsBusinessOrder'),
+                    get_text_from_node(order, 'PaymentMethodDetails'),
+                    get_text_from_node(order, 'BuyerTaxRegistrationCountry'),
+                    get_text_from_node(order, 'BuyerTaxRegistrationType'),
+                    get_text_from_node(order, 'PurchaseOrderNumber'),
+                    get_text_from_node(order, 'IsReplacementOrder'),
+                    get_text_from_node(order, 'IsExchangeOrder'),
+                    get_text_from_node(order, 'OriginalOrderID'),
+                    get_text_from_node(order, 'IsIba'),
+                    get_text_from_node(order, 'IossNumber'),
+                )
+
+                for item in order.findall('OrderItem'):
+                    item_price_node = item.find('ItemPrice')
+                    promotion_node = item.find('Promotion')
+                    amount_node = item_price_node.find('.//Amount') if item_price_node else None
+                    yield order_values + (
+                        get_text_from_node(item, 'AmazonOrderItemCode'),
+                        get_text_from_node(item, 'ProductName'),
+                        get_text_from_node(item, 'SKU'),
+                        get_text_from_node(item, 'ASIN'),
+                        get_text_from_node(item, 'ItemStatus'),
+                        int(get_text_from_node(item, 'Quantity', '0')),
+                        int(get_text_from_node(item, 'NumberOfItems', '0')),
+                        amount_node.get('currency') if amount_node is not None else '',
+                        get_price_component(item_price_node, 'Principal'),
+                        get_price_component(item_price_node, 'Tax'),
+                        get_price_component(item_price_node, 'Shipping'),
+                        get_price_component(item_price_node, 'ShippingTax'),
+                        get_price_component(item_price_node, 'GiftWrap'),
+                        get_price_component(item_price_node, 'GiftWrapTax'),
+                        get_price_component(item_price_node, 'VatExclusiveItemPrice'),
+                        get_price_component(item_price_node, 'VatExclusiveShippingPrice'),
+                        get_price_component(item_price_node, 'VatExclusiveGiftWrapPrice'),
+                        get_text_from_node(promotion_node, 'PromotionIDs'),
+                        float(get_text_from_node(promotion_node, 'ItemPromotionDiscount', '0.0')),
+                        float(get_text_from_node(promotion_node, 'ShipPromotionDiscount', '0.0')),
+                        get_text_from_node(item, 'TaxCollectionModel'),
+                        get_text_from_node(item, 'TaxCollectionResponsibleParty'),
+                        get_text_from_node(item, 'IsHeavyOrBulky'),
+                        get_text_from_node(item, 'IsAmazonInvoiced'),
+                        get_text_from_node(item, 'IsTransparency'),
+                        get_text_from_node(item, 'IsBuyerRequestedCancellation'),
+                        get_text_from_node(item, 'BuyerRequestedCancel/Reason'),
+                        get_text_from_node(item, './/AmazonProgramName'),
+                        get_text_from_node(item, 'BuyerInfo/BuyerCompanyName'),
+                    )
+
+                elem.clear()
+
+        except ET.ParseError as e:
+            logging.error("Failed to parse XML data: %s", e)
+            return
+
+    def order_record_batches(self, xml_data):
+        return self.record_batches(self.iter_order_records(xml_data), 'orders')
+
+    def parse_all_orders_xml_report(self, xml_data):
+        """
+        Parses XML data from an All Orders report and yields DataFrame chunks sized
+        by the memory governor.
+        """
+        for batch in self.order_record_batches(xml_data):
+            yield pd.DataFrame(batch, columns=ORDERS_COLUMNS)
+
+    def transform_settlement_chunk(self, df, file_meta, split_tracker):
+        """
+        Normalize one settlement report chunk: snake_case columns, file-level values
+        (dates, settlement id, primary marketplace) propagated to every row and
+        split_index assigned to PKs repeated within the file.
+        file_meta and split_tracker carry state across chunks of the same file.
+        """
+        # Rename columns to snake_case.
+        df.rename(columns=lambda x: self.shorten_column(x).replace('-', '_'), inplace=True)
+
+        # Extract file-level data from the first valid rows we see, then apply it to the chunk.
+        # Dates and the settlement id are only on the summary row; the primary marketplace is the most frequent one
+        for col in ('settlement_start_date', 'settlement_end_date', 'settlement_id', 'marketplace_name'):
+            if col in df.columns and file_meta.get(col) is None:
+                valid_values = self.non_blank(df[col])
+                if not valid_values.empty:
+                    file_meta[col] = valid_values.mode()[0] if col == 'marketplace_name' else valid_values.iloc[0]
+
+        for col in ('settlement_start_date', 'settlement_end_date', 'settlement_id'):
+            if col in df.columns and file_meta.get(col):
+                df[col] = file_meta[col]
+
+        if 'marketplace_name' in df.columns:
+            names = df['marketplace_name']
+            blank = names.isna() | (names.astype(str).str.strip() == '')
+            df['marketplace_name'] = names.mask(blank, file_meta.get('marketplace_name') or 'Unallocated')
+
+        # Identify split records by assigning an incrementing split_index (0, 1, 2...) to duplicate PKs across chunks.
+        base_pk_cols = ['settlement_id', 'order_id', 'sku', 'amount_type', 'amount_description', 'transaction_type']
+        if all(col in df.columns for col in base_pk_cols):
+            split_indices = []
+            for pk_tuple in df[base_pk_cols].fillna('').itertuples(index=False, name=None):
+                current_count = split_tracker.get(pk_tuple, 0)
+                split_indices.append(current_count)
+                split_tracker[pk_tuple] = current_count + 1
+            df['split_index'] = split_indices
+        else:
+            df['split_index'] = 0
+
+        return df
+
+    @staticmethod
+    def non_blank(values):
+        # Values that are neither missing nor whitespace only
+        values = values.dropna()
+        if values.dtype == object or pd.api.types.is_string_dtype(values):
+            values = values[values.astype(str).str.strip() != '']
+        return values
+
+    def transform_settlement_chunks(self, chunks):
+        # Transform the chunks of one settlement report file in order
+        file_meta = {}
+        split_tracker = {}
+        for df in chunks:
+            if not df.empty:
+                yield self.transform_settlement_chunk(df, file_meta, split_tracker)
+
+    def process_financial_data(self, data):
+        # Process raw financial data into structured DataFrame
+        logging.info("Starting to process financial data.")
+        if not data or 'payload' not in data or 'FinancialEvents' not in data['payload']:
+            logging.error("No data or incorrect data structure received.")
+            # Return an empty DataFrame to handle this scenario gracefully.
+            return pd.DataFrame()
+
+        # Base columns for financial data DataFrame
+        columns = [
+            'amazon_order_id', 'marketplace_name', 'posted_date', 'seller_sku', 'order_item_id',
+            'quantity_shipped'
+        ]
+        charge_types = set()
+        fee_types = set()
+        promotion_ids = set()
+
+        # Collect all types of charges, fees, and promotions for shipments
+        for event in data['payload']['FinancialEvents']['ShipmentEventList']:
+            for item in event.get('ShipmentItemList', []):
+                for charge in item.get('ItemChargeList', []):
+                    charge_types.add(self.camel_to_snake(charge.get('ChargeType', '')))
+                for fee in item['ItemFeeList']:
+                    fee_types.add(self.camel_to_snake(fee.get('FeeType', '')))
+                # if 'PromotionList' in item:
+                #     for promo in item['PromotionList']:
+                #         promotion_ids.add((self.camel_to_snake(promo['PromotionType']), promo['PromotionId']))
+
+        # Collect all types of charges, fees, and promotions for refunds
+        for event in data['payload']['FinancialEvents']['RefundEventList']:
+            for item in event['ShipmentItemAdjustmentList']:
+                for charge in item.get('ItemChargeAdjustmentList', []):
+                    charge_types.add(self.camel_to_snake(charge.get('ChargeType', '')))
+                for fee in item.get('ItemFeeAdjustmentList', []):
+                    fee_types.add(self.camel_to_snake(fee.get('FeeType', '')))
+
+        # Define all possible charge and fee types that Amazon API can return
+        # This ensures consistent schema even when some types are missing from current data
+        # Based on the complete list from Keboola error message
+        all_possible_charge_types = [
+            'gift_wrap', 'shipping_charge', 'shipping_tax', 'principal', 'tax',
+            'gift_wrap_tax', 'giftwrap_commission', 'renewed_program_fee',
+            'shipping_hb', 'variable_closing_fee', 'fixed_closing_fee',
+            'commission', 'refund_commission', 'return_shipping', 'goodwill',
+            'digital_services_fee', 'giftwrap_chargeback', 'shipping_chargeback',
+            'fba_per_unit_fulfillment_fee', 'generic_deduction', 'digital_services_fee_fba'
+        ]
+
+        # Add all possible charge and fee types to ensure consistent schema. The known types keep
+        # their order and the others follow sorted, so every worker process builds the same columns
+        all_charge_fee_types = dict.fromkeys(all_possible_charge_types)
+        all_charge_fee_types.update(dict.fromkeys(sorted(charge_types.union(fee_types) - all_charge_fee_types.keys())))
+
+        # Adding columns for each type of charge and fee
+        for charge_type in all_charge_fee_types:
+            columns.append(f"{charge_type}_amount")
+            columns.append(f"{charge_type}_currency")
+        for promo_type, promo_id in promotion_ids:
+            columns.append(f"{promo_type}_amount")
+            columns.append(f"{promo_type}_currency")
+            columns.append(f"{promo_type}_id")
+
+        all_rows = []
+
+        # Populate DataFrame with shipment data
+        for event in data['payload']['FinancialEvents']['ShipmentEventList']:
+            for item in event['ShipmentItemList']:
+                # Initialize row: 0 for _amount columns, '' for others
+                row = {col: (0 if col.endswith('_amount') else '') for col in columns}
+                row.update({
+                    'amazon_order_id': event.get('AmazonOrderId', ''),
+                    'marketplace_name': event.get('MarketplaceName', ''),
+                    'posted_date': event.get('PostedDate', ''),
+                    'seller_sku': item.get('SellerSKU', ''),
+                    'order_item_id': item.get('OrderItemId', ''),
+                    'quantity_shipped': item.get('QuantityShipped', 0)
+                })
+                for charge in item.get('ItemChargeList', []):
+                    charge_type_snake = self.camel_to_snake(charge.get('ChargeType', ''))
+                    charge_amount_dict = charge.get('ChargeAmount', {})
+                    if charge_type_snake and charge_amount_dict:
+                        row[f"{charge_type_snake}_amount"] = charge_amount_dict.get('CurrencyAmount')
+                        row[f"{charge_type_snake}_currency"] = charge_amount_dict.get('CurrencyCode')
+
+                for fee in item.get('ItemFeeList', []):
+                    fee_type_snake = self.camel_to_snake(fee.get('FeeType', ''))
+                    fee_amount_dict = fee.get('FeeAmount', {})
+                    if fee_type_snake and fee_amount_dict:
+                        row[f"{fee_type_snake}_amount"] = fee_amount_dict.get('CurrencyAmount')
+                        row[f"{fee_type_snake}_currency"] = fee_amount_dict.get('CurrencyCode')
+
+                # if 'PromotionList' in item:
+                #     for promo in item['PromotionList']:
+                #         promo_type_snake = self.camel_to_snake(promo['PromotionType'])
+                #         promo_type_id = f"{promo_type_snake}_id"
+                #         promo_type_amount = f"{promo_type_snake}_amount"
+                #         promo_type_currency = f"{promo_type_snake}_currency"
+                #         row[promo_type_id] = promo['PromotionId']
+                #         row[promo_type_amount] = promo['PromotionAmount']['CurrencyAmount']
+                #         row[promo_type_currency] = promo['PromotionAmount']['CurrencyCode']
+
+                all_rows.append(row)  # Append each item as a row to the list
+
+        # Populate DataFrame with refund data
+        for event in data['payload']['FinancialEvents']['RefundEventList']:
+            for item in event['ShipmentItemAdjustmentList']:
+                # Initialize row: 0 for _amount columns, '' for others
+                row = {col: (0 if col.endswith('_amount') else '') for col in columns}
+                row.update({
+                    'amazon_order_id': event.get('AmazonOrderId', ''),
+                    'marketplace_name': event.get('MarketplaceName', ''),
+                    'posted_date': event.get('PostedDate', ''),
+                    'seller_sku': item.get('SellerSKU', ''),
+                    'order_item_id': item.get('OrderAdjustmentItemId', ''),
+                    'quantity_shipped': item.get('QuantityShipped', 0)
+                })
+                for charge in item.get('ItemChargeAdjustmentList', []):
+                    charge_type_snake = self.camel_to_snake(charge.get('ChargeType', ''))
+                    charge_amount_dict = charge.get('ChargeAmount', {})
+                    if charge_type_snake and charge_amount_dict:
+                        row[f"{charge_type_snake}_amount"] = charge_amount_dict.get('CurrencyAmount')
+                        row[f"{charge_type_snake}_currency"] = charge_amount_dict.get('CurrencyCode')
+
+                for fee in item.get('ItemFeeAdjustmentList', []):
+                    fee_type_snake = self.camel_to_snake(fee.get('FeeType', ''))
+                    fee_amount_dict = fee.get('FeeAmount', {})
+                    if fee_type_snake and fee_amount_dict:
+                        row[f"{fee_type_snake}_amount"] = fee_amount_dict.get('CurrencyAmount')
+                        row[f"{fee_type_snake}_currency"] = fee_amount_dict.get('CurrencyCode')
+
+                all_rows.append(row)  # Append each item as a row to the list
+
+        return pd.DataFrame(all_rows, columns=columns)
@@ -0,0 +1,136 @@
+"""
+Request budget planning.
+
+A plan lists the API operations a run would perform, step by step, without calling
+the API: report segments are counted the way the handlers split the date range (with
+the densities learned in the state), pages of paged operations come from the page
+counts of previous runs, and status polls from the report durations observed in
+previous runs. The estimate applies the usage plans of OPERATION_RATE_LIMITS to the
+calls of every extraction and adds the time Amazon takes to process the reports.
+"""
+import math
+from collections import defaultdict
+
+from throttling import OPERATION_RATE_LIMITS
+
+STATE_REPORT_DURATIONS = 'report_durations'  # report type -> seconds from creation to DONE
+STATE_PAGE_COUNTS = 'page_counts'  # pages of the paged operations in the last run
+# Weight of the previous runs' duration when storing the duration of this run
+DURATION_HISTORY_WEIGHT = 0.5
+# Processing time assumed for report types without a recorded duration
+DEFAULT_REPORT_SECONDS = 120
+DEFAULT_ADS_REPORT_SECONDS = 300
+# Amazon closes a settlement period every two weeks
+SETTLEMENT_PERIOD_DAYS = 14
+
+
+def remember_report_durations(state: dict, durations: dict):
+    """
+    Fold the mean durations of this run, {report type: seconds}, into the state.
+    """
+    history = state.setdefault(STATE_REPORT_DURATIONS, {})
+    for report_type, seconds in durations.items():
+        previous = history.get(report_type)
+        if previous is not None:
+            seconds = DURATION_HISTORY_WEIGHT * previous + (1 - DURATION_HISTORY_WEIGHT) * seconds
+        history[report_type] = round(seconds, 1)
+
+
+def throttled_seconds(operation: str, calls: int) -> float:
+    """
+    Time the usage plan of operation needs for calls made at once: the burst is
+    available immediately, the rest at the restore rate.
+    """
+    if operation not in OPERATION_RATE_LIMITS:
+        return 0.0
+    rate, burst = OPERATION_RATE_LIMITS[operation]
+    return max(0, calls - burst) / rate
+
+
+class RequestPlan:
+    """
+    API operations of one extraction (one region of one account) by step. Steps run
+    one after another; the reports of a concurrent step are processed at the same
+    time, those of other steps one after another.
+    """
+
+    def __init__(self, report_durations: dict, report_poll_interval: float, ads_poll_interval: float):
+        self.report_durations = report_durations
+        self.report_poll_interval = report_poll_interval
+        self.ads_poll_interval = ads_poll_interval
+        self.steps = {}
+
+    def _step(self, step, concurrent=False):
+        return self.steps.setdefault(step, {'calls': defaultdict(int), 'waits': [], 'concurrent': concurrent})
+
+    def calls(self, step: str, operation: str, count: int = 1):
+        self._step(step)['calls'][operation] += count
+
+    def wait(self, step: str, seconds: float):
+        # Pacing between calls of a step
+        self._step(step)['waits'].append(seconds)
+
+    def reports(self, step: str, report_type: str, count: int, concurrent: bool = False):
+        """
+        count SP-API reports of report_type: create, status polls until DONE, document and download.
+        """
+        seconds = self.report_durations.get(report_type, DEFAULT_REPORT_SECONDS)
+        entry = self._step(step, concurrent)
+        entry['calls']['createReport'] += count
+        entry['calls']['getReport'] += count * (math.floor(seconds / self.report_poll_interval) + 1)
+        entry['calls']['getReportDocument'] += count
+        entry['calls']['downloadDocument'] += count
+        entry['waits'].extend([seconds] * count)
+
+    def ads_reports(self, step: str, ad_product: str, count: int):
+        # Ads reports of all stores and products run concurrently
+        seconds = self.report_durations.get(ad_product, DEFAULT_ADS_REPORT_SECONDS)
+        entry = self._step(step, concurrent=True)
+        entry['calls']['adsCreateReport'] += count
+        entry['calls']['adsGetReport'] += count * (math.floor(seconds / self.ads_poll_interval) + 1)
+        entry['calls']['downloadDocument'] += count
+        entry['waits'].extend([seconds] * count)
+
+    def estimate(self) -> dict:
+        """
+        Calls, rate-limit usage and estimated seconds by step and for the extraction.
+        A step takes as long as its slowest usage plan or its report processing,
+        whichever is longer.
+        """
+        steps = {}
+        totals = defaultdict(int)
+        for name, entry in self.steps.items():
+            waiting = max(entry['waits'], default=0) if entry['concurrent'] else sum(entry['waits'])
+            throttled = max((throttled_seconds(op, n) for op, n in entry['calls'].items()), default=0)
+            steps[name] = {'calls': dict(entry['calls']), 'seconds': round(max(waiting, throttled), 1)}
+            for operation, count in entry['calls'].items():
+                totals[operation] += count
+        quota = {}
+        for operation, count in totals.items():
+            if operation in OPERATION_RATE_LIMITS:
+                rate, burst = OPERATION_RATE_LIMITS[operation]
+                quota[operation] = {'calls': count, 'rate_per_second': rate, 'burst': burst,
+                                    'throttled_seconds': round(throttled_seconds(operation, count), 1)}
+        # Usage plans restore while other steps run, so the run is at least as long as the busiest plan
+        seconds = max([sum(step['seconds'] for step in steps.values())]
+                      + [usage['throttled_seconds'] for usage in quota.values()])
+        return {'steps': steps, 'calls': dict(totals), 'quota': quota, 'seconds': round(seconds, 1)}
+
+
+def combine_estimates(estimates, workers: int) -> dict:
+    """
+    Estimate of a run whose extractions, given as (label, estimate) pairs, run on
+    `workers` threads: the longest extractions are spread over the workers.
+    """
+    totals = defaultdict(int)
+    for _, estimate in estimates:
+        for operation, count in estimate['calls'].items():
+            totals[operation] += count
+    lanes = [0.0] * max(1, min(workers, len(estimates)))
+    for seconds in sorted((estimate['seconds'] for _, estimate in estimates), reverse=True):
+        lanes[lanes.index(min(lanes))] += seconds
+    return {
+        'calls': dict(totals),
+        'estimated_wall_seconds': round(max(lanes), 1),
+        'extractions': [dict(estimate, extraction=label) for label, estimate in estimates],
+    }
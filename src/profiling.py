@@ -0,0 +1,107 @@
+"""
+Opt-in profiling of individual extraction steps.
+
+Each profiled step writes into the output folder:
+  - profile_<step>.pstats: cProfile dump of the calling thread (open with pstats or snakeviz)
+  - profile_<step>_allocations.txt: top-N allocation sites by size (tracemalloc)
+  - profile_<step>_wallclock.txt: optional wall-clock samples of all threads in collapsed-stack
+    format ("frame;frame;frame count"), usable with flamegraph tools. Unlike cProfile this
+    shows where time is spent waiting, e.g. in report polling.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+
+class WallClockSampler(threading.Thread):
+    """
+    Samples the stacks of all other threads every `interval` seconds.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StepProfiler:
+    """
+    Wraps steps in cProfile and tracemalloc (and optionally a wall-clock sampler)
+    and writes one set of reports per step to out_dir.
+    """
+
+    def __init__(self, out_dir: str, top_n: int = 30, wall_clock_interval: float = 0.0):
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self.wall_clock_interval = wall_clock_interval
+        self.written_files = []
+
+    @contextmanager
+    def profile(self, step: str):
+        profiler = cProfile.Profile()
+        sampler = WallClockSampler(self.wall_clock_interval) if self.wall_clock_interval > 0 else None
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if sampler:
+            sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if sampler:
+                sampler.stop()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._write(step, profiler, snapshot, peak, sampler)
+
+    def _path(self, file_name: str) -> str:
+        path = os.path.join(self.out_dir, file_name)
+        self.written_files.append(file_name)
+        return path
+
+    def _write(self, step, profiler, snapshot, peak, sampler):
+        os.makedirs(self.out_dir, exist_ok=True)
+        profiler.dump_stats(self._path(f'profile_{step}.pstats'))
+
+        # Leave out allocations of the profiling machinery itself
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                           tracemalloc.Filter(False, __file__)])
+        with open(self._path(f'profile_{step}_allocations.txt'), 'w') as out:
+            out.write(f"Peak traced memory: {peak} bytes\n")
+            out.write(f"Top {self.top_n} allocation sites still alive at the end of step '{step}':\n")
+            for stat in snapshot.statistics('lineno')[:self.top_n]:
+                out.write(f"{stat}\n")
+
+        if sampler:
+            with open(self._path(f'profile_{step}_wallclock.txt'), 'w') as out:
+                for stack, count in sampler.samples.most_common():
+                    out.write(f"{stack} {count}\n")
+
+        logging.info("Profile of step '%s' written to %s", step, self.out_dir)
@@ -0,0 +1,79 @@
+"""
+Selling Partner API and Amazon Ads API regions.
+
+SP-API and Ads API serve each marketplace from one of three regional hosts (North
+America, Europe, Far East), and sellers authorize the application per region. The
+component groups the configured marketplaces (and ads stores) by region and
+extracts every region with its own hosts, tokens and rate-limit buckets.
+"""
+import logging
+from collections import namedtuple
+
+Region = namedtuple('Region', ['name', 'sp_api_base_url', 'ads_api_base_url'])
+
+REGIONS = {
+    'NA': Region('NA', 'https://sellingpartnerapi-na.amazon.com', 'https://advertising-api.amazon.com'),
+    'EU': Region('EU', 'https://sellingpartnerapi-eu.amazon.com', 'https://advertising-api-eu.amazon.com'),
+    'FE': Region('FE', 'https://sellingpartnerapi-fe.amazon.com', 'https://advertising-api-fe.amazon.com'),
+}
+# Marketplaces without a known or configured region; the component used to call only the EU hosts
+DEFAULT_REGION = 'EU'
+
+MARKETPLACE_REGIONS = {
+    # North America
+    'A2EUQ1WTGCTBG2': 'NA',  # Canada
+    'ATVPDKIKX0DER': 'NA',  # United States
+    'A1AM78C64UM0Y8': 'NA',  # Mexico
+    'A2Q3Y263D00KWC': 'NA',  # Brazil
+    # Europe
+    'A28R8C7NBKEWEA': 'EU',  # Ireland
+    'A1RKKUPIHCS9HS': 'EU',  # Spain
+    'A1F83G8C2ARO7P': 'EU',  # United Kingdom
+    'A13V1IB3VIYZZH': 'EU',  # France
+    'AMEN7PMS3EDWL': 'EU',  # Belgium
+    'A1805IZSGTT6HS': 'EU',  # Netherlands
+    'A1PA6795UKMFR9': 'EU',  # Germany
+    'APJ6JRA9NG5V4': 'EU',  # Italy
+    'A2NODRKZP88ZB9': 'EU',  # Sweden
+    'AE08WJ6YKNBMC': 'EU',  # South Africa
+    'A1C3SOZRARQ6R3': 'EU',  # Poland
+    'ARBP9OOSHTCHU': 'EU',  # Egypt
+    'A33AVAJ2PDY3EV': 'EU',  # Turkey
+    'A17E79C6D8DWNP': 'EU',  # Saudi Arabia
+    'A2VIGQ35RCS4UG': 'EU',  # United Arab Emirates
+    'A21TJRUUN4KGV': 'EU',  # India
+    # Far East
+    'A19VAU5U5O7RUS': 'FE',  # Singapore
+    'A39IBJ37TRP1C6': 'FE',  # Australia
+    'A1VC38T7YXB528': 'FE',  # Japan
+}
+
+
+def region_of(marketplace_cfg: dict) -> str:
+    """
+    Region of a configured marketplace: its 'region' key, else the known region of its id.
+    """
+    region = marketplace_cfg.get('region') or MARKETPLACE_REGIONS.get(marketplace_cfg.get('marketplace_id'))
+    if region is None:
+        logging.warning("Unknown region of marketplace %s, using %s.", marketplace_cfg.get('marketplace_id'),
+                        DEFAULT_REGION)
+        return DEFAULT_REGION
+    if region not in REGIONS:
+        raise ValueError(f"Unknown region '{region}', expected one of {', '.join(REGIONS)}.")
+    return region
+
+
+def group_by_region(marketplaces_cfg, stores):
+    """
+    {region: (marketplaces, stores)} of the regions with at least one marketplace or store,
+    in REGIONS order. Stores are Ads profiles and carry their region explicitly.
+    """
+    groups = {}
+    for marketplace_cfg in marketplaces_cfg:
+        groups.setdefault(region_of(marketplace_cfg), ([], []))[0].append(marketplace_cfg)
+    for store in stores:
+        region = store.get('region', DEFAULT_REGION)
+        if region not in REGIONS:
+            raise ValueError(f"Unknown region '{region}' of store {store.get('name')}.")
+        groups.setdefault(region, ([], []))[1].append(store)
+    return {name: groups[name] for name in REGIONS if name in groups}
@@ -0,0 +1,170 @@
+"""
+Request deadlines, retry policy and hedging shared by the blocking and the asyncio
+transport.
+
+- Every operation has a (connect, read) timeout, so a stalled connection fails
+  instead of hanging the run.
+- 429 responses are retried with exponential backoff, as before.
+- 5xx responses and broken connections (resets, timeouts) are retried with
+  full-jitter exponential backoff. A POST, which may have reached the server, is
+  retried only when the connection was never established (refused or timed out
+  while connecting), never after a 5xx: Amazon may have accepted a createReport
+  before failing, and a second report would spend the scarce createReport quota.
+- Document downloads can be hedged: when a download runs longer than the p95 of
+  recent downloads, a second identical request is sent and the first good
+  response wins.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# (connect, read) timeouts in seconds; the read timeout applies to each read from the socket
+DEFAULT_TIMEOUT = (10, 60)
+OPERATION_TIMEOUTS = {
+    'refreshToken': (10, 30),
+    'getReport': (10, 30),
+    'getReportDocument': (10, 30),
+    'downloadDocument': (10, 120),
+    'listFinancialEvents': (10, 120),
+}
+
+RATE_LIMIT_RETRIES = 7
+SERVER_ERROR_RETRIES = 4
+SERVER_ERROR_STATUS_CODES = {500, 502, 503, 504}
+SERVER_ERROR_BACKOFF_BASE = 1.0
+SERVER_ERROR_BACKOFF_CAP = 30.0
+
+# Hedging starts once this many download latencies have been seen
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+HEDGE_PERCENTILE = 0.95
+LATENCY_WINDOW = 200
+
+
+def timeout_for(operation: str):
+    return OPERATION_TIMEOUTS.get(operation, DEFAULT_TIMEOUT)
+
+
+def succeeded(response) -> bool:
+    return response is not None and response.status_code < 400
+
+
+class RetryPolicy:
+    """
+    Retry decisions for one request. backoff() is called after every attempt and
+    returns the seconds to wait before the next one, or None when the outcome is
+    final. `reason` names the last retry for logs and metrics.
+    """
+
+    def __init__(self, method: str):
+        self.idempotent = method.upper() == 'GET'
+        self.rate_limit_retries = 0
+        self.failure_retries = 0
+        self.reason = None
+
+    def backoff(self, status_code=None, connect_failed=False):
+        """
+        status_code is None when the request failed without a response; connect_failed
+        tells whether it failed before anything was sent.
+        """
+        if status_code == 429:
+            if self.rate_limit_retries >= RATE_LIMIT_RETRIES:
+                return None
+            wait_time = (2 ** (self.rate_limit_retries + 2)) + random.uniform(0, 1)
+            self.rate_limit_retries += 1
+            self.reason = 'rate_limit'
+            return wait_time
+        if status_code is None:
+            if not (self.idempotent or connect_failed):
+                return None
+            self.reason = 'connection_error'
+        elif status_code in SERVER_ERROR_STATUS_CODES:
+            if not self.idempotent:
+                return None
+            self.reason = 'server_error'
+        else:
+            return None
+        if self.failure_retries >= SERVER_ERROR_RETRIES:
+            return None
+        wait_time = random.uniform(0, min(SERVER_ERROR_BACKOFF_CAP,
+                                          SERVER_ERROR_BACKOFF_BASE * 2 ** self.failure_retries))
+        self.failure_retries += 1
+        return wait_time
+
+
+class LatencyTracker:
+    """
+    Sliding window of request latencies; hedge_delay() is their p95 once enough
+    samples were seen.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return max(ordered[int(HEDGE_PERCENTILE * (len(ordered) - 1))], HEDGE_MIN_DELAY)
+
+
+def hedged_call(executor, call, tracker: LatencyTracker, on_hedge=None):
+    """
+    Run call() in executor. When it has not finished after the tracker's hedge delay,
+    start a second call() and return the first good response (or the last result).
+    The slower call keeps running in the executor; its result is dropped.
+    """
+    start = time.perf_counter()
+    delay = tracker.hedge_delay()
+    futures = [executor.submit(call)]
+    if delay is not None and not wait(futures, timeout=delay).done:
+        if on_hedge:
+            on_hedge()
+        futures.append(executor.submit(call))
+    pending = set(futures)
+    result = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if succeeded(result):
+                tracker.record(time.perf_counter() - start)
+                return result
+    return result
+
+
+async def hedged_request(make_request, tracker: LatencyTracker, on_hedge=None):
+    """
+    Asyncio version of hedged_call: make_request() returns a new request coroutine,
+    the slower request is cancelled.
+    """
+    start = time.perf_counter()
+    delay = tracker.hedge_delay()
+    tasks = [asyncio.ensure_future(make_request())]
+    if delay is not None and not (await asyncio.wait(tasks, timeout=delay))[0]:
+        if on_hedge:
+            on_hedge()
+        tasks.append(asyncio.ensure_future(make_request()))
+    pending = set(tasks)
+    result = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if succeeded(result):
+                    tracker.record(time.perf_counter() - start)
+                    return result
+        return result
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,136 @@
+"""
+Adaptive date-range segmentation for SP-API reports.
+
+Segments are sized from the row density (rows per day) observed for a report type
+in a marketplace: busy marketplaces get short segments, quiet ones get long
+segments up to the maximum window of the report. A segment whose report ends
+FATAL is split in halves and retried, and later segments stay below the size that
+failed. Density and the failure cap are kept in the state file for the next run.
+"""
+import logging
+from datetime import timedelta
+
+from dates import RunClock
+
+# Rows one report should return; segment length is target / density
+TARGET_ROWS_PER_REPORT = 50000
+MIN_SEGMENT_DAYS = 0.25
+# FATAL segments are not split below this length
+MIN_SPLIT_HOURS = 1
+# Weight of the previous runs' density when storing the density of this run
+DENSITY_HISTORY_WEIGHT = 0.5
+# A segment cap learned from failures grows by this factor with every run without failures
+FAILURE_CAP_GROWTH = 1.5
+
+
+class AdaptiveSegments:
+    """
+    Iterates (start_date, end_date) segments covering the last total_days, newest
+    first and with start_date later than end_date like split_date_range.
+
+    After each segment the caller reports the outcome with record_rows(rows), or
+    split() when the report failed, and finally calls save() to update
+    density_state, the dict kept in the state file.
+    """
+
+    def __init__(self, density_state: dict, report_type: str, marketplace_id: str, total_days: int,
+                 default_days: int, max_days: int = None, target_rows: int = TARGET_ROWS_PER_REPORT,
+                 clock: RunClock = None):
+        self.density_state = density_state
+        self.report_type = report_type
+        self.marketplace_id = marketplace_id
+        self.total_days = total_days
+        self.default_days = default_days
+        self.max_days = max_days or default_days
+        self.target_rows = target_rows
+        self.clock = clock or RunClock()
+        self.now = self.clock.report_end
+        learned = density_state.get(report_type, {}).get(marketplace_id, {})
+        self.learned_density = learned.get('rows_per_day')
+        self.learned_cap = learned.get('max_segment_days')
+        # Longest segment allowed in this run; lowered whenever a report fails
+        self.cap_days = self.max_days if self.learned_cap is None else min(self.learned_cap, self.max_days)
+        self._failed = False
+        self._rows = 0
+        self._days = 0.0
+        self._pending = []
+        self._current = None
+
+    def density(self):
+        """
+        Rows per day: observed in this run if any segment completed, otherwise learned
+        in previous runs. None when nothing is known yet.
+        """
+        if self._days > 0:
+            return self._rows / self._days
+        return self.learned_density
+
+    def segment_days(self) -> float:
+        density = self.density()
+        if density is None:
+            days = self.default_days
+        elif density == 0:
+            days = self.max_days
+        else:
+            days = max(self.target_rows / density, MIN_SEGMENT_DAYS)
+        return min(days, self.cap_days)
+
+    def __iter__(self):
+        oldest = self.now - timedelta(days=self.total_days)
+        cursor = self.now
+        while self._pending or cursor > oldest:
+            if self._pending:
+                segment = self._pending.pop()
+            else:
+                end_date = max(cursor - timedelta(days=self.segment_days()), oldest)
+                segment = (cursor, end_date)
+                cursor = end_date
+            self._current = segment
+            yield segment
+
+    def record_rows(self, rows: int, segment=None):
+        """
+        Record the rows returned for `segment`, by default the segment yielded last.
+        """
+        start_date, end_date = segment or self._current
+        self._rows += rows
+        self._days += (start_date - end_date).total_seconds() / 86400
+
+    def split(self) -> bool:
+        """
+        Queue both halves of the current segment instead of it. Returns False when
+        the segment is already too short to split.
+        """
+        start_date, end_date = self._current
+        span = start_date - end_date
+        if span <= timedelta(hours=MIN_SPLIT_HOURS):
+            logging.error("%s report for %s from %s to %s failed and cannot be split further.",
+                          self.report_type, self.marketplace_id, end_date, start_date)
+            return False
+        middle = start_date - span / 2
+        # Popped from the end: the newer half first
+        self._pending.append((middle, end_date))
+        self._pending.append((start_date, middle))
+        self.cap_days = min(self.cap_days, span.total_seconds() / 86400 / 2)
+        self._failed = True
+        logging.warning("%s report for %s from %s to %s failed, retrying in two halves.",
+                        self.report_type, self.marketplace_id, end_date, start_date)
+        return True
+
+    def save(self):
+        learned = {}
+        if self._days > 0:
+            density = self._rows / self._days
+            if self.learned_density is not None:
+                density = DENSITY_HISTORY_WEIGHT * self.learned_density + (1 - DENSITY_HISTORY_WEIGHT) * density
+            learned['rows_per_day'] = round(density, 2)
+        elif self.learned_density is not None:
+            learned['rows_per_day'] = self.learned_density
+        if self._failed:
+            learned['max_segment_days'] = round(self.cap_days, 4)
+        elif self.learned_cap is not None and self.learned_cap * FAILURE_CAP_GROWTH < self.max_days:
+            learned['max_segment_days'] = round(self.learned_cap * FAILURE_CAP_GROWTH, 4)
+        if not learned:
+            return
+        learned['updated_at'] = self.clock.timestamp
+        self.density_state.setdefault(self.report_type, {})[self.marketplace_id] = learned
@@ -0,0 +1,160 @@
+"""
+Shardable run plans.
+
+A run plan lists the work of a run as items (account, region, step, target); the
+target is a marketplace, an ads store, or None for steps that cover all marketplaces
+of a region at once. The plan depends only on the configuration, so every shard of a
+sharded run builds the same plan and takes the items whose position modulo the shard
+count is its shard index. Date segments stay inside an item: their boundaries are
+derived from the time a shard runs and from the density it learned, so they are not
+the same in every shard.
+
+A shard writes its tables as files named shard-<index>-of-<count>__<table>, tagged
+with the plan, together with a plan file listing its items and the primary keys of
+its tables. A merge run combines the tables of all shards of one plan and drops rows
+whose primary key was already written.
+"""
+import csv
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+WorkItem = namedtuple('WorkItem', ['account', 'region', 'step', 'target'])
+
+# Steps in the order the component runs them
+STEPS = ['inventory', 'inventory_planning', 'orders', 'returns', 'finances', 'strategic_products', 'seller_feedback',
+         'performance_report', 'settlement_report', 'ledger', 'ads']
+# Steps that extract every marketplace separately; orders (first marketplace only) and finances
+# (not marketplace specific) run as one item per region
+MARKETPLACE_STEPS = {'inventory', 'inventory_planning', 'returns', 'strategic_products', 'seller_feedback',
+                     'performance_report', 'settlement_report', 'ledger'}
+
+SHARD_OUTPUT_TAG = 'shard_output'
+PLAN_FILE_NAME = 'plan.json'
+_SHARD_FILE_PATTERN = re.compile(r'^shard-(\d+)-of-(\d+)__(.+)$')
+
+
+def build_plan(extractions):
+    """
+    Work items of extractions given as (account, region, steps, marketplace_ids, store_names)
+    tuples, in a stable order.
+    """
+    items = []
+    for account, region, steps, marketplace_ids, store_names in extractions:
+        for step in STEPS:
+            if step not in steps:
+                continue
+            if step == 'ads':
+                targets = store_names
+            elif not marketplace_ids:
+                continue
+            elif step in MARKETPLACE_STEPS:
+                targets = marketplace_ids
+            else:
+                targets = [None]
+            items.extend(WorkItem(account, region, step, target) for target in targets)
+    return items
+
+
+def shard_items(items, shard_index: int, shard_count: int):
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is outside of 0..{shard_count - 1}.")
+    return items[shard_index::shard_count]
+
+
+def plan_id(items, shard_count: int) -> str:
+    # Shards of one plan, and only those, share this id
+    payload = json.dumps([shard_count, [list(item) for item in items]])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def shard_file_name(shard_index: int, shard_count: int, name: str) -> str:
+    return f'shard-{shard_index}-of-{shard_count}__{name}'
+
+
+def parse_shard_file_name(file_name: str):
+    """
+    (shard_index, shard_count, name) of a shard output file, None for other files.
+    """
+    match = _SHARD_FILE_PATTERN.match(file_name)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)), match.group(3)
+
+
+def merge_deduplicated(paths, destination, primary_keys):
+    """
+    Write the rows of the CSV tables at paths to destination, keeping the first row of
+    every primary key (of every distinct row when there are no primary keys). Columns
+    are the union of the source columns. Returns (rows written, duplicates dropped).
+    """
+    headers = []
+    for path in paths:
+        with open(path, newline='', encoding='utf-8') as source:
+            headers.append(next(csv.reader(source), []))
+    columns = list(dict.fromkeys(column for header in headers for column in header))
+    key_columns = primary_keys if primary_keys and set(primary_keys) <= set(columns) else columns
+    seen = set()
+    written = duplicates = 0
+    with open(destination, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, columns, lineterminator='\n')
+        writer.writeheader()
+        for path in paths:
+            with open(path, newline='', encoding='utf-8') as source:
+                for row in csv.DictReader(source):
+                    key = tuple(row.get(column, '') for column in key_columns)
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                    writer.writerow(row)
+                    written += 1
+    return written, duplicates
+
+
+def write_plan_file(path, plan, shard_index, shard_count, items, primary_keys):
+    with open(path, 'w') as out:
+        json.dump({'plan_id': plan, 'shard_index': shard_index, 'shard_count': shard_count,
+                   'items': [item._asdict() for item in items], 'tables': primary_keys}, out, indent=2)
+
+
+def read_plan_files(paths):
+    """
+    Check that plan files cover all shards of one plan, and return
+    (shard_count, {table: primary keys}).
+    """
+    plans = []
+    for path in paths:
+        with open(path) as plan_file:
+            plans.append(json.load(plan_file))
+    if not plans:
+        raise ValueError("No shard outputs found; map the files tagged 'shard_output' to the merge configuration.")
+    if len({plan['plan_id'] for plan in plans}) > 1:
+        raise ValueError("The shard outputs come from different run plans.")
+    shard_count = plans[0]['shard_count']
+    missing = set(range(shard_count)) - {plan['shard_index'] for plan in plans}
+    if missing:
+        raise ValueError(f"Outputs of shards {', '.join(map(str, sorted(missing)))} are missing.")
+    primary_keys = {}
+    for plan in plans:
+        primary_keys.update(plan['tables'])
+    return shard_count, primary_keys
+
+
+def shard_paths(files):
+    """
+    Group shard output files, given as (file name, path) pairs, by table:
+    {name: [paths ordered by shard]}, and list the plan files.
+    """
+    tables, plans = {}, []
+    for file_name, path in files:
+        parsed = parse_shard_file_name(file_name)
+        if parsed is None:
+            continue
+        shard_index, _, name = parsed
+        if name == PLAN_FILE_NAME:
+            plans.append(path)
+        else:
+            tables.setdefault(name, []).append((shard_index, path))
+    return {name: [path for _, path in sorted(parts)] for name, parts in tables.items()}, plans
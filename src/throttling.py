@@ -0,0 +1,98 @@
+"""
+Client-side rate limiting and failure isolation helpers for SP-API calls.
+"""
+import threading
+import time
+
+# Default SP-API usage plans as (requests per second, burst) per operation.
+OPERATION_RATE_LIMITS = {
+    'searchCatalogItems': (2.0, 2),
+    'getInventorySummaries': (2.0, 2),
+    'createReport': (0.0167, 15),
+    'getReport': (2.0, 15),
+    'getReports': (0.0222, 10),
+    'getReportDocument': (0.0167, 15),
+    'listFinancialEvents': (0.5, 30),
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_operation(cls, operation: str) -> 'TokenBucket':
+        rate, burst = OPERATION_RATE_LIMITS[operation]
+        return cls(rate, burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """
+        Take one token if available without waiting.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def reserve(self) -> float:
+        """
+        Take one token if available and return 0, otherwise return the seconds until
+        the next token without taking one. Lets callers sleep the way they need to.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """
+        Take one token, sleeping as needed. Returns the time spent waiting in seconds.
+        """
+        waited = 0.0
+        while True:
+            wait_time = self.reserve()
+            if not wait_time:
+                return waited
+            time.sleep(wait_time)
+            waited += wait_time
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures, after which callers should stop
+    sending requests for the guarded scope (e.g. one marketplace).
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self._consecutive_failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._consecutive_failures >= self.threshold
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
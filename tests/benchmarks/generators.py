@@ -0,0 +1,260 @@
+'''
+Synthetic Amazon report generators for parser benchmarks and load tests.
+
+All generators are deterministic for a given size and seed, and return the payload in
+the form the component receives it: raw bytes for documents, parsed dicts for JSON API pages.
+'''
+import random
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+MARKETPLACE_IDS = ['A1PA6795UKMFR9', 'A1RKKUPIHCS9HS', 'A13V1IB3VIYZZH', 'APJ6JRA9NG5V4', 'A1F83G8C2ARO7P']
+MARKETPLACE_NAMES = ['Amazon.de', 'Amazon.es', 'Amazon.fr', 'Amazon.it', 'Amazon.co.uk']
+BASE_DATE = datetime(2024, 1, 1)
+
+
+def _asin(rng):
+    return 'B0' + ''.join(rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ0123456789') for _ in range(8))
+
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def all_orders_xml(n_orders, items_per_order=2, seed=1):
+    """GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL document with n_orders * items_per_order rows."""
+    rng = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<AmazonEnvelope><Header><DocumentVersion>1.01</DocumentVersion>'
+             '</Header><MessageType>AllOrdersReport</MessageType>']
+    for i in range(n_orders):
+        purchased = BASE_DATE + timedelta(minutes=i)
+        parts.append(
+            f'<Message><MessageID>{i + 1}</MessageID><Order>'
+            f'<AmazonOrderID>{302 + i % 700}-{i:07d}-{rng.randint(1000000, 9999999)}</AmazonOrderID>'
+            f'<MerchantOrderID>M-{i}</MerchantOrderID>'
+            f'<PurchaseDate>{_iso(purchased)}</PurchaseDate>'
+            f'<LastUpdatedDate>{_iso(purchased + timedelta(hours=2))}</LastUpdatedDate>'
+            f'<OrderStatus>{rng.choice(["Shipped", "Pending", "Cancelled"])}</OrderStatus>'
+            f'<SalesChannel>{rng.choice(MARKETPLACE_NAMES)}</SalesChannel>'
+            '<FulfillmentData><FulfillmentChannel>Merchant</FulfillmentChannel>'
+            '<ShipServiceLevel>Standard</ShipServiceLevel><Address><City>Berlin</City><State>Berlin</State>'
+            f'<PostalCode>{10000 + i % 90000}</PostalCode><Country>DE</Country></Address></FulfillmentData>'
+            '<IsBusinessOrder>false</IsBusinessOrder>'
+        )
+        for j in range(items_per_order):
+            price = rng.randint(100, 20000) / 100
+            parts.append(
+                f'<OrderItem><AmazonOrderItemCode>{i:08d}{j:03d}</AmazonOrderItemCode><ASIN>{_asin(rng)}</ASIN>'
+                f'<SKU>SKU-{rng.randint(1, 5000)}</SKU><ItemStatus>Shipped</ItemStatus>'
+                f'<ProductName>{escape("Product & Co " + str(j))}</ProductName>'
+                f'<Quantity>{rng.randint(1, 3)}</Quantity><NumberOfItems>1</NumberOfItems><ItemPrice>'
+                f'<Component><Type>Principal</Type><Amount currency="EUR">{price:.2f}</Amount></Component>'
+                f'<Component><Type>Tax</Type><Amount currency="EUR">{price * 0.19:.2f}</Amount></Component>'
+                '<Component><Type>Shipping</Type><Amount currency="EUR">4.99</Amount></Component>'
+                '</ItemPrice><Promotion><PromotionIDs>PROMO-1</PromotionIDs>'
+                '<ItemPromotionDiscount>-1.00</ItemPromotionDiscount></Promotion></OrderItem>'
+            )
+        parts.append('</Order></Message>')
+    parts.append('</AmazonEnvelope>')
+    return ''.join(parts).encode('utf-8')
+
+
+def returns_xml(n_returns, seed=2):
+    """GET_XML_RETURNS_DATA_BY_RETURN_DATE document with n_returns rows."""
+    rng = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<root>']
+    for i in range(n_returns):
+        parts.append(
+            f'<return_details><item_details><item_name>Item {i}</item_name><asin>{_asin(rng)}</asin>'
+            '<return_reason_code>CR-DEFECTIVE</return_reason_code>'
+            f'<merchant_sku>SKU-{rng.randint(1, 5000)}</merchant_sku><in_policy>Y</in_policy>'
+            '<return_quantity>1</return_quantity><resolution>StandardRefund</resolution>'
+            f'<category>Tools</category><refund_amount>{rng.randint(100, 9999) / 100:.2f}</refund_amount>'
+            f'</item_details><order_id>302-{i:07d}-1234567</order_id><order_date>2024-01-01</order_date>'
+            f'<amazon_rma_id>RMA{i:08d}</amazon_rma_id><return_request_date>2024-01-05</return_request_date>'
+            '<return_request_status>Approved</return_request_status><a_to_z_claim>N</a_to_z_claim>'
+            '<is_prime>N</is_prime><label_details><label_cost>4.50</label_cost><label_type>AmazonPrePaid</label_type>'
+            '</label_details><label_to_be_paid_by>Customer</label_to_be_paid_by><return_type>C-Returns</return_type>'
+            '<order_amount>19.99</order_amount><order_quantity>1</order_quantity></return_details>'
+        )
+    parts.append('</root>')
+    return ''.join(parts).encode('utf-8')
+
+
+SETTLEMENT_COLUMNS = [
+    'settlement-id', 'settlement-start-date', 'settlement-end-date', 'deposit-date', 'total-amount', 'currency',
+    'transaction-type', 'order-id', 'merchant-order-id', 'adjustment-id', 'shipment-id', 'marketplace-name',
+    'amount-type', 'amount-description', 'amount', 'fulfillment-id', 'posted-date', 'posted-date-time',
+    'order-item-code', 'merchant-order-item-id', 'merchant-adjustment-item-id', 'sku', 'quantity-purchased',
+    'promotion-id',
+]
+
+
+def settlement_tsv(n_rows, seed=3):
+    """GET_V2_SETTLEMENT_REPORT_DATA_FLAT_FILE_V2 document: one summary row followed by n_rows transaction rows."""
+    rng = random.Random(seed)
+    lines = ['\t'.join(SETTLEMENT_COLUMNS),
+             '\t'.join(['12345678901', '2024-01-01 00:00:00 UTC', '2024-01-15 00:00:00 UTC',
+                        '2024-01-17 00:00:00 UTC', '1234.56', 'EUR'] + [''] * (len(SETTLEMENT_COLUMNS) - 6))]
+    for i in range(n_rows):
+        order_id = f'302-{i // 3:07d}-1234567'
+        amount_type, description = rng.choice([('ItemPrice', 'Principal'), ('ItemFees', 'Commission'),
+                                               ('ItemPrice', 'Shipping'), ('ItemFees', 'FBAPerUnitFulfillmentFee')])
+        row = ['12345678901', '', '', '', '', '', 'Order', order_id, order_id, '', f'S{i}',
+               rng.choice(MARKETPLACE_NAMES + ['']), amount_type, description, f'{rng.uniform(-50, 200):.2f}',
+               'AFN', '2024-01-10', '2024-01-10 10:00:00 UTC', f'{i:014d}', '', '', f'SKU-{rng.randint(1, 5000)}',
+               str(rng.randint(1, 3)), '']
+        lines.append('\t'.join(row))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+LEDGER_COLUMNS = ['Date', 'FNSKU', 'ASIN', 'MSKU', 'Title', 'Event Type', 'Reference ID', 'Quantity',
+                  'Fulfillment Center', 'Disposition', 'Reason', 'Country', 'Reconciled Quantity',
+                  'Unreconciled Quantity', 'Date and Time']
+
+
+def ledger_tsv(n_rows, seed=4):
+    """GET_LEDGER_DETAIL_VIEW_DATA document with n_rows rows."""
+    rng = random.Random(seed)
+    lines = ['\t'.join(LEDGER_COLUMNS)]
+    for i in range(n_rows):
+        day = BASE_DATE + timedelta(hours=i)
+        lines.append('\t'.join([
+            day.strftime('%m/%d/%Y'), f'X00{i:07d}', _asin(rng), f'SKU-{rng.randint(1, 5000)}', f'Product {i}',
+            rng.choice(['Shipments', 'Receipts', 'CustomerReturns', 'Adjustments']), f'{rng.randint(1, 10 ** 9)}',
+            str(rng.randint(-5, 5)), rng.choice(['LEJ1', 'WRO5', 'BER3']), 'SELLABLE', '', 'DE', '', '',
+            day.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+        ]))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _money(rng, low=-20, high=100):
+    return {'CurrencyCode': 'EUR', 'CurrencyAmount': round(rng.uniform(low, high), 2)}
+
+
+def financial_events_page(n_shipments, n_refunds=None, items_per_event=2, seed=5):
+    """listFinancialEvents response page with shipment and refund events."""
+    rng = random.Random(seed)
+    n_refunds = n_shipments // 10 if n_refunds is None else n_refunds
+    charges = ['Principal', 'Tax', 'ShippingCharge', 'ShippingTax', 'GiftWrap']
+    fees = ['Commission', 'FBAPerUnitFulfillmentFee', 'DigitalServicesFee', 'VariableClosingFee']
+
+    def event(i, item_list_key, charge_key, fee_key, item_id_key):
+        return {
+            'AmazonOrderId': f'302-{i:07d}-1234567',
+            'MarketplaceName': rng.choice(MARKETPLACE_NAMES),
+            'PostedDate': _iso(BASE_DATE + timedelta(minutes=i)),
+            item_list_key: [{
+                'SellerSKU': f'SKU-{rng.randint(1, 5000)}',
+                item_id_key: f'{i:08d}{j:03d}',
+                'QuantityShipped': rng.randint(1, 3),
+                charge_key: [{'ChargeType': c, 'ChargeAmount': _money(rng)} for c in charges],
+                fee_key: [{'FeeType': f, 'FeeAmount': _money(rng, -15, 0)} for f in fees],
+            } for j in range(items_per_event)],
+        }
+
+    return {'payload': {'FinancialEvents': {
+        'ShipmentEventList': [event(i, 'ShipmentItemList', 'ItemChargeList', 'ItemFeeList', 'OrderItemId')
+                              for i in range(n_shipments)],
+        'RefundEventList': [event(i, 'ShipmentItemAdjustmentList', 'ItemChargeAdjustmentList',
+                                  'ItemFeeAdjustmentList', 'OrderAdjustmentItemId')
+                            for i in range(n_refunds)],
+    }}}
+
+
+def catalog_response(n_items, marketplace_id=MARKETPLACE_IDS[0], ranks_per_item=3, seed=6):
+    """searchCatalogItems response with salesRanks for n_items ASINs."""
+    rng = random.Random(seed)
+    return {
+        'numberOfResults': n_items,
+        'items': [{
+            'asin': _asin(rng),
+            'salesRanks': [{
+                'marketplaceId': marketplace_id,
+                'classificationRanks': [{'classificationId': str(rng.randint(10 ** 6, 10 ** 9)),
+                                         'title': f'Category {k}', 'link': f'https://amazon.de/gp/bestsellers/{k}',
+                                         'rank': rng.randint(1, 100000)} for k in range(ranks_per_item)],
+                'displayGroupRanks': [{'websiteDisplayGroup': 'home_improvement_display_on_website',
+                                       'title': 'DIY & Tools', 'link': 'https://amazon.de/gp/bestsellers/diy',
+                                       'rank': rng.randint(1, 100000)}],
+            }],
+        } for _ in range(n_items)],
+    }
+
+
+def performance_json(n_targets=20, seed=7, marketplace_id=MARKETPLACE_IDS[0]):
+    """GET_V2_SELLER_PERFORMANCE_REPORT document; n_targets scales the nested target lists."""
+    rng = random.Random(seed)
+
+    def rate_metric():
+        return {
+            'reportingDateRange': {'reportingDateFrom': '2024-01-01T00:00:00Z',
+                                   'reportingDateTo': '2024-03-01T00:00:00Z'},
+            'status': rng.choice(['GOOD', 'FAIR', 'POOR']),
+            'targets': [{'targetValue': rng.random(), 'targetCondition': 'LESS_THAN'} for _ in range(n_targets)],
+            'rate': rng.random(),
+            'orderCount': rng.randint(0, 10000),
+        }
+
+    return {
+        'accountStatuses': [{'marketplaceId': marketplace_id, 'businessType': 'SELLING_ON_AMAZON',
+                             'status': 'NORMAL'}],
+        'performanceMetrics': [{
+            'marketplaceId': marketplace_id,
+            'lateShipmentRate': rate_metric(),
+            'preFulfillmentCancellationRate': rate_metric(),
+            'validTrackingRate': rate_metric(),
+            'onTimeDeliveryRate': rate_metric(),
+            'orderDefectRate': {'afn': rate_metric(), 'mfn': rate_metric()},
+            'accountHealthRating': {'ahrStatus': 'GREAT', 'ahrScore': rng.randint(0, 1000)},
+        }],
+    }
+
+
+def inventory_planning_tsv(n_rows, seed=8):
+    """GET_FBA_INVENTORY_PLANNING_DATA document with n_rows rows."""
+    rng = random.Random(seed)
+    lines = ['\t'.join(['snapshot-date', 'sku', 'fnsku', 'asin', 'product-name', 'condition', 'available',
+                        'units-shipped-t30', 'marketplace'])]
+    for i in range(n_rows):
+        lines.append('\t'.join(['2024-01-01', f'SKU-{i}', f'X00{i:07d}', _asin(rng), f'Product {i}', 'New',
+                                str(rng.randint(0, 500)), str(rng.randint(0, 100)), 'DE']))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def seller_feedback_tsv(n_rows, seed=9):
+    """GET_SELLER_FEEDBACK_DATA document with n_rows rows in the day-first dotted date format."""
+    rng = random.Random(seed)
+    lines = ['\t'.join(['Date', 'Rating', 'Comments', 'Response', 'Order ID', 'Rater Email'])]
+    for i in range(n_rows):
+        day = BASE_DATE + timedelta(days=i % 365)
+        lines.append('\t'.join([day.strftime('%d.%m.%y'), str(rng.randint(1, 5)), f'Comment {i}', '',
+                                f'302-{i:07d}-1234567', f'buyer{i}@marketplace.amazon.de']))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def inventory_summaries(n_summaries, offset=0, seed=10):
+    """getInventorySummaries inventorySummaries list."""
+    rng = random.Random(seed + offset)
+    return [{
+        'asin': _asin(rng), 'fnSku': f'X00{offset + i:07d}', 'sellerSku': f'SKU-{offset + i}', 'condition': 'NewItem',
+        'lastUpdatedTime': _iso(BASE_DATE), 'productName': f'Product {offset + i}', 'totalQuantity': rng.randint(0, 99),
+        'stores': [],
+        'inventoryDetails': {
+            'fulfillableQuantity': rng.randint(0, 50), 'inboundWorkingQuantity': 0, 'inboundShippedQuantity': 0,
+            'inboundReceivingQuantity': 0,
+            'reservedQuantity': {'totalReservedQuantity': 1, 'pendingCustomerOrderQuantity': 1,
+                                 'pendingTransshipmentQuantity': 0, 'fcProcessingQuantity': 0},
+            'unfulfillableQuantity': {'totalUnfulfillableQuantity': 0, 'customerDamagedQuantity': 0},
+        },
+    } for i in range(n_summaries)]
+
+
+def ads_report(n_rows, seed=11):
+    """Amazon Ads v3 campaign report rows (the decoded GZIP_JSON document)."""
+    rng = random.Random(seed)
+    return [{
+        'campaignId': 1000 + i % 50, 'campaignName': f'Campaign {i % 50}',
+        'date': (BASE_DATE + timedelta(days=i // 50)).strftime('%Y-%m-%d'),
+        'impressions': rng.randint(0, 10000), 'clicks': rng.randint(0, 100), 'cost': round(rng.uniform(0, 50), 2),
+    } for i in range(n_rows)]
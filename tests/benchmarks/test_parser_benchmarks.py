@@ -0,0 +1,225 @@
+'''
+Parser micro-benchmarks on synthetic Amazon reports.
+
+By default every benchmark runs at a small scale as a smoke test of the parsers.
+Set RUN_BENCHMARKS=1 to run at full scale and compare rows/sec and peak memory against
+baselines.json; a benchmark fails when throughput drops or peak memory grows by more
+than BENCHMARK_TOLERANCE (default 0.3). Set BENCHMARK_RECORD=1 to (re)record baselines.
+BENCHMARK_SCALE multiplies the full-scale row counts.
+'''
+import gc
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+import mock
+import pandas as pd
+
+from component import INITIAL_CHUNK_ROWS, Component
+from csv_output import CsvTableWriter
+from dates import DateFormats
+from flattening import SALES_RANK_COLUMNS, ColumnBuffer, append_sales_ranks, flatten_json
+from memory import MemoryGovernor
+from parsers import ADS_COLUMNS, ORDERS_COLUMNS, RETURNS_COLUMNS
+from tests.benchmarks import generators
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'baselines.json')
+RUN_BENCHMARKS = os.environ.get('RUN_BENCHMARKS') == '1'
+RECORD = os.environ.get('BENCHMARK_RECORD') == '1'
+TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', '0.3'))
+SCALE = float(os.environ.get('BENCHMARK_SCALE', '1' if RUN_BENCHMARKS or RECORD else '0.01'))
+
+
+def rows(full_scale):
+    return max(10, int(full_scale * SCALE))
+
+
+def measure(fn):
+    """
+    Run fn twice: once for wall time, once under tracemalloc for peak memory and allocated blocks.
+    fn must return the number of rows it produced.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    row_count = fn()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+
+    return {
+        'rows': row_count,
+        'seconds': round(elapsed, 4),
+        'rows_per_sec': round(row_count / elapsed, 1) if elapsed else float('inf'),
+        'peak_memory_bytes': peak,
+        'allocated_blocks': blocks,
+    }
+
+
+class FixedChunks(MemoryGovernor):
+    # Parsers are compared at the chunk sizes the baselines were recorded with,
+    # independent of the memory of the machine running the benchmarks
+    def chunk_size(self, stream):
+        return INITIAL_CHUNK_ROWS[stream]
+
+
+def fake_response(content):
+    return mock.Mock(status_code=200, content=content)
+
+
+class TestParserBenchmarks(unittest.TestCase):
+    results = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(cls.data_dir.name, 'config.json'), 'w') as config:
+            json.dump({'parameters': {}}, config)
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': cls.data_dir.name}):
+            cls.component = Component()
+        cls.component.memory = FixedChunks()
+        with open(BASELINES_PATH) as baselines:
+            cls.baselines = json.load(baselines)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.data_dir.cleanup()
+        if RECORD:
+            cls.baselines.update(cls.results)
+            with open(BASELINES_PATH, 'w') as baselines:
+                json.dump(cls.baselines, baselines, indent=2, sort_keys=True)
+                baselines.write('\n')
+        if RUN_BENCHMARKS or RECORD:
+            print('\n' + json.dumps(cls.results, indent=2, sort_keys=True))
+
+    def check(self, name, expected_rows, fn):
+        result = measure(fn)
+        self.assertEqual(result['rows'], expected_rows)
+        self.results[name] = result
+        baseline = self.baselines.get(name)
+        if not RUN_BENCHMARKS or RECORD or not baseline:
+            return
+        self.assertGreaterEqual(
+            result['rows_per_sec'], baseline['rows_per_sec'] * (1 - TOLERANCE),
+            f"{name}: throughput regressed from {baseline['rows_per_sec']} to {result['rows_per_sec']} rows/sec")
+        self.assertLessEqual(
+            result['peak_memory_bytes'], baseline['peak_memory_bytes'] * (1 + TOLERANCE),
+            f"{name}: peak memory grew from {baseline['peak_memory_bytes']} to {result['peak_memory_bytes']} bytes")
+
+    def test_all_orders_xml(self):
+        n_orders = rows(20000)
+        document = generators.all_orders_xml(n_orders)
+        self.check('parse_all_orders_xml_report', n_orders * 2,
+                   lambda: sum(len(df) for df in self.component.parse_all_orders_xml_report(document)))
+
+    def test_returns_xml(self):
+        n_returns = rows(20000)
+        document = generators.returns_xml(n_returns)
+        self.check('parse_xml_data', n_returns, lambda: sum(len(df) for df in self.component.parse_xml_data(document)))
+
+    def check_records_to_csv(self, name, expected_rows, batches, columns):
+        # Record-stream output path: parser rows written to the CSV without DataFrames
+        with tempfile.TemporaryDirectory() as out_dir:
+            def run():
+                with CsvTableWriter(os.path.join(out_dir, 'table.csv'), columns) as writer:
+                    for batch in batches():
+                        writer.write_rows(batch)
+                return writer.rows_written
+
+            self.check(name, expected_rows, run)
+
+    def test_orders_records_to_csv(self):
+        n_orders = rows(20000)
+        document = generators.all_orders_xml(n_orders)
+        self.check_records_to_csv('orders_records_to_csv', n_orders * 2,
+                                  lambda: self.component.order_record_batches(document), ORDERS_COLUMNS)
+
+    def test_returns_records_to_csv(self):
+        n_returns = rows(20000)
+        document = generators.returns_xml(n_returns)
+        self.check_records_to_csv('returns_records_to_csv', n_returns,
+                                  lambda: self.component.return_record_batches(document), RETURNS_COLUMNS)
+
+    def test_ads_records_to_csv(self):
+        n_rows = rows(200000)
+        content = gzip.compress(json.dumps(generators.ads_report(n_rows)).encode('utf-8'))
+
+        def batches():
+            records = self.component.iter_ads_records(io.BytesIO(content), 'Amazon.de', 'SPONSORED_PRODUCTS')
+            return self.component.record_batches(records, 'ads')
+
+        self.check_records_to_csv('ads_records_to_csv', n_rows, batches, ADS_COLUMNS)
+
+    def test_financial_events(self):
+        n_shipments = rows(5000)
+        page = generators.financial_events_page(n_shipments)
+        expected = (n_shipments + n_shipments // 10) * 2
+        self.check('process_financial_data', expected, lambda: len(self.component.process_financial_data(page)))
+
+    def test_ledger_document(self):
+        n_rows = rows(100000)
+        content = gzip.compress(generators.ledger_tsv(n_rows))
+
+        def run():
+            with mock.patch.object(self.component, 'controlled_request', return_value=fake_response(content)):
+                chunks = self.component.process_document('https://s3', 'GZIP', False, 'inventory_ledger_detail.csv')
+                return sum(len(df) for df in chunks)
+
+        self.check('process_document_ledger', n_rows, run)
+
+    def test_settlement_document_and_transform(self):
+        n_rows = rows(100000)
+        content = gzip.compress(generators.settlement_tsv(n_rows))
+
+        def run():
+            # Settlement documents come out of process_document already transformed
+            with mock.patch.object(self.component, 'controlled_request', return_value=fake_response(content)):
+                chunks = self.component.process_document('https://s3', 'GZIP', False, 'settlement_report.csv')
+                return sum(len(df) for df in chunks)
+
+        self.check('settlement_transform', n_rows + 1, run)
+
+    def test_feedback_dates(self):
+        n_rows = rows(200000)
+        dates = pd.read_csv(io.BytesIO(generators.seller_feedback_tsv(n_rows)), delimiter='\t')['Date']
+
+        def run():
+            return int(DateFormats().feedback_dates(dates, 'A1PA6795UKMFR9').notna().sum())
+
+        self.check('feedback_dates', n_rows, run)
+
+    def test_catalog_sales_ranks(self):
+        n_items = rows(20000)
+        response = generators.catalog_response(n_items)
+
+        def run():
+            buffer = ColumnBuffer(SALES_RANK_COLUMNS)
+            for item in response['items']:
+                append_sales_ranks(buffer, item, '2024-01-01T00:00:00Z')
+            return len(buffer.to_frame())
+
+        self.check('append_sales_ranks', n_items * 4, run)
+
+    def test_performance_json(self):
+        n_reports = rows(2000)
+        reports = [generators.performance_json(seed=i) for i in range(n_reports)]
+
+        def run():
+            return len(pd.DataFrame([flatten_json(report['performanceMetrics'][0]) for report in reports]))
+
+        self.check('flatten_json_performance', n_reports, run)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+'''
+Startup benchmark: wall time from starting the component process to its first API call.
+
+A scheduled configuration that runs one small step spends a visible share of its
+runtime importing modules. The benchmark starts `python src/component.py` with an
+inventory-only configuration against the stand-in server and measures the time until
+the server receives the first request (the LWA token refresh), the best of
+STARTUP_RUNS runs. With RUN_BENCHMARKS=1 it fails when startup is slower than the
+baseline in baselines.json by more than BENCHMARK_TOLERANCE; BENCHMARK_RECORD=1
+records the baseline.
+'''
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from tests.benchmarks.test_parser_benchmarks import BASELINES_PATH, RECORD, RUN_BENCHMARKS, TOLERANCE
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import write_data_dir
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+SRC = os.path.join(ROOT, 'src')
+STARTUP_RUNS = 5 if RUN_BENCHMARKS or RECORD else 1
+# Imported by the steps that need them, never before the first API call of an inventory run
+DEFERRED_MODULES = ['pandas', 'numpy', 'httpx', 'xml.etree.ElementTree', 'gzip', 'sqlite3', 'multiprocessing']
+STEPS = ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns', 'run_finances', 'run_ads',
+         'run_ledger', 'run_strategic_products', 'run_seller_feedback', 'run_performance_report',
+         'run_settlement_report']
+
+
+class TestStartupBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rate_scale=1000, inventory_size=20).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        write_data_dir(self.data_dir.name, self.server.base_url,
+                       execution={step: step == 'run_inventory' for step in STEPS})
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def time_to_first_call(self):
+        self.server.state.reset()
+        env = dict(os.environ, KBC_DATADIR=self.data_dir.name)
+        started = time.time()
+        process = subprocess.run([sys.executable, os.path.join(SRC, 'component.py')], env=env, cwd=ROOT,
+                                 capture_output=True, timeout=120)
+        self.assertEqual(process.returncode, 0, process.stderr.decode(errors='replace')[-2000:])
+        return self.server.stats()['first_request_at'] - started
+
+    def test_startup_to_first_api_call(self):
+        seconds = round(min(self.time_to_first_call() for _ in range(STARTUP_RUNS)), 4)
+        with open(BASELINES_PATH) as baselines_file:
+            baselines = json.load(baselines_file)
+        if RECORD:
+            baselines['startup_to_first_call'] = {'seconds': seconds}
+            with open(BASELINES_PATH, 'w') as baselines_file:
+                json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+                baselines_file.write('\n')
+        if RUN_BENCHMARKS or RECORD:
+            print(f'\nstartup_to_first_call: {seconds} s')
+        baseline = baselines.get('startup_to_first_call')
+        if RUN_BENCHMARKS and not RECORD and baseline:
+            self.assertLessEqual(seconds, baseline['seconds'] * (1 + TOLERANCE),
+                                 f"startup regressed from {baseline['seconds']} to {seconds} seconds")
+
+    def test_heavy_modules_are_deferred(self):
+        script = ('import json, sys; import component; '
+                  f'print(json.dumps([name for name in {DEFERRED_MODULES!r} if name in sys.modules]))')
+        process = subprocess.run([sys.executable, '-c', script], cwd=SRC, capture_output=True, check=True)
+        self.assertEqual(json.loads(process.stdout), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+'''
+Load-test harness: runs the full component against the stand-in server for a
+marketplace count x date_range matrix and reports wall time, request counts per
+operation and peak RSS of each run.
+
+Example:
+    python -m tests.standin.load_test --marketplaces 1 3 5 --date-ranges 7 30 --rows-per-day 200 \
+        --rate-scale 60 --steps run_orders run_returns --json results.json
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import mock
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.append(SRC_PATH)
+
+from tests.benchmarks.generators import MARKETPLACE_IDS  # noqa: E402
+from tests.standin.server import StandInServer  # noqa: E402
+
+ALL_STEPS = ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns', 'run_finances', 'run_ads',
+             'run_ledger', 'run_strategic_products', 'run_seller_feedback', 'run_performance_report',
+             'run_settlement_report']
+
+
+def _run_component(data_dir, result_queue):
+    """
+    Child process entry point: run the component once and report peak RSS in bytes.
+    """
+    import component
+    from component import Component
+
+    with mock.patch.dict(os.environ, {'KBC_DATADIR': data_dir}), \
+            mock.patch.multiple(component, REPORT_POLL_INTERVAL=0.05, ADS_REPORT_POLL_INTERVAL=0.05,
+                                SETTLEMENT_DOWNLOAD_PACING=0):
+        Component().run()
+    # ru_maxrss is in kilobytes on Linux
+    result_queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def run_case(server, marketplaces, date_range, steps):
+    from tests.test_end_to_end import write_data_dir
+
+    execution = {step: step in steps for step in ALL_STEPS}
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_data_dir(data_dir, server.base_url, date_range=date_range, execution=execution)
+        with open(os.path.join(data_dir, 'config.json')) as config_file:
+            config = json.load(config_file)
+        config['parameters']['marketplaces'] = [{'marketplace_id': mp} for mp in MARKETPLACE_IDS[:marketplaces]]
+        with open(os.path.join(data_dir, 'config.json'), 'w') as config_file:
+            json.dump(config, config_file)
+
+        server.state.reset()
+        context = multiprocessing.get_context('spawn')
+        result_queue = context.Queue()
+        process = context.Process(target=_run_component, args=(data_dir, result_queue))
+        start = time.perf_counter()
+        process.start()
+        peak_rss = result_queue.get()
+        process.join()
+        wall_time = time.perf_counter() - start
+
+    stats = server.stats()
+    return {
+        'marketplaces': marketplaces,
+        'date_range': date_range,
+        'wall_time_seconds': round(wall_time, 2),
+        'peak_rss_bytes': peak_rss,
+        'total_requests': stats['total_requests'],
+        'requests': stats['requests'],
+        'bytes_served': stats['bytes_sent'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--marketplaces', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--date-ranges', type=int, nargs='+', default=[7, 30])
+    parser.add_argument('--steps', nargs='+', default=ALL_STEPS, choices=ALL_STEPS)
+    parser.add_argument('--rows-per-day', type=int, default=100)
+    parser.add_argument('--rate-scale', type=float, default=60.0,
+                        help='multiplier applied to the SP-API usage plans enforced by the stand-in')
+    parser.add_argument('--polls-until-done', type=int, default=2)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    server = StandInServer(rows_per_day=args.rows_per_day, rate_scale=args.rate_scale,
+                           polls_until_done=args.polls_until_done).start()
+    results = []
+    try:
+        for marketplaces in args.marketplaces:
+            for date_range in args.date_ranges:
+                result = run_case(server, marketplaces, date_range, args.steps)
+                results.append(result)
+                print(f"marketplaces={marketplaces:<3} date_range={date_range:<4} "
+                      f"wall={result['wall_time_seconds']:>8.2f}s requests={result['total_requests']:<6} "
+                      f"peak_rss={result['peak_rss_bytes'] / 2 ** 20:>8.1f} MiB", flush=True)
+                for operation, statuses in sorted(result['requests'].items()):
+                    print(f"    {operation:<24} {statuses}")
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+'''
+Local, stateful stand-in for the SP-API, the Ads API and the LWA token endpoint.
+
+Simulates the report lifecycle (IN_QUEUE -> IN_PROGRESS -> DONE/FATAL), presigned gzip
+document URLs with optional Range support, NextToken pagination, 429 responses following the SP-API usage plans,
+Ads report status and injected faults (5xx or slow responses). Report sizes scale with the requested date window
+(rows_per_day).
+
+Usage:
+    server = StandInServer(rows_per_day=100, rate_scale=60)
+    server.start()
+    ... point sp_api_base_url / ads_api_base_url / lwa_token_url at server.base_url ...
+    print(server.stats())
+    server.stop()
+'''
+import gzip
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from tests.benchmarks import generators
+from throttling import OPERATION_RATE_LIMITS, TokenBucket
+
+REPORTS_PATH = '/reports/2021-06-30/reports'
+DOCUMENTS_PATH = '/reports/2021-06-30/documents'
+
+# (method, path regex, operation name)
+ROUTES = [
+    ('POST', r'^/auth/o2/token$', 'token'),
+    ('POST', rf'^{REPORTS_PATH}$', 'createReport'),
+    ('GET', rf'^{REPORTS_PATH}$', 'getReports'),
+    ('GET', rf'^{REPORTS_PATH}/(?P<id>[^/]+)$', 'getReport'),
+    ('GET', rf'^{DOCUMENTS_PATH}/(?P<id>[^/]+)$', 'getReportDocument'),
+    ('GET', r'^/s3/(?P<id>[^/]+)$', 'downloadDocument'),
+    ('GET', r'^/fba/inventory/v1/summaries$', 'getInventorySummaries'),
+    ('GET', r'^/catalog/2022-04-01/items$', 'searchCatalogItems'),
+    ('GET', r'^/finances/v0/financialEvents$', 'listFinancialEvents'),
+    ('POST', r'^/reporting/reports$', 'adsCreateReport'),
+    ('GET', r'^/reporting/reports/(?P<id>[^/]+)$', 'adsGetReport'),
+    ('GET', r'^/ads-s3/(?P<id>[^/]+)$', 'adsDownloadReport'),
+    ('GET', r'^/_stats$', 'stats'),
+    ('POST', r'^/_reset$', 'reset'),
+]
+
+
+def _parse_time(value):
+    return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+class StandInState:
+    """
+    All mutable server state, guarded by one lock.
+    """
+
+    def __init__(self, rows_per_day=50, polls_until_done=2, rate_scale=1.0, fatal_report_types=(),
+                 page_size=50, inventory_size=200, financial_pages=3, financial_events_per_page=50,
+                 max_report_rows=None, range_requests=True):
+        self.rows_per_day = rows_per_day
+        self.polls_until_done = polls_until_done
+        self.rate_scale = rate_scale
+        self.fatal_report_types = set(fatal_report_types)
+        # Reports covering more rows than this end FATAL, like oversized reports on Amazon
+        self.max_report_rows = max_report_rows
+        self.page_size = page_size
+        self.inventory_size = inventory_size
+        self.financial_pages = financial_pages
+        self.financial_events_per_page = financial_events_per_page
+        # Whether document downloads honour Range headers like S3
+        self.range_requests = range_requests
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with getattr(self, 'lock', threading.Lock()):
+            self.reports = {}
+            self.ads_reports = {}
+            self.counts = defaultdict(lambda: defaultdict(int))
+            self.bytes_sent = 0
+            # Wall-clock time the first request arrived, comparable across processes
+            self.first_request_at = None
+            self.faults = defaultdict(deque)
+            self.buckets = {op: TokenBucket(rate * self.rate_scale, burst)
+                            for op, (rate, burst) in OPERATION_RATE_LIMITS.items()}
+
+    def inject(self, operation, status=None, delay=0.0, count=1):
+        """
+        Make the next `count` requests of an operation wait `delay` seconds and, when
+        status is given, fail with that status.
+        """
+        with self.lock:
+            self.faults[operation].extend([(status, delay)] * count)
+
+    def next_fault(self, operation):
+        with self.lock:
+            return self.faults[operation].popleft() if self.faults[operation] else (None, 0.0)
+
+    def rows_for_window(self, start, end):
+        days = (end - start).total_seconds() / 86400
+        return max(1, round(self.rows_per_day * days))
+
+    def arrived(self):
+        with self.lock:
+            if self.first_request_at is None:
+                self.first_request_at = time.time()
+
+    def record(self, operation, status, size):
+        with self.lock:
+            self.counts[operation][str(status)] += 1
+            self.bytes_sent += size
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': {op: dict(statuses) for op, statuses in self.counts.items()},
+                'total_requests': sum(sum(s.values()) for s in self.counts.values()),
+                'bytes_sent': self.bytes_sent,
+                'first_request_at': self.first_request_at,
+            }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> StandInState:
+        return self.server.state
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        for route_method, pattern, operation in ROUTES:
+            match = re.match(pattern, parsed.path)
+            if route_method == method and match:
+                if operation not in ('stats', 'reset'):
+                    self.state.arrived()
+                status, delay = self.state.next_fault(operation)
+                time.sleep(delay)
+                if status:
+                    return self._send(operation, status, {'errors': [{'code': 'InternalFailure',
+                                                                      'message': 'Injected fault'}]})
+                bucket = self.state.buckets.get(operation)
+                if bucket and not bucket.try_acquire():
+                    return self._send(operation, 429, {'errors': [{'code': 'QuotaExceeded',
+                                                                   'message': 'You exceeded your quota'}]})
+                status, body, *extra = getattr(self, f'_{operation}')(**match.groupdict())
+                return self._send(operation, status, body, *extra)
+        self._send('unknown', 404, {'errors': [{'code': 'NotFound', 'message': self.path}]})
+
+    def _send(self, operation, status, body, content_type='application/json', headers=None):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        # Recorded before the response is sent so stats taken right after a request include it
+        if operation not in ('stats', 'reset'):
+            self.state.record(operation, status, len(payload))
+        self.wfile.write(payload)
+
+    # --- Auth -----------------------------------------------------------------------------------------------
+
+    def _token(self):
+        return 200, {'access_token': 'standin-access-token', 'token_type': 'bearer', 'expires_in': 3600}
+
+    # --- Reports --------------------------------------------------------------------------------------------
+
+    def _createReport(self):
+        request = json.loads(self.body)
+        start, end = sorted([_parse_time(request['dataStartTime']), _parse_time(request['dataEndTime'])])
+        with self.state.lock:
+            report_id = str(len(self.state.reports) + 1)
+            self.state.reports[report_id] = {
+                'reportType': request['reportType'],
+                'rows': self.state.rows_for_window(start, end),
+                'polls': 0,
+            }
+        return 202, {'reportId': report_id}
+
+    def _getReports(self):
+        # System-generated settlement reports: one per 14 days of the queried window
+        since, until = _parse_time(self.query['createdSince']), _parse_time(self.query['createdUntil'])
+        reports = []
+        with self.state.lock:
+            day = since
+            while day < until:
+                report_id = f"settlement-{day.strftime('%Y%m%d')}"
+                self.state.reports.setdefault(report_id, {
+                    'reportType': self.query['reportTypes'],
+                    'rows': self.state.rows_per_day * 14,
+                    'polls': self.state.polls_until_done,
+                })
+                reports.append({'reportId': report_id, 'reportType': self.query['reportTypes'],
+                                'processingStatus': 'DONE'})
+                day += timedelta(days=14)
+        return 200, {'reports': reports}
+
+    def _getReport(self, id):
+        with self.state.lock:
+            report = self.state.reports.get(id)
+            if report is None:
+                return 404, {'errors': [{'code': 'NotFound', 'message': f'Report {id} not found'}]}
+            report['polls'] += 1
+            if report['polls'] <= self.state.polls_until_done // 2:
+                status = 'IN_QUEUE'
+            elif report['polls'] <= self.state.polls_until_done:
+                status = 'IN_PROGRESS'
+            elif (report['reportType'] in self.state.fatal_report_types
+                  or self.state.max_report_rows and report['rows'] > self.state.max_report_rows):
+                status = 'FATAL'
+            else:
+                status = 'DONE'
+        body = {'reportId': id, 'reportType': report['reportType'], 'processingStatus': status}
+        if status == 'DONE':
+            body['reportDocumentId'] = f'doc-{id}'
+        return 200, body
+
+    def _getReportDocument(self, id):
+        base_url = f'http://{self.headers["Host"]}'
+        return 200, {'reportDocumentId': id, 'url': f'{base_url}/s3/{id}', 'compressionAlgorithm': 'GZIP'}
+
+    def _downloadDocument(self, id):
+        with self.state.lock:
+            report = self.state.reports.get(id[len('doc-'):])
+        if report is None:
+            return 404, b'<Error><Code>NoSuchKey</Code></Error>', 'application/xml'
+        content = gzip.compress(self._document(report['reportType'], report['rows']), mtime=0)
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if not (self.state.range_requests and match):
+            return 200, content, 'application/octet-stream'
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(content) - 1), len(content) - 1)
+        return 206, content[start:end + 1], 'application/octet-stream', {
+            'Content-Range': f'bytes {start}-{end}/{len(content)}'}
+
+    @staticmethod
+    def _document(report_type, rows):
+        if report_type == 'GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL':
+            return generators.all_orders_xml(max(1, rows // 2))
+        if report_type == 'GET_XML_RETURNS_DATA_BY_RETURN_DATE':
+            return generators.returns_xml(rows)
+        if report_type == 'GET_V2_SETTLEMENT_REPORT_DATA_FLAT_FILE_V2':
+            return generators.settlement_tsv(rows)
+        if report_type in ('GET_LEDGER_DETAIL_VIEW_DATA', 'GET_LEDGER_SUMMARY_VIEW_DATA'):
+            return generators.ledger_tsv(rows)
+        if report_type == 'GET_FBA_INVENTORY_PLANNING_DATA':
+            return generators.inventory_planning_tsv(rows)
+        if report_type == 'GET_SELLER_FEEDBACK_DATA':
+            return generators.seller_feedback_tsv(rows)
+        if report_type == 'GET_V2_SELLER_PERFORMANCE_REPORT':
+            return json.dumps(generators.performance_json()).encode('utf-8')
+        return b''
+
+    # --- Paginated APIs -------------------------------------------------------------------------------------
+
+    def _getInventorySummaries(self):
+        offset = int(self.query.get('nextToken', 'inv-0')[len('inv-'):])
+        size = min(self.state.page_size, self.state.inventory_size - offset)
+        body = {'payload': {'granularity': {'granularityType': 'Marketplace'},
+                            'inventorySummaries': generators.inventory_summaries(size, offset=offset)},
+                'pagination': {}}
+        if offset + size < self.state.inventory_size:
+            body['pagination']['nextToken'] = f'inv-{offset + size}'
+        return 200, body
+
+    def _searchCatalogItems(self):
+        asins = self.query.get('keywords', '').split(',')
+        response = generators.catalog_response(len(asins), marketplace_id=self.query.get('marketplaceIds'))
+        for item, asin in zip(response['items'], asins):
+            item['asin'] = asin
+        return 200, response
+
+    def _listFinancialEvents(self):
+        page = int(self.query.get('NextToken', 'fin-0')[len('fin-'):])
+        body = generators.financial_events_page(self.state.financial_events_per_page, seed=page)
+        if page + 1 < self.state.financial_pages:
+            body['payload']['NextToken'] = f'fin-{page + 1}'
+        return 200, body
+
+    # --- Ads ------------------------------------------------------------------------------------------------
+
+    def _adsCreateReport(self):
+        request = json.loads(self.body)
+        start, end = (datetime.strptime(request[k], '%Y-%m-%d') for k in ('startDate', 'endDate'))
+        with self.state.lock:
+            report_id = f'ads-{len(self.state.ads_reports) + 1}'
+            self.state.ads_reports[report_id] = {'rows': self.state.rows_for_window(start, end), 'polls': 0}
+        return 200, {'reportId': report_id, 'status': 'PENDING'}
+
+    def _adsGetReport(self, id):
+        with self.state.lock:
+            report = self.state.ads_reports.get(id)
+            if report is None:
+                return 404, {'code': 'NOT_FOUND'}
+            report['polls'] += 1
+            done = report['polls'] > self.state.polls_until_done
+        body = {'reportId': id, 'status': 'COMPLETED' if done else 'PENDING'}
+        if done:
+            body['url'] = f'http://{self.headers["Host"]}/ads-s3/{id}'
+        return 200, body
+
+    def _adsDownloadReport(self, id):
+        with self.state.lock:
+            report = self.state.ads_reports.get(id)
+        if report is None:
+            return 404, b'', 'application/octet-stream'
+        content = json.dumps(generators.ads_report(report['rows'])).encode('utf-8')
+        return 200, gzip.compress(content), 'application/octet-stream'
+
+    # --- Control --------------------------------------------------------------------------------------------
+
+    def _stats(self):
+        return 200, self.state.snapshot()
+
+    def _reset(self):
+        self.state.reset()
+        return 200, {}
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        super().__init__((host, port), StandInHandler)
+        self.state = StandInState(**options)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        return self.state.snapshot()
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+
+import mock
+import pandas as pd
+
+from component import Component
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import MARKETPLACES, no_waits, write_data_dir
+
+
+class TestBatchAccounts(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000, inventory_size=120).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: False for step in ['run_inventory_planning', 'run_returns', 'run_finances', 'run_ledger',
+                                              'run_strategic_products', 'run_seller_feedback',
+                                              'run_performance_report', 'run_settlement_report']}
+        write_data_dir(self.data_dir.name, self.server.base_url, execution=execution)
+        config_path = os.path.join(self.data_dir.name, 'config.json')
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+        parameters = config['parameters']
+        parameters['accounts'] = [
+            {'name': 'brand-a', '#refresh_token': 'token-a', '#refresh_token_ads': 'token-a',
+             'marketplaces': [{'marketplace_id': MARKETPLACES[0]}], 'stores': [{'name': 'Amazon.de', 'scope': '1'}]},
+            {'name': 'brand-b', '#refresh_token': 'token-b',
+             'marketplaces': [{'marketplace_id': mp} for mp in MARKETPLACES]},
+        ]
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def test_accounts_are_extracted_into_shared_tables(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+
+        stats = self.server.stats()['requests']
+        # One Seller Central token per account and one Ads token, no token of the top-level credentials
+        self.assertEqual(sum(stats['token'].values()), 3)
+        self.assertEqual(sum(stats['getInventorySummaries'].values()), 3 * 3)
+        self.assertEqual(sum(stats['adsCreateReport'].values()), 3)
+
+        tables = os.path.join(self.data_dir.name, 'out', 'tables')
+        inventory = pd.read_csv(os.path.join(tables, 'inventory.csv'))
+        self.assertEqual(inventory.columns[0], 'account')
+        self.assertEqual(inventory.groupby('account').size().to_dict(), {'brand-a': 120, 'brand-b': 240})
+        self.assertEqual(set(pd.read_csv(os.path.join(tables, 'advertising.csv'))['account']), {'brand-a'})
+        self.assertEqual(set(pd.read_csv(os.path.join(tables, 'orders.csv'))['account']), {'brand-a', 'brand-b'})
+
+        with open(os.path.join(self.data_dir.name, 'out', 'state.json')) as state_file:
+            state = json.load(state_file)
+        self.assertEqual(set(state['accounts']), {'brand-a', 'brand-b'})
+        self.assertNotIn('report_density', state)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import pandas as pd
+
+from component import Component
+from json_stream import iter_json_array
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import no_waits, write_data_dir
+
+
+class TestJsonArrayStream(unittest.TestCase):
+
+    def test_elements_split_across_chunks(self):
+        rows = [{'campaignId': 123456789, 'campaignName': 'Früh ☀ Kampagne', 'cost': 12.75, 'clicks': None},
+                {'campaignId': 2, 'campaignName': 'a, b ] c', 'nested': [1, {'x': True}]}, 1e-05, 'text', False]
+        document = json.dumps(rows, ensure_ascii=False, indent=2).encode('utf-8')
+        for read_size in (1, 3, 7, 64):
+            self.assertEqual(list(iter_json_array(io.BytesIO(document), read_size)), rows)
+        self.assertEqual(list(iter_json_array(io.BytesIO(b' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.BytesIO(b'{"rows": []}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.BytesIO(b'[1, 2'), 2))
+
+
+class TestAdsWindows(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: step == 'run_ads' for step in
+                     ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns', 'run_finances',
+                      'run_ads', 'run_ledger', 'run_strategic_products', 'run_seller_feedback',
+                      'run_performance_report', 'run_settlement_report']}
+        write_data_dir(self.data_dir.name, self.server.base_url, execution=execution)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def set_parameters(self, **parameters):
+        config_path = os.path.join(self.data_dir.name, 'config.json')
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+        config['parameters'].update(parameters)
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+
+    def run_component(self):
+        self.server.state.reset()
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+        created = sum(self.server.stats()['requests']['adsCreateReport'].values())
+        table = pd.read_csv(os.path.join(self.data_dir.name, 'out', 'tables', 'advertising.csv'))
+        with open(os.path.join(self.data_dir.name, 'out', 'state.json')) as state_file:
+            state = json.load(state_file)
+        shutil.copy(os.path.join(self.data_dir.name, 'out', 'state.json'),
+                    os.path.join(self.data_dir.name, 'in', 'state.json'))
+        return created, table, state
+
+    def test_later_runs_request_only_unsettled_days(self):
+        created, table, state = self.run_component()
+        self.assertEqual(created, 3)
+        # Ten days at five rows a day for each ad product
+        self.assertEqual(len(table), 3 * 50)
+        self.assertEqual(list(table.columns), ['campaign_id', 'campaign_name', 'date', 'impressions', 'clicks',
+                                               'cost', 'market', 'adProduct'])
+        self.assertEqual(set(state['ads_settled_through']['Amazon.de']),
+                         {'SPONSORED_PRODUCTS', 'SPONSORED_BRANDS', 'SPONSORED_DISPLAY'})
+
+        created, table, _ = self.run_component()
+        self.assertEqual(created, 3)
+        self.assertEqual(len(table), 3 * 15)
+
+    def test_long_initial_range_is_split_into_windows(self):
+        self.set_parameters(ads_initial_days=40)
+        created, table, _ = self.run_component()
+        self.assertEqual(created, 3 * 2)
+        self.assertEqual(len(table), 3 * (150 + 45))
+
+
+if __name__ == "__main__":
+    unittest.main()
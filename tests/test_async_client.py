@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+import mock
+
+import async_client
+import retries
+from async_client import AsyncApiClient
+from metrics import RunMetrics
+from parsers import ReportParsers
+from tests.standin.server import StandInServer
+from throttling import OPERATION_RATE_LIMITS
+
+RATE_SCALE = 5000
+
+
+class TestAsyncApiClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=2, rate_scale=RATE_SCALE).start()
+        self.metrics = RunMetrics()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def client(self, rate_limits=None):
+        if rate_limits is None:
+            rate_limits = {op: (rate * RATE_SCALE, burst) for op, (rate, burst) in OPERATION_RATE_LIMITS.items()}
+        return AsyncApiClient(self.metrics, self.server.base_url, 'token', ads_api_base_url=self.server.base_url,
+                              ads_client_id='app', ads_access_token='token', report_poll_interval=0.01,
+                              ads_poll_interval=0.01, rate_limits=rate_limits)
+
+    def run_with_client(self, lifecycles, **client_options):
+        async def gather():
+            async with self.client(**client_options) as client:
+                return await asyncio.gather(*lifecycles(client))
+        return asyncio.run(gather())
+
+    def test_hundreds_of_report_lifecycles_in_one_loop(self):
+        end = datetime.utcnow()
+        start = end - timedelta(days=3)
+        results = self.run_with_client(lambda client: [
+            client.report_lifecycle('GET_LEDGER_DETAIL_VIEW_DATA', 'A1PA6795UKMFR9', start, end)
+            for _ in range(200)
+        ])
+
+        self.assertEqual(len({result.report_id for result in results}), 200)
+        self.assertTrue(all(result.status == 'DONE' and result.document.read() for result in results))
+        stats = self.server.stats()['requests']
+        # The client-side buckets keep the requests within the usage plans; only arrival
+        # jitter on the server can still cause the odd 429, which is retried
+        self.assertEqual(stats['createReport']['202'], 200)
+        self.assertLess(stats['createReport'].get('429', 0), 10)
+        self.assertLess(stats['getReportDocument'].get('429', 0), 10)
+        self.assertEqual(self.metrics.requests['downloadDocument']['count'], 200)
+
+    def test_rate_limited_requests_are_retried_then_given_up(self):
+        # Without client-side buckets the 15-report burst of createReport is exceeded
+        self.server.state.rate_scale = 1
+        self.server.state.reset()
+        end = datetime.utcnow()
+        with mock.patch.object(async_client.asyncio, 'sleep', mock.AsyncMock()):
+            report_ids = self.run_with_client(lambda client: [
+                client.create_report('GET_LEDGER_DETAIL_VIEW_DATA', 'A1PA6795UKMFR9', end - timedelta(days=1), end)
+                for _ in range(17)
+            ], rate_limits={})
+
+        self.assertEqual(sum(1 for report_id in report_ids if report_id), 15)
+        statuses = self.server.stats()['requests']['createReport']
+        self.assertEqual(statuses['429'], 2 * (retries.RATE_LIMIT_RETRIES + 1))
+        self.assertGreater(self.metrics.waits['rate_limit'], 0)
+
+    def test_ads_report_lifecycle_returns_rows(self):
+        payload = {'startDate': '2024-01-01', 'endDate': '2024-01-11', 'configuration': {}}
+        results = self.run_with_client(lambda client: [client.ads_report_lifecycle('1', payload) for _ in range(3)])
+        for document in results:
+            with document:
+                rows = list(ReportParsers.iter_ads_records(document, 'Amazon.de', 'SPONSORED_PRODUCTS'))
+            self.assertEqual(len(rows), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
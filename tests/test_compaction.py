@@ -0,0 +1,41 @@
+import io
+import unittest
+
+import pandas as pd
+
+from compaction import compact_frame, concat_frames, constant_column, with_constants
+from fingerprints import frame_fingerprints
+from tests.benchmarks import generators
+
+
+def planning_frame(n_rows):
+    return pd.read_csv(io.BytesIO(generators.inventory_planning_tsv(n_rows)), delimiter='\t')
+
+
+class TestCompaction(unittest.TestCase):
+
+    def test_planning_frames_shrink_and_write_the_same_rows(self):
+        frames = [planning_frame(5000) for _ in range(2)]
+        extracted_at = '2024-01-01T00:00:00.000000Z'
+        plain = pd.concat([frame.assign(marketplace_id=mp, extracted_at=extracted_at)
+                           for frame, mp in zip(frames, ('A1PA6795UKMFR9', 'APJ6JRA9NG5V4'))], ignore_index=True)
+        compact = concat_frames(compact_frame(frame.assign(marketplace_id=constant_column(mp, len(frame))))
+                                for frame, mp in zip(frames, ('A1PA6795UKMFR9', 'APJ6JRA9NG5V4')))
+
+        self.assertIsInstance(compact['marketplace_id'].dtype, pd.CategoricalDtype)
+        self.assertNotIn('extracted_at', compact.columns)
+        self.assertLess(compact.memory_usage(deep=True).sum() * 2, plain.memory_usage(deep=True).sum())
+        written = with_constants(compact, {'extracted_at': extracted_at})
+        self.assertEqual(written.to_csv(index=False), plain.to_csv(index=False))
+        keys = ['snapshot-date', 'sku', 'marketplace_id']
+        self.assertEqual(frame_fingerprints(written, keys)[1].tolist(), frame_fingerprints(plain, keys)[1].tolist())
+
+    def test_negative_integers_and_floats_keep_their_type(self):
+        df = compact_frame(pd.DataFrame({'qty': [1, 2, 3], 'delta': [-1, 0, 5], 'amount': [1.5, 2.25, 0.1]}))
+        self.assertEqual(df['qty'].dtype, 'uint8')
+        self.assertEqual(df['delta'].dtype, 'int64')
+        self.assertEqual(df['amount'].dtype, 'float64')
+
+
+if __name__ == "__main__":
+    unittest.main()
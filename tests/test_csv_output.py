@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from csv_output import CsvTableWriter, merge_tables
+
+COLUMNS = ['name', 'quantity', 'price', 'note']
+ROWS = [
+    ('plain', 1, 12.5, ''),
+    ('comma, inside', 0, 0.0, 'quote " inside'),
+    ('line\nbreak', 3, 0.30000000000000004, 'ünïcödé'),
+    ('tiny', 2, 1e-05, ' padded '),
+]
+
+
+class TestCsvTableWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.out_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.out_dir.name, name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as table:
+            return table.read()
+
+    def test_output_matches_dataframe_to_csv(self):
+        with CsvTableWriter(self.path('records.csv'), COLUMNS) as writer:
+            writer.write_rows(ROWS[:2])
+            writer.write_rows(ROWS[2:])
+        pd.DataFrame(ROWS, columns=COLUMNS).to_csv(self.path('frame.csv'), index=False)
+
+        self.assertEqual(self.read('records.csv'), self.read('frame.csv'))
+        self.assertEqual(writer.rows_written, len(ROWS))
+
+    def test_no_file_without_rows(self):
+        with CsvTableWriter(self.path('empty.csv'), COLUMNS) as writer:
+            writer.write_rows([])
+        self.assertFalse(os.path.exists(self.path('empty.csv')))
+
+
+class TestMergeTables(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.sources = [os.path.join(self.root.name, region) for region in ('NA', 'EU')]
+        self.destination = os.path.join(self.root.name, 'out')
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def write(self, source, name, df):
+        os.makedirs(source, exist_ok=True)
+        df.to_csv(os.path.join(source, name), index=False)
+
+    def read(self, name):
+        return pd.read_csv(os.path.join(self.destination, name), keep_default_na=False)
+
+    def test_tables_of_all_sources_end_up_in_one_table(self):
+        frame = pd.DataFrame(ROWS, columns=COLUMNS)
+        self.write(self.sources[0], 'same.csv', frame.iloc[:2])
+        self.write(self.sources[1], 'same.csv', frame.iloc[2:])
+        self.write(self.sources[0], 'wider.csv', pd.DataFrame({'a': [1], 'b': ['x']}))
+        self.write(self.sources[1], 'wider.csv', pd.DataFrame({'b': ['y'], 'c': [2.5]}))
+        self.write(self.sources[1], 'only.csv', frame)
+
+        merged = merge_tables(self.sources, self.destination)
+
+        self.assertEqual(sorted(merged), ['only.csv', 'same.csv', 'wider.csv'])
+        pd.testing.assert_frame_equal(self.read('same.csv'), self.read('only.csv'))
+        self.assertEqual(self.read('wider.csv').to_dict('records'),
+                         [{'a': '1', 'b': 'x', 'c': ''}, {'a': '', 'b': 'y', 'c': '2.5'}])
+
+
+if __name__ == "__main__":
+    unittest.main()
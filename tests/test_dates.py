@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime
+
+import pandas as pd
+
+from dates import DateFormats, RunClock, iso_utc
+from parsers import ReportParsers
+
+
+class TestRunClock(unittest.TestCase):
+
+    def test_windows_derive_from_one_timestamp(self):
+        clock = RunClock(datetime(2024, 3, 10, 12, 0, 0))
+
+        self.assertEqual(clock.timestamp, '2024-03-10T12:00:00Z')
+        self.assertEqual(clock.days_ago(7), datetime(2024, 3, 3, 12, 0, 0))
+        self.assertEqual(iso_utc(clock.report_end, timespec='milliseconds'), '2024-03-10T11:55:00.000Z')
+
+
+class TestDateFormats(unittest.TestCase):
+
+    def test_feedback_dates_follow_the_marketplace_locale(self):
+        formats = DateFormats()
+        dates = pd.Series(['03/04/24', '12/31/23', None])
+
+        self.assertEqual(formats.feedback_dates(dates, 'ATVPDKIKX0DER').tolist()[:2], ['2024-03-04', '2023-12-31'])
+        self.assertTrue(pd.isna(formats.feedback_dates(dates, 'ATVPDKIKX0DER').iloc[2]))
+        self.assertEqual(formats.feedback_dates(pd.Series(['03.04.24']), 'A1PA6795UKMFR9').tolist(), ['2024-04-03'])
+
+    def test_unexpected_format_is_detected_once(self):
+        formats = DateFormats()
+        # Italian feedback is expected as 03/04/24
+        self.assertEqual(formats.feedback_dates(pd.Series(['03.04.24', '28.02.24']), 'APJ6JRA9NG5V4').tolist(),
+                         ['2024-04-03', '2024-02-28'])
+        self.assertEqual(formats.detect(('GET_SELLER_FEEDBACK_DATA', 'APJ6JRA9NG5V4', 'date'), pd.Series([]), []),
+                         '%d.%m.%y')
+        self.assertIsNone(formats.detect('unknown', pd.Series(['yesterday']), ['%Y-%m-%d']))
+        self.assertIsNone(formats.detect('unknown', pd.Series([]), []))
+
+
+class TestSettlementFileValues(unittest.TestCase):
+
+    def test_summary_row_values_are_applied_to_every_row(self):
+        df = pd.DataFrame({
+            'settlement-id': [123, 123, 123],
+            'settlement-start-date': ['2024-01-01 00:00:00 UTC', None, None],
+            'marketplace-name': [' ', 'Amazon.de', None],
+            'order-id': ['', 'A', 'B'],
+        })
+        parsed = ReportParsers().transform_settlement_chunk(df, {}, {})
+
+        self.assertEqual(parsed['settlement_start_date'].tolist(), ['2024-01-01 00:00:00 UTC'] * 3)
+        self.assertEqual(parsed['marketplace_name'].tolist(), ['Amazon.de'] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
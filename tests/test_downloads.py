@@ -0,0 +1,82 @@
+import asyncio
+import gzip
+import unittest
+
+import requests
+
+from async_client import AsyncApiClient
+from downloads import download_document, open_document
+from metrics import RunMetrics
+from tests.benchmarks import generators
+from tests.standin.server import StandInServer
+
+PART_SIZE = 4096
+
+
+class TestRangedDownloads(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.server.state.reports['1'] = {'reportType': 'GET_LEDGER_DETAIL_VIEW_DATA', 'rows': 2000, 'polls': 0}
+        self.url = f'{self.server.base_url}/s3/doc-1'
+        self.expected = generators.ledger_tsv(2000)
+        self.metrics = RunMetrics()
+
+    def tearDown(self):
+        self.server.stop()
+
+    @staticmethod
+    def request(method, url, headers=None):
+        return requests.request(method, url, headers=headers)
+
+    def read(self, spool):
+        with open_document(spool, 'GZIP', self.metrics) as document:
+            return document.read()
+
+    def test_large_document_is_downloaded_in_parallel_ranges(self):
+        spool = download_document(self.request, self.url, threshold=2 * PART_SIZE, part_size=PART_SIZE)
+
+        self.assertEqual(self.read(spool), self.expected)
+        compressed_size = len(gzip.compress(self.expected, mtime=0))
+        self.assertEqual(self.server.stats()['requests']['downloadDocument'],
+                         {'206': -(-compressed_size // PART_SIZE)})
+        self.assertEqual(self.metrics.bytes['downloaded'], compressed_size)
+        self.assertEqual(self.metrics.bytes['decompressed'], len(self.expected))
+
+    def test_small_document_is_fetched_in_at_most_two_requests(self):
+        spool = download_document(self.request, self.url, part_size=PART_SIZE)
+
+        self.assertEqual(self.read(spool), self.expected)
+        self.assertEqual(self.server.stats()['requests']['downloadDocument'], {'206': 2})
+
+    def test_falls_back_to_single_stream_without_range_support(self):
+        self.server.state.range_requests = False
+        spool = download_document(self.request, self.url, threshold=2 * PART_SIZE, part_size=PART_SIZE)
+
+        self.assertEqual(self.read(spool), self.expected)
+        self.assertEqual(self.server.stats()['requests']['downloadDocument'], {'200': 1})
+
+    def test_partial_response_without_content_range_fails(self):
+        def request(method, url, headers=None):
+            response = self.request(method, url, headers=headers)
+            del response.headers['Content-Range']
+            return response
+
+        with self.assertLogs(level='ERROR'):
+            spool = download_document(request, self.url, threshold=2 * PART_SIZE, part_size=PART_SIZE)
+        self.assertIsNone(spool)
+        self.assertEqual(self.server.stats()['requests']['downloadDocument'], {'206': 1})
+
+    def test_async_client_downloads_ranges_concurrently(self):
+        async def download():
+            async with AsyncApiClient(self.metrics, self.server.base_url, 'token', download_threshold=2 * PART_SIZE,
+                                      range_part_size=PART_SIZE) as client:
+                return await client.download(self.url, 'GZIP')
+
+        with asyncio.run(download()) as document:
+            self.assertEqual(document.read(), self.expected)
+        self.assertGreater(self.server.stats()['requests']['downloadDocument']['206'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+'''
+Runs the whole component against the local SP-API / Ads API stand-in server.
+'''
+import json
+import os
+import tempfile
+import unittest
+
+import mock
+import pandas as pd
+
+import component
+from component import Component
+from tests.standin.server import StandInServer
+
+MARKETPLACES = ['A1PA6795UKMFR9', 'APJ6JRA9NG5V4']
+
+
+def write_data_dir(data_dir, base_url, date_range=7, execution=None):
+    """
+    Create a KBC data folder with a configuration pointing at the stand-in server.
+    """
+    os.makedirs(os.path.join(data_dir, 'in', 'tables'), exist_ok=True)
+    os.makedirs(os.path.join(data_dir, 'out', 'tables'), exist_ok=True)
+    os.makedirs(os.path.join(data_dir, 'out', 'files'), exist_ok=True)
+    with open(os.path.join(data_dir, 'in', 'tables', 'products.csv'), 'w') as products:
+        products.write('products_asin\n' + '\n'.join(f'B00000000{i}' for i in range(5)) + '\n')
+    config = {
+        'parameters': {
+            '#refresh_token': 'token', '#app_id': 'app', '#client_secret_id': 'secret',
+            '#refresh_token_ads': 'token', '#app_id_ads': 'app', '#client_secret_id_ads': 'secret',
+            'date_range': str(date_range),
+            'sp_api_base_url': base_url,
+            'ads_api_base_url': base_url,
+            'lwa_token_url': f'{base_url}/auth/o2/token',
+            'marketplaces': [{'marketplace_id': mp} for mp in MARKETPLACES],
+            'stores': [{'name': 'Amazon.de', 'scope': '1'}],
+            'execution': execution or {},
+        },
+    }
+    with open(os.path.join(data_dir, 'config.json'), 'w') as config_file:
+        json.dump(config, config_file)
+
+
+def no_waits():
+    return mock.patch.multiple(component, REPORT_POLL_INTERVAL=0, ADS_REPORT_POLL_INTERVAL=0,
+                               SETTLEMENT_DOWNLOAD_PACING=0)
+
+
+class TestEndToEnd(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000, inventory_size=120).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        write_data_dir(self.data_dir.name, self.server.base_url)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def test_run_writes_all_tables(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+
+        tables = set(os.listdir(os.path.join(self.data_dir.name, 'out', 'tables')))
+        for table in ['inventory.csv', 'inventory_planning.csv', 'orders.csv', 'returns.csv', 'finance.csv',
+                      'amazon_strategic_products_rank.csv', 'seller_feedback.csv', 'delivery_performance.csv',
+                      'settlement_report.csv', 'inventory_ledger_detail.csv', 'inventory_ledger_summary.csv',
+                      'advertising.csv']:
+            self.assertIn(table, tables)
+
+        stats = self.server.stats()['requests']
+        self.assertEqual(sum(stats['getInventorySummaries'].values()), 2 * 3)
+        self.assertNotIn('429', stats['createReport'])
+
+        with open(os.path.join(self.data_dir.name, 'out', 'files', 'run_metrics.json')) as metrics_file:
+            metrics = json.load(metrics_file)
+        self.assertEqual(metrics['requests']['getInventorySummaries']['count'], 2 * 3)
+        self.assertEqual(set(metrics['stages']['returns']['marketplaces']), set(MARKETPLACES))
+        self.assertEqual(metrics['rows_written']['inventory.csv'], 2 * 120)
+        self.assertGreater(metrics['bytes']['decompressed'], metrics['bytes']['downloaded'])
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: step == 'run_ledger' for step in
+                     ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns', 'run_finances',
+                      'run_ads', 'run_ledger', 'run_strategic_products', 'run_seller_feedback',
+                      'run_performance_report', 'run_settlement_report']}
+        write_data_dir(self.data_dir.name, self.server.base_url, execution=execution)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def test_rows_repeated_across_marketplaces_are_written_once(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+
+        # The stand-in returns the same ledger rows for both marketplaces
+        reports = [report for report in self.server.state.reports.values()
+                   if report['reportType'] == 'GET_LEDGER_DETAIL_VIEW_DATA']
+        self.assertEqual(len(reports), len(MARKETPLACES))
+        detail = pd.read_csv(os.path.join(self.data_dir.name, 'out', 'tables', 'inventory_ledger_detail.csv'))
+        self.assertEqual(len(detail), reports[0]['rows'])
+        self.assertFalse(detail.drop(columns='extracted_at').duplicated().any())
+        summary = pd.read_csv(os.path.join(self.data_dir.name, 'out', 'tables', 'inventory_ledger_summary.csv'))
+        self.assertFalse(summary.drop(columns='extracted_at').duplicated().any())
+
+
+class TestAdaptiveSegmentation(unittest.TestCase):
+
+    def setUp(self):
+        # Orders reports over 100 rows (10 days) end FATAL
+        self.server = StandInServer(rows_per_day=10, rate_scale=1000, max_report_rows=100).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: False for step in ['run_inventory', 'run_inventory_planning', 'run_returns', 'run_finances',
+                                              'run_ads', 'run_ledger', 'run_strategic_products',
+                                              'run_seller_feedback', 'run_performance_report',
+                                              'run_settlement_report']}
+        write_data_dir(self.data_dir.name, self.server.base_url, date_range=30, execution=execution)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def run_component(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+        with open(os.path.join(self.data_dir.name, 'out', 'state.json')) as state_file:
+            state = json.load(state_file)
+        os.replace(os.path.join(self.data_dir.name, 'out', 'state.json'),
+                   os.path.join(self.data_dir.name, 'in', 'state.json'))
+        return state
+
+    def test_fatal_reports_are_split_and_density_is_learned(self):
+        state = self.run_component()
+        stats = self.server.stats()['requests']
+        # The first 15-day segment fails and is retried as two 7.5-day halves
+        self.assertEqual(stats['createReport']['202'], 5)
+        self.assertEqual(sum(1 for report in self.server.state.reports.values() if report['rows'] > 100), 1)
+        learned = state['report_density']['GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL'][MARKETPLACES[0]]
+        self.assertAlmostEqual(learned['rows_per_day'], 10, delta=1)
+        self.assertEqual(learned['max_segment_days'], 7.5)
+
+        # The next run starts below the size that failed
+        self.server.state.reset()
+        self.run_component()
+        self.assertEqual(self.server.stats()['requests']['createReport']['202'], 4)
+        self.assertFalse(any(report['rows'] > 100 for report in self.server.state.reports.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
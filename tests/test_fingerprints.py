@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import mock
+import pandas as pd
+
+from component import Component
+from fingerprints import FINGERPRINT_TTL_DAYS, FingerprintStore, frame_fingerprints, record_fingerprints
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import no_waits, write_data_dir
+
+STEPS = ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns', 'run_finances', 'run_ads',
+         'run_ledger', 'run_strategic_products', 'run_seller_feedback', 'run_performance_report',
+         'run_settlement_report']
+
+
+class TestFingerprintStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'row_fingerprints.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_only_new_and_changed_rows_pass(self):
+        first = pd.DataFrame({'sku': ['a', 'b', 'c'], 'qty': [1, 2, 3], 'extracted_at': ['t1'] * 3})
+        store = FingerprintStore(self.path, today=100)
+        self.assertEqual(store.changed('inventory.csv', *frame_fingerprints(first, ['sku'])), [True] * 3)
+        store.close()
+
+        second = pd.DataFrame({'sku': ['a', 'b', 'd'], 'qty': [1, 5, 4], 'extracted_at': ['t2'] * 3})
+        store = FingerprintStore(self.path, today=101)
+        self.assertEqual(store.changed('inventory.csv', *frame_fingerprints(second, ['sku'])), [False, True, True])
+        # Tables do not share fingerprints
+        self.assertEqual(store.changed('other.csv', *frame_fingerprints(second, ['sku'])), [True] * 3)
+        store.close()
+
+    def test_repeated_keys_within_a_batch(self):
+        rows = [('o1', 'x', 1), ('o1', 'x', 1), ('o1', 'x', 2)]
+        store = FingerprintStore(self.path, today=100)
+        self.assertEqual(store.changed('orders.csv', *record_fingerprints(rows, [0, 1])), [True, False, True])
+        self.assertEqual(store.changed('orders.csv', *record_fingerprints(rows[2:], [0, 1])), [False])
+        store.close()
+
+    def test_entries_not_seen_expire(self):
+        store = FingerprintStore(self.path, today=100)
+        store.changed('returns.csv', *record_fingerprints([('r1',), ('r2',)]))
+        store.close()
+        store = FingerprintStore(self.path, today=100 + FINGERPRINT_TTL_DAYS // 2)
+        store.changed('returns.csv', *record_fingerprints([('r2',)]))
+        store.close()
+
+        store = FingerprintStore(self.path, today=101 + FINGERPRINT_TTL_DAYS)
+        store.close()
+        with sqlite3.connect(self.path) as connection:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM fingerprints').fetchone(), (1,))
+
+
+class TestChangedRowsOnly(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000, inventory_size=120).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: step in ('run_inventory', 'run_returns') for step in STEPS}
+        write_data_dir(self.data_dir.name, self.server.base_url, execution=execution)
+        config_path = os.path.join(self.data_dir.name, 'config.json')
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+        config['parameters']['changed_rows_only'] = True
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def run_component(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+        with open(os.path.join(self.data_dir.name, 'out', 'files', 'run_metrics.json')) as metrics_file:
+            return json.load(metrics_file)
+
+    def hand_over_fingerprints(self):
+        # What the file input mapping does between two runs
+        in_files = os.path.join(self.data_dir.name, 'in', 'files')
+        os.makedirs(in_files, exist_ok=True)
+        out_file = os.path.join(self.data_dir.name, 'out', 'files', 'row_fingerprints.sqlite')
+        with open(out_file + '.manifest') as manifest_file:
+            manifest = json.load(manifest_file)
+        shutil.move(out_file, os.path.join(in_files, '1_row_fingerprints.sqlite'))
+        with open(os.path.join(in_files, '1_row_fingerprints.sqlite.manifest'), 'w') as manifest_file:
+            json.dump({'id': 1, 'name': 'row_fingerprints.sqlite', 'tags': manifest['tags'],
+                       'created': '2024-01-01T00:00:00+0000'}, manifest_file)
+
+    def test_second_run_writes_only_changed_rows(self):
+        first = self.run_component()
+        self.assertEqual(first['rows_written']['inventory.csv'], 2 * 120)
+        self.assertGreater(first['rows_written']['returns.csv'], 0)
+
+        self.hand_over_fingerprints()
+        self.server.state.reset()
+        second = self.run_component()
+        self.assertNotIn('inventory.csv', second['rows_written'])
+        self.assertEqual(second['rows_unchanged']['inventory.csv'], 2 * 120)
+        self.assertEqual(second['rows_unchanged']['returns.csv'], first['rows_written']['returns.csv'])
+
+
+if __name__ == "__main__":
+    unittest.main()
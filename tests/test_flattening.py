@@ -0,0 +1,70 @@
+import unittest
+
+import pandas as pd
+
+from flattening import (SALES_RANK_COLUMNS, ColumnBuffer, append_sales_ranks, flatten_json, flatten_leaves,
+                         records_to_frame)
+
+
+class TestSalesRankFlattening(unittest.TestCase):
+
+    def test_ranks_are_tagged_and_buffered(self):
+        item = {
+            'asin': 'B000TEST01',
+            'salesRanks': [{
+                'marketplaceId': 'A1PA6795UKMFR9',
+                'classificationRanks': [{'classificationId': '123', 'title': 'Shoes', 'link': 'l1', 'rank': 4}],
+                'displayGroupRanks': [{'websiteDisplayGroup': 'shoes_display', 'title': 'Shoes', 'link': 'l2',
+                                       'rank': 40}],
+            }]
+        }
+        buffer = ColumnBuffer(SALES_RANK_COLUMNS)
+        self.assertEqual(append_sales_ranks(buffer, item, '2024-01-01T00:00:00Z'), 2)
+        self.assertEqual(append_sales_ranks(buffer, {'asin': 'B000NORANK'}, '2024-01-01T00:00:00Z'), 0)
+
+        df = buffer.to_frame()
+        self.assertEqual(list(df.columns), SALES_RANK_COLUMNS)
+        self.assertEqual(df['rank_type'].tolist(), ['classification', 'display_group'])
+        self.assertEqual(df['asin'].unique().tolist(), ['B000TEST01'])
+        self.assertEqual(df.loc[1, 'websiteDisplayGroup'], 'shoes_display')
+
+
+class TestJsonFlattening(unittest.TestCase):
+
+    def test_nested_objects_and_lists_become_snake_case_columns(self):
+        metrics = {
+            'marketplaceId': 'A1PA6795UKMFR9',
+            'lateShipmentRate': {'rate': 0.01, 'reportingDateRange': {'reportingDateFrom': '2024-01-01'}},
+            'policyViolation': {'targets': [{'targetValue': 0}, {'targetValue': 1}]},
+        }
+        self.assertEqual(list(flatten_json(metrics).items()), [
+            ('marketplace_id', 'A1PA6795UKMFR9'),
+            ('late_shipment_rate_rate', 0.01),
+            ('late_shipment_rate_reporting_date_range_reporting_date_from', '2024-01-01'),
+            ('policy_violation_targets_0_target_value', 0),
+            ('policy_violation_targets_1_target_value', 1),
+        ])
+        self.assertEqual(flatten_json({'statusValue': 'GOOD'}, parent_key='account'), {'account_status_value': 'GOOD'})
+
+    def test_records_to_frame_has_deterministic_columns(self):
+        df = records_to_frame([{'b': 1, 'id': 'x'}, {'a': 2, 'id': 'y'}], leading_columns=('id',))
+        self.assertEqual(list(df.columns), ['id', 'a', 'b'])
+        self.assertEqual(len(df), 2)
+
+
+class TestInventoryFlattening(unittest.TestCase):
+
+    def test_leaf_keys_are_shortened_into_growing_buffer(self):
+        buffer = ColumnBuffer()
+        buffer.append(flatten_leaves({'sellerSku': 'SKU-1', 'inventoryDetails': {'fulfillableQuantity': 3}}))
+        buffer.append(flatten_leaves({'sellerSku': 'SKU-2', 'inventoryDetails': {
+            'reservedQuantity': {'totalReservedQuantity': 1}}}))
+
+        df = buffer.to_frame()
+        self.assertEqual(list(df.columns), ['seller_sku', 'fulfillable_quantity', 'total_reserved_quantity'])
+        self.assertTrue(pd.isna(df.loc[0, 'total_reserved_quantity']))
+        self.assertEqual(df.loc[1, 'total_reserved_quantity'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
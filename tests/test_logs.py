@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import unittest
+
+from async_client import AsyncApiClient
+from logs import EventLog, JsonFormatter, configure_logging
+from metrics import RunMetrics
+from tests.standin.server import StandInServer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEventLog(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.events = EventLog(interval=30, clock=self.clock)
+
+    def test_summaries_are_rate_limited_per_key(self):
+        with self.assertLogs(level='INFO') as logs:
+            logging.info('start')
+            for _ in range(10):
+                self.events.count('catalog_batches', 'mp', batches=1, asins=20, without_ranks=1)
+            self.clock.now = 31
+            self.events.count('catalog_batches', 'mp', batches=1, asins=20)
+            self.events.count('catalog_batches', 'other', batches=1, asins=5)
+        self.assertEqual(logs.output[1:], [
+            'INFO:root:Catalog progress in mp: 11 batches, 220 ASINs, 10 without ranks, 0 failed, 0 skipped'])
+
+    def test_flush_logs_only_changed_counts(self):
+        self.events.count('report_polls', 'GET_LEDGER_DETAIL_VIEW_DATA', polls=1, done=False)
+        self.events.count('report_polls', 'GET_LEDGER_DETAIL_VIEW_DATA', polls=1, done=True)
+        with self.assertLogs(level='INFO') as logs:
+            self.events.flush()
+            self.events.flush()
+        self.assertEqual(logs.output, [
+            'INFO:root:Report status polls for GET_LEDGER_DETAIL_VIEW_DATA: 2 polls, 1 reports done'])
+        self.assertEqual(self.events.totals('report_polls', 'GET_LEDGER_DETAIL_VIEW_DATA'), {'polls': 2, 'done': 1})
+        self.assertEqual(self.events.totals('pages', 'missing'), {'pages': 0, 'records': 0})
+
+    def test_json_records_carry_the_counts(self):
+        self.events.count('pages', 'inventory in mp', pages=2, records=80)
+        with self.assertLogs(level='INFO') as logs:
+            self.events.flush()
+        entry = json.loads(JsonFormatter().format(logs.records[0]))
+        self.assertEqual(entry['message'], 'Pages fetched for inventory in mp: 2 pages, 80 records')
+        self.assertEqual({key: entry[key] for key in ('level', 'event', 'key', 'pages', 'records')},
+                         {'level': 'INFO', 'event': 'pages', 'key': 'inventory in mp', 'pages': 2, 'records': 80})
+
+
+class TestPollingLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(polls_until_done=6).start()
+        self.server.state.reports['1'] = {'reportType': 'GET_LEDGER_DETAIL_VIEW_DATA', 'rows': 10, 'polls': 0}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_status_polls_log_nothing_at_info(self):
+        configure_logging()
+        events = EventLog()
+
+        async def poll():
+            async with AsyncApiClient(RunMetrics(), self.server.base_url, 'token', report_poll_interval=0.01,
+                                      events=events) as client:
+                return await client.wait_for_report('1', 'GET_LEDGER_DETAIL_VIEW_DATA')
+
+        with self.assertNoLogs(level='INFO'):
+            status, _ = asyncio.run(poll())
+        self.assertEqual(status, 'DONE')
+        self.assertEqual(events.totals('report_polls', 'GET_LEDGER_DETAIL_VIEW_DATA'), {'polls': 7, 'done': 1})
+
+
+class TestLazyFormatting(unittest.TestCase):
+
+    def test_disabled_messages_are_not_formatted(self):
+        class Argument:
+            formatted = 0
+
+            def __str__(self):
+                Argument.formatted += 1
+                return 'argument'
+
+        with self.assertLogs(level='INFO'):
+            logging.debug("Report %s status", Argument())
+            logging.info("Report %s status", Argument())
+        self.assertEqual(Argument.formatted, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
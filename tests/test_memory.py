@@ -0,0 +1,66 @@
+import unittest
+
+import mock
+import pandas as pd
+
+import memory
+from component import Component
+from memory import MemoryGovernor
+
+MIB = 2 ** 20
+
+
+class TestMemoryGovernor(unittest.TestCase):
+
+    def test_initial_chunk_size_until_observed(self):
+        governor = MemoryGovernor(100 * MIB, {'orders': 2000})
+        self.assertEqual(governor.chunk_size('orders'), 2000)
+        self.assertEqual(governor.chunk_size('unknown'), memory.MIN_CHUNK_ROWS)
+
+    def test_chunk_size_follows_headroom(self):
+        governor = MemoryGovernor(1000 * MIB, {'orders': 2000})
+        governor.observe('orders', pd.DataFrame({'value': ['x' * 200] * 1000}))
+        with mock.patch.object(memory, 'process_rss_bytes', return_value=200 * MIB):
+            large = governor.chunk_size('orders')
+        with mock.patch.object(memory, 'process_rss_bytes', return_value=950 * MIB):
+            small = governor.chunk_size('orders')
+        with mock.patch.object(memory, 'process_rss_bytes', return_value=2000 * MIB):
+            exhausted = governor.chunk_size('orders')
+        self.assertGreater(large, small)
+        self.assertLessEqual(large, memory.MAX_CHUNK_ROWS)
+        self.assertEqual(exhausted, memory.MIN_CHUNK_ROWS)
+
+    def test_backpressure_waits_while_memory_is_released(self):
+        governor = MemoryGovernor(1000 * MIB)
+        readings = iter([990 * MIB, 980 * MIB, 950 * MIB, 800 * MIB])
+        with mock.patch.object(memory, 'process_rss_bytes', side_effect=lambda: next(readings)), \
+                mock.patch.object(memory.time, 'sleep') as sleep:
+            governor.wait_for_headroom()
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_backpressure_waits_until_max_wait_when_nothing_is_released(self):
+        governor = MemoryGovernor(1000 * MIB)
+        clock = [0.0]
+        with mock.patch.object(memory, 'process_rss_bytes', return_value=990 * MIB), \
+                mock.patch.object(memory.time, 'perf_counter', side_effect=lambda: clock[0]), \
+                mock.patch.object(memory.time, 'sleep', side_effect=lambda seconds: clock.append(clock.pop() + seconds)) \
+                as sleep:
+            self.assertEqual(governor.wait_for_headroom(max_wait=5), 5)
+            self.assertEqual(sleep.call_count, 5 / memory.BACKPRESSURE_POLL_INTERVAL)
+            # A stalled governor does not hold every later download for max_wait again
+            self.assertEqual(governor.wait_for_headroom(max_wait=5), 0.0)
+            self.assertEqual(sleep.call_count, 5 / memory.BACKPRESSURE_POLL_INTERVAL)
+        with mock.patch.object(memory, 'process_rss_bytes', return_value=100 * MIB):
+            self.assertEqual(governor.wait_for_headroom(), 0.0)
+        self.assertFalse(governor._stalled)
+
+    def test_drop_seen_rows_across_chunks(self):
+        seen = set()
+        first = Component.drop_seen_rows(pd.DataFrame({'id': ['a', 'b', 'a'], 'qty': ['1', '2', '1']}), seen)
+        second = Component.drop_seen_rows(pd.DataFrame({'id': ['b', 'c'], 'qty': ['2', '3']}), seen)
+        self.assertEqual(first['id'].tolist(), ['a', 'b'])
+        self.assertEqual(second['id'].tolist(), ['c'])
+
+
+if __name__ == "__main__":
+    unittest.main()
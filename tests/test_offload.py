@@ -0,0 +1,76 @@
+import io
+import os
+import unittest
+
+import pandas as pd
+
+from component import INITIAL_CHUNK_ROWS
+from memory import MemoryGovernor
+import offload
+from offload import (ParsePool, WorkerParsers, parse_financial_events, parse_order_records, parse_return_records,
+                     parse_settlement)
+from tests.benchmarks import generators
+
+
+def rows_of(batches):
+    return [row for batch in batches for row in batch]
+
+
+class TestParsePool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ParsePool(1, 2 ** 30, INITIAL_CHUNK_ROWS)
+        cls.inline = WorkerParsers(MemoryGovernor(2 ** 30, INITIAL_CHUNK_ROWS))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def assertSameFrames(self, pooled, inline):
+        # Chunk boundaries follow the memory governor of each process, the rows must not
+        pd.testing.assert_frame_equal(pd.concat(pooled, ignore_index=True), pd.concat(inline, ignore_index=True))
+
+    def test_order_and_return_records(self):
+        orders = generators.all_orders_xml(300)
+        returns = generators.returns_xml(100)
+        self.assertEqual(rows_of(self.pool.chunks(parse_order_records, orders)),
+                         rows_of(self.inline.order_record_batches(orders)))
+        self.assertEqual(rows_of(self.pool.chunks(parse_return_records, returns)),
+                         rows_of(self.inline.return_record_batches(returns)))
+
+    def test_settlement_is_transformed_per_file(self):
+        document = generators.settlement_tsv(12000)
+        pooled = list(self.pool.chunks(parse_settlement, document))
+        inline = list(self.inline.transform_settlement_chunks(
+            self.inline.read_tsv_chunks(io.BytesIO(document), 'settlement')))
+        self.assertSameFrames(pooled, inline)
+        self.assertIn('split_index', pooled[0].columns)
+
+    def test_chunks_are_read_back_one_at_a_time(self):
+        document = generators.settlement_tsv(12000)
+        spilled = self.pool.submit(offload._spill, parse_settlement, document).result()
+        # The worker returns a path, not the parsed document
+        self.assertIsInstance(spilled, str)
+        os.unlink(spilled)
+
+        chunks = self.pool.chunks(parse_settlement, document)
+        first = next(chunks)
+        # One chunk of the document, not the whole of it
+        self.assertLess(len(first), 12000)
+        chunks.close()
+        self.assertEqual([name for name in os.listdir(os.path.dirname(spilled)) if name.startswith('parsed_')], [])
+
+    def test_financial_events(self):
+        page = generators.financial_events_page(50)
+        pooled = self.pool.submit(parse_financial_events, page).result()
+        inline = self.inline.process_financial_data(page)
+        # Charge columns are in the same order in every process
+        pd.testing.assert_frame_equal(pooled, inline)
+
+    def test_worker_runs_in_another_process(self):
+        self.assertNotEqual(self.pool.submit(os.getpid).result(), os.getpid())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from component import Component
+from planner import RequestPlan, combine_estimates, remember_report_durations, throttled_seconds
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import no_waits, write_data_dir
+
+PLANNED_OPERATIONS = ['getInventorySummaries', 'createReport', 'listFinancialEvents', 'searchCatalogItems']
+
+
+class TestRequestPlan(unittest.TestCase):
+
+    def test_estimate_applies_usage_plans_and_report_durations(self):
+        plan = RequestPlan({'GET_XML_RETURNS_DATA_BY_RETURN_DATE': 25}, report_poll_interval=10, ads_poll_interval=30)
+        plan.reports('returns', 'GET_XML_RETURNS_DATA_BY_RETURN_DATE', 20)
+        plan.reports('ledger', 'GET_LEDGER_DETAIL_VIEW_DATA', 4, concurrent=True)
+        estimate = plan.estimate()
+
+        self.assertEqual(estimate['steps']['returns']['calls']['getReport'], 20 * 3)
+        self.assertEqual(estimate['steps']['returns']['seconds'], 20 * 25)
+        # Reports without a recorded duration take the default, concurrent ones at the same time
+        self.assertEqual(estimate['steps']['ledger']['seconds'], 120)
+        self.assertEqual(estimate['calls']['createReport'], 24)
+        self.assertEqual(estimate['quota']['createReport']['throttled_seconds'],
+                         round(throttled_seconds('createReport', 24), 1))
+        self.assertEqual(estimate['seconds'], max(20 * 25 + 120, round(throttled_seconds('createReport', 24), 1)))
+
+        combined = combine_estimates([('a', estimate), ('b', estimate), ('c', estimate)], workers=2)
+        self.assertEqual(combined['calls']['createReport'], 3 * 24)
+        self.assertEqual(combined['estimated_wall_seconds'], 2 * estimate['seconds'])
+
+    def test_durations_are_averaged_with_history(self):
+        state = {}
+        remember_report_durations(state, {'GET_SELLER_FEEDBACK_DATA': 100})
+        remember_report_durations(state, {'GET_SELLER_FEEDBACK_DATA': 50})
+        self.assertEqual(state['report_durations'], {'GET_SELLER_FEEDBACK_DATA': 75})
+
+
+class TestPlanAction(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000, inventory_size=120).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: step in ('run_inventory', 'run_orders', 'run_finances', 'run_strategic_products')
+                     for step in ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns',
+                                  'run_finances', 'run_ads', 'run_ledger', 'run_strategic_products',
+                                  'run_seller_feedback', 'run_performance_report', 'run_settlement_report']}
+        write_data_dir(self.data_dir.name, self.server.base_url, execution=execution)
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def test_plan_matches_the_calls_of_a_run(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+        stats = self.server.stats()['requests']
+        made = {operation: sum(stats[operation].values()) for operation in PLANNED_OPERATIONS}
+        shutil.copy(os.path.join(self.data_dir.name, 'out', 'state.json'),
+                    os.path.join(self.data_dir.name, 'in', 'state.json'))
+        self.server.state.reset()
+
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}):
+            estimate = Component().plan()
+
+        self.assertEqual(sum(sum(codes.values()) for codes in self.server.stats()['requests'].values()), 0)
+        self.assertEqual({operation: estimate['calls'][operation] for operation in PLANNED_OPERATIONS}, made)
+        [extraction] = estimate['extractions']
+        self.assertEqual(extraction['extraction'], 'EU')
+        self.assertEqual(list(extraction['steps']), ['inventory', 'orders', 'finances', 'strategic_products'])
+        self.assertGreater(estimate['estimated_wall_seconds'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from profiling import StepProfiler
+
+
+class TestStepProfiler(unittest.TestCase):
+
+    def test_profile_writes_reports(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            profiler = StepProfiler(out_dir, top_n=5, wall_clock_interval=0.001)
+            with profiler.profile('orders'):
+                rows = [{'amazon_order_id': str(i)} for i in range(10000)]
+                time.sleep(0.05)
+
+            self.assertEqual(profiler.written_files, ['profile_orders.pstats', 'profile_orders_allocations.txt',
+                                                      'profile_orders_wallclock.txt'])
+            stats = pstats.Stats(os.path.join(out_dir, 'profile_orders.pstats'))
+            self.assertTrue(any('sleep' in func[2] for func in stats.stats))
+            with open(os.path.join(out_dir, 'profile_orders_allocations.txt')) as allocations:
+                lines = allocations.read().splitlines()
+            self.assertTrue(lines[0].startswith('Peak traced memory'))
+            self.assertLessEqual(len(lines), 2 + 5)
+            self.assertIn('test_profiling.py', lines[2])
+            self.assertEqual(len(rows), 10000)
+
+    def test_profile_without_sampler(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            profiler = StepProfiler(out_dir)
+            with profiler.profile('ads'):
+                pass
+            self.assertNotIn('profile_ads_wallclock.txt', profiler.written_files)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+
+import mock
+import pandas as pd
+
+from component import Component
+from regions import group_by_region
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import no_waits, write_data_dir
+
+US, DE, JP = 'ATVPDKIKX0DER', 'A1PA6795UKMFR9', 'A1VC38T7YXB528'
+
+
+class TestRegionGrouping(unittest.TestCase):
+
+    def test_marketplaces_and_stores_are_grouped_by_region(self):
+        groups = group_by_region(
+            [{'marketplace_id': DE}, {'marketplace_id': US}, {'marketplace_id': 'UNKNOWN1'},
+             {'marketplace_id': 'UNKNOWN2', 'region': 'FE'}],
+            [{'name': 'Amazon.com', 'scope': '1', 'region': 'NA'}, {'name': 'Amazon.de', 'scope': '2'}])
+
+        self.assertEqual(list(groups), ['NA', 'EU', 'FE'])
+        self.assertEqual([m['marketplace_id'] for m in groups['EU'][0]], [DE, 'UNKNOWN1'])
+        self.assertEqual([s['name'] for s in groups['NA'][1]], ['Amazon.com'])
+        with self.assertRaises(ValueError):
+            group_by_region([{'marketplace_id': JP, 'region': 'XX'}], [])
+
+
+class TestParallelRegions(unittest.TestCase):
+
+    def setUp(self):
+        # One stand-in server per region
+        self.servers = {region: StandInServer(rows_per_day=5, rate_scale=1000, inventory_size=120).start()
+                        for region in ('NA', 'EU')}
+        self.data_dir = tempfile.TemporaryDirectory()
+        execution = {step: False for step in ['run_inventory_planning', 'run_returns', 'run_finances', 'run_ledger',
+                                              'run_strategic_products', 'run_seller_feedback',
+                                              'run_performance_report', 'run_settlement_report']}
+        write_data_dir(self.data_dir.name, self.servers['EU'].base_url, execution=execution)
+        config_path = os.path.join(self.data_dir.name, 'config.json')
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+        parameters = config['parameters']
+        parameters['marketplaces'] = [{'marketplace_id': DE}, {'marketplace_id': US}]
+        parameters['stores'] = [{'name': 'Amazon.de', 'scope': '1'},
+                                {'name': 'Amazon.com', 'scope': '2', 'region': 'NA'}]
+        parameters['regions'] = {'NA': {'sp_api_base_url': self.servers['NA'].base_url,
+                                        'ads_api_base_url': self.servers['NA'].base_url}}
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+
+    def tearDown(self):
+        for server in self.servers.values():
+            server.stop()
+        self.data_dir.cleanup()
+
+    def test_regions_are_routed_to_their_hosts_and_merged(self):
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+
+        for server in self.servers.values():
+            stats = server.stats()['requests']
+            self.assertEqual(sum(stats['getInventorySummaries'].values()), 3)
+            self.assertEqual(sum(stats['createReport'].values()), 1)
+            self.assertEqual(sum(stats['adsCreateReport'].values()), 3)
+
+        tables = os.path.join(self.data_dir.name, 'out', 'tables')
+        inventory = pd.read_csv(os.path.join(tables, 'inventory.csv'))
+        self.assertEqual(len(inventory), 2 * 120)
+        self.assertEqual(set(inventory['marketplace_id']), {DE, US})
+        self.assertEqual(set(pd.read_csv(os.path.join(tables, 'advertising.csv'))['market']),
+                         {'Amazon.de', 'Amazon.com'})
+        self.assertTrue(os.path.exists(os.path.join(tables, 'orders.csv')))
+        self.assertEqual(sorted(os.listdir(tables)), ['advertising.csv', 'inventory.csv', 'orders.csv'])
+
+
+if __name__ == "__main__":
+    unittest.main()
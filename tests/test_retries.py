@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import mock
+
+import retries
+from async_client import AsyncApiClient
+from component import Component
+from retries import LatencyTracker, RetryPolicy
+from tests.standin.server import StandInServer
+
+
+def no_backoff():
+    return mock.patch.multiple(retries, SERVER_ERROR_BACKOFF_BASE=0.01, HEDGE_MIN_DELAY=0.05)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_server_errors_are_retried_a_limited_number_of_times(self):
+        policy = RetryPolicy('get')
+        waits = [policy.backoff(503) for _ in range(retries.SERVER_ERROR_RETRIES)]
+        self.assertTrue(all(wait is not None for wait in waits))
+        self.assertEqual(policy.reason, 'server_error')
+        self.assertIsNone(policy.backoff(500))
+        self.assertIsNone(RetryPolicy('get').backoff(404))
+
+    def test_server_errors_of_posts_are_not_retried(self):
+        self.assertIsNone(RetryPolicy('post').backoff(503))
+        self.assertIsNotNone(RetryPolicy('post').backoff(429))
+
+    def test_connection_errors_of_posts_are_retried_only_before_sending(self):
+        self.assertIsNone(RetryPolicy('post').backoff())
+        self.assertIsNotNone(RetryPolicy('post').backoff(connect_failed=True))
+        self.assertIsNotNone(RetryPolicy('get').backoff())
+
+    def test_hedge_delay_needs_enough_samples(self):
+        tracker = LatencyTracker()
+        for _ in range(retries.HEDGE_MIN_SAMPLES - 1):
+            tracker.record(5.0)
+        self.assertIsNone(tracker.hedge_delay())
+        tracker.record(50.0)
+        self.assertEqual(tracker.hedge_delay(), 5.0)
+
+
+class TestTransportFaults(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.server.state.reports['1'] = {'reportType': 'GET_LEDGER_DETAIL_VIEW_DATA', 'rows': 100, 'polls': 0}
+        self.report_url = f'{self.server.base_url}/reports/2021-06-30/reports/1'
+        self.document_url = f'{self.server.base_url}/s3/doc-1'
+        self.data_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.data_dir.name, 'config.json'), 'w') as config:
+            json.dump({'parameters': {}}, config)
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}):
+            self.component = Component()
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+
+    def warm_up(self, tracker, seconds=0.05):
+        for _ in range(retries.HEDGE_MIN_SAMPLES):
+            tracker.record(seconds)
+
+    def test_server_errors_are_retried(self):
+        self.server.state.inject('getReport', status=503, count=2)
+        with no_backoff():
+            response = self.component.controlled_request('get', self.report_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.component.metrics.retries['server_error'], 2)
+
+    def test_failed_create_report_is_not_sent_twice(self):
+        self.server.state.inject('createReport', status=500)
+        with no_backoff():
+            response = self.component.controlled_request('post', f'{self.server.base_url}/reports/2021-06-30/reports')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.server.stats()['requests']['createReport'], {'500': 1})
+        self.assertNotIn('server_error', self.component.metrics.retries)
+
+    def test_stalled_response_hits_read_deadline_and_is_retried(self):
+        self.server.state.inject('getReport', delay=1.0)
+        with no_backoff(), mock.patch.dict(retries.OPERATION_TIMEOUTS, {'getReport': (1, 0.2)}):
+            response = self.component.controlled_request('get', self.report_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.component.metrics.retries['connection_error'], 1)
+
+    def test_refused_post_is_retried(self):
+        with no_backoff():
+            response = self.component.controlled_request('post', 'http://127.0.0.1:1/reports')
+
+        self.assertIsNone(response)
+        self.assertEqual(self.component.metrics.retries['connection_error'], retries.SERVER_ERROR_RETRIES)
+
+    def test_slow_download_is_hedged(self):
+        self.server.state.inject('downloadDocument', delay=3.0)
+        self.warm_up(self.component.download_latency)
+        start = time.perf_counter()
+        with no_backoff(), ThreadPoolExecutor(max_workers=4) as executor:
+            self.component.hedge_executor = executor
+            response = self.component.document_request('get', self.document_url)
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 2.0)
+        self.assertEqual(self.component.metrics.retries['hedged_download'], 1)
+
+    def test_async_client_retries_and_hedges(self):
+        self.server.state.inject('getReport', status=500)
+        self.server.state.inject('downloadDocument', delay=3.0)
+        tracker = LatencyTracker()
+        self.warm_up(tracker)
+
+        async def run():
+            async with AsyncApiClient(self.component.metrics, self.server.base_url, 'token', report_poll_interval=0.01,
+                                      hedge_downloads=True, download_latency=tracker) as client:
+                status, _ = await client.wait_for_report('1')
+                start = time.perf_counter()
+                document = await client.download(self.document_url, 'GZIP')
+                return status, document, time.perf_counter() - start
+
+        with no_backoff():
+            status, document, elapsed = asyncio.run(run())
+
+        self.assertEqual(status, 'DONE')
+        with document:
+            self.assertTrue(document.read())
+        self.assertLess(elapsed, 2.0)
+        self.assertEqual(dict(self.component.metrics.retries), {'server_error': 1, 'hedged_download': 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from datetime import datetime, timedelta
+
+from dates import REPORT_END_LAG, RunClock
+from segmentation import TARGET_ROWS_PER_REPORT, AdaptiveSegments
+
+NOW = datetime(2024, 6, 1)
+CLOCK = RunClock(NOW + REPORT_END_LAG)
+ORDERS = 'GET_XML_ALL_ORDERS_DATA_BY_LAST_UPDATE_GENERAL'
+
+
+def segments_for(state, total_days=30, rows_per_day=None, fatal_over=None):
+    """
+    Run a segmenter against a fake report source with a constant density and return
+    the segment lengths in days (failed ones negative).
+    """
+    segments = AdaptiveSegments(state, ORDERS, 'MP', total_days, default_days=15, max_days=30, clock=CLOCK)
+    lengths = []
+    for start_date, end_date in segments:
+        days = (start_date - end_date).total_seconds() / 86400
+        rows = round(days * (rows_per_day or 0))
+        if fatal_over is not None and rows > fatal_over and segments.split():
+            lengths.append(-days)
+            continue
+        segments.record_rows(rows)
+        lengths.append(days)
+    segments.save()
+    return lengths
+
+
+class TestAdaptiveSegments(unittest.TestCase):
+
+    def test_default_length_until_volume_is_known(self):
+        segments = AdaptiveSegments({}, ORDERS, 'MP', 30, default_days=15, max_days=30, clock=CLOCK)
+        start_date, end_date = next(iter(segments))
+        self.assertEqual((start_date, end_date), (NOW, NOW - timedelta(days=15)))
+
+    def test_empty_ranges_are_merged(self):
+        state = {}
+        self.assertEqual(segments_for(state, total_days=60), [15, 30, 15])
+        self.assertEqual(state[ORDERS]['MP']['rows_per_day'], 0)
+        self.assertEqual(state[ORDERS]['MP']['updated_at'], CLOCK.timestamp)
+        # The next run starts with the longest allowed segments
+        self.assertEqual(segments_for(state, total_days=60), [30, 30])
+
+    def test_busy_marketplace_gets_short_segments(self):
+        state = {ORDERS: {'MP': {'rows_per_day': TARGET_ROWS_PER_REPORT / 5}}}
+        self.assertEqual(segments_for(state, rows_per_day=TARGET_ROWS_PER_REPORT / 5), [5] * 6)
+
+    def test_fatal_segments_are_split_recursively(self):
+        state = {}
+        lengths = segments_for(state, rows_per_day=1000, fatal_over=4000)
+        self.assertEqual(lengths[:4], [-15, -7.5, 3.75, 3.75])
+        # Completed segments cover the window without gaps or overlaps
+        self.assertAlmostEqual(sum(length for length in lengths if length > 0), 30)
+        self.assertTrue(all(length <= 4 for length in lengths[2:] if length > 0))
+        self.assertAlmostEqual(state[ORDERS]['MP']['rows_per_day'], 1000, delta=1)
+        self.assertEqual(state[ORDERS]['MP']['max_segment_days'], 3.75)
+        # The next run starts below the size that failed and relaxes the cap again
+        self.assertEqual(segments_for(state, rows_per_day=1000, fatal_over=4000), [3.75] * 8)
+        self.assertEqual(state[ORDERS]['MP']['max_segment_days'], 5.625)
+
+    def test_density_is_blended_with_history(self):
+        state = {ORDERS: {'MP': {'rows_per_day': 100}}}
+        segments_for(state, rows_per_day=300)
+        self.assertAlmostEqual(state[ORDERS]['MP']['rows_per_day'], 200, delta=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
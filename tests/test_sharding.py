@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import pandas as pd
+
+from component import Component
+from sharding import build_plan, merge_deduplicated, shard_items
+from tests.standin.server import StandInServer
+from tests.test_end_to_end import MARKETPLACES, no_waits, write_data_dir
+
+EXTRACTIONS = [
+    ('brand-a', 'EU', ['inventory', 'orders', 'finances', 'ads'], ['A1PA6795UKMFR9', 'APJ6JRA9NG5V4'], ['Amazon.de']),
+    ('brand-a', 'NA', ['inventory', 'orders', 'finances', 'ads'], [], ['Amazon.com']),
+]
+
+
+class TestRunPlan(unittest.TestCase):
+
+    def test_shards_cover_the_plan_once(self):
+        items = build_plan(EXTRACTIONS)
+
+        self.assertEqual([(item.region, item.step, item.target) for item in items], [
+            ('EU', 'inventory', 'A1PA6795UKMFR9'), ('EU', 'inventory', 'APJ6JRA9NG5V4'), ('EU', 'orders', None),
+            ('EU', 'finances', None), ('EU', 'ads', 'Amazon.de'), ('NA', 'ads', 'Amazon.com')])
+        shards = [shard_items(items, index, 4) for index in range(4)]
+        self.assertEqual(sorted(item for shard in shards for item in shard), sorted(items))
+        self.assertEqual(build_plan(EXTRACTIONS), items)
+        with self.assertRaises(ValueError):
+            shard_items(items, 4, 4)
+
+    def test_merge_keeps_the_first_row_of_each_key(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'{index}.csv') for index in range(2)]
+            pd.DataFrame({'sku': ['a', 'b'], 'qty': [1, 2]}).to_csv(paths[0], index=False)
+            pd.DataFrame({'sku': ['b', 'c'], 'qty': [5, 3], 'note': ['x', 'y']}).to_csv(paths[1], index=False)
+            destination = os.path.join(directory, 'merged.csv')
+
+            self.assertEqual(merge_deduplicated(paths, destination, ['sku']), (3, 1))
+            merged = pd.read_csv(destination)
+            self.assertEqual(merged['qty'].tolist(), [1, 2, 3])
+            self.assertEqual(merge_deduplicated(paths, destination, []), (4, 0))
+
+
+class TestShardedRun(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(rows_per_day=5, rate_scale=1000, inventory_size=120).start()
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.shard_files = tempfile.TemporaryDirectory()
+        self.execution = {step: step in ('run_inventory', 'run_orders', 'run_ads') for step in
+                          ['run_inventory', 'run_inventory_planning', 'run_orders', 'run_returns', 'run_finances',
+                           'run_ads', 'run_ledger', 'run_strategic_products', 'run_seller_feedback',
+                           'run_performance_report', 'run_settlement_report']}
+
+    def tearDown(self):
+        self.server.stop()
+        self.data_dir.cleanup()
+        self.shard_files.cleanup()
+
+    def run_component(self, sharding):
+        write_data_dir(self.data_dir.name, self.server.base_url, execution=self.execution)
+        config_path = os.path.join(self.data_dir.name, 'config.json')
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+        config['parameters']['sharding'] = sharding
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': self.data_dir.name}), no_waits():
+            Component().run()
+
+    def collect_shard_outputs(self):
+        # What the file input mapping of the merge configuration does
+        out_files = os.path.join(self.data_dir.name, 'out', 'files')
+        for name in os.listdir(out_files):
+            if not name.startswith('shard-') or name.endswith('.manifest'):
+                continue
+            with open(os.path.join(out_files, name + '.manifest')) as manifest_file:
+                tags = json.load(manifest_file)['tags']
+            file_id = len(os.listdir(self.shard_files.name)) + 1
+            shutil.move(os.path.join(out_files, name), os.path.join(self.shard_files.name, f'{file_id}_{name}'))
+            with open(os.path.join(self.shard_files.name, f'{file_id}_{name}.manifest'), 'w') as manifest_file:
+                json.dump({'id': file_id, 'name': name, 'tags': tags, 'created': '2024-01-01T00:00:00+0000'},
+                          manifest_file)
+
+    def test_shards_merge_into_complete_tables(self):
+        for shard_index in range(2):
+            self.run_component({'shard_index': shard_index, 'shard_count': 2})
+            self.assertEqual(os.listdir(os.path.join(self.data_dir.name, 'out', 'tables')), [])
+            self.collect_shard_outputs()
+        # One marketplace each for inventory, orders and ads in either shard
+        stats = self.server.stats()['requests']
+        self.assertEqual(sum(stats['getInventorySummaries'].values()), 2 * 3)
+        self.assertEqual(sum(stats['createReport'].values()), 1)
+
+        shutil.copytree(self.shard_files.name, os.path.join(self.data_dir.name, 'in', 'files'))
+        self.run_component({'merge': True})
+
+        tables = os.path.join(self.data_dir.name, 'out', 'tables')
+        self.assertEqual(sorted(os.listdir(tables)), ['advertising.csv', 'inventory.csv', 'orders.csv'])
+        inventory = pd.read_csv(os.path.join(tables, 'inventory.csv'))
+        self.assertEqual(len(inventory), 2 * 120)
+        self.assertEqual(set(inventory['marketplace_id']), set(MARKETPLACES))
+
+
+if __name__ == "__main__":
+    unittest.main()
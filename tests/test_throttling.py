@@ -0,0 +1,29 @@
+import unittest
+
+from throttling import CircuitBreaker, TokenBucket
+
+
+class TestThrottling(unittest.TestCase):
+
+    def test_bucket_allows_burst_without_waiting(self):
+        bucket = TokenBucket(rate=1.0, burst=3)
+        waited = sum(bucket.acquire() for _ in range(3))
+        self.assertEqual(waited, 0.0)
+
+    def test_bucket_waits_when_empty(self):
+        bucket = TokenBucket(rate=50.0, burst=1)
+        bucket.acquire()
+        self.assertGreater(bucket.acquire(), 0.0)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open)
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+
+
+if __name__ == "__main__":
+    unittest.main()